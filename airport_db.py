@@ -0,0 +1,137 @@
+'''
+Radius and bounding box queries on the SQLite export of all airport sources
+
+Export once from the directory holding the source files:
+
+    python aviation.py --database
+
+then query without reparsing anything, from the command line
+
+    python airport_db.py radius 40.64 -73.78 50 --status C
+    python airport_db.py bbox 40 41 -75 -73 --source nfdc
+
+or from Python
+
+    connection = airport_db.connect()
+    closed = airport_db.query_radius(connection, 40.64, -73.78, 50, status='C')
+    # every NFDC CP facility with no OSM point within 2 km
+    cp = airport_db.query_bbox(connection, -90, 90, -180, 180, source='nfdc', status='CP')
+    lonely = [row for row in cp.itertuples()
+              if airport_db.query_radius(connection, row.lat, row.lon, 2, source='openstreetmaps').empty]
+
+The R*Tree narrows each query to a box of candidates, exact distances from the stored unit
+vectors then refine it. Boxes crossing the antimeridian are split in two.
+'''
+import argparse
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+import aviation
+
+
+def connect(path=aviation.AIRPORT_DB_FILE):
+    '''
+    Read only connection to a database written by aviation.export_airport_database
+    '''
+    if not os.path.exists(path):
+        raise FileNotFoundError('{} not found, export it with: python aviation.py --database'.format(path))
+    return sqlite3.connect('file:{}?mode=ro'.format(path), uri=True)
+
+def _filter_sql(filters):
+    # ' AND column IN (?, ...)' clauses and their parameters for column=value or column=[values] filters
+    clauses = []
+    params = []
+    for column, values in filters.items():
+        if column not in aviation.AIRPORT_COLUMNS:
+            raise ValueError('unknown airport column {}'.format(column))
+        if values is None:
+            continue
+        if isinstance(values, str) or not hasattr(values, '__iter__'):
+            values = [values]
+        values = list(values)
+        clauses.append(' AND a.{} IN ({})'.format(column, ', '.join(['?'] * len(values))))
+        params.extend(values)
+    return ''.join(clauses), params
+
+def _lon_ranges(lon_min, lon_max):
+    # (min, max) pieces of a longitude range, split where it crosses the antimeridian
+    if lon_max - lon_min >= 360:
+        return [(-180.0, 180.0)]
+    if lon_min < -180:
+        return [(lon_min + 360, 180.0), (-180.0, lon_max)]
+    if lon_max > 180:
+        return [(lon_min, 180.0), (-180.0, lon_max - 360)]
+    return [(lon_min, lon_max)]
+
+def query_bbox(connection, lat_min, lat_max, lon_min, lon_max, **filters):
+    '''
+    Airports inside a lat/lon box, in rowid order
+
+    :param filters: column=value or column=[values], e.g. status='C', source=['nfdc', 'bts']
+    :return: airports_to_df columns of the matching rows
+    '''
+    filter_sql, filter_params = _filter_sql(filters)
+    frames = []
+    for piece_min, piece_max in _lon_ranges(lon_min, lon_max):
+        # The R*Tree holds 32 bit floats, its candidates are checked again on the stored doubles
+        sql = ('SELECT a.* FROM airports_rtree r JOIN airports a ON a.rowid = r.id '
+               'WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ? '
+               'AND a.lat BETWEEN ? AND ? AND a.lon BETWEEN ? AND ?' + filter_sql + ' ORDER BY a.rowid')
+        params = [lat_min, lat_max, piece_min, piece_max, lat_min, lat_max, piece_min, piece_max] + filter_params
+        frames.append(pd.read_sql_query(sql, connection, params=params))
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
+
+def query_radius(connection, lat, lon, radius_km, **filters):
+    '''
+    Airports within radius_km of a point, nearest first
+
+    :param filters: as for query_bbox
+    :return: airports_to_df columns of the matching rows plus distance_km
+    '''
+    lat_window, lon_window = [float(w) for w in aviation.radius_windows(lat, radius_km)]
+    candidates = query_bbox(connection, max(lat - lat_window, -90.0), min(lat + lat_window, 90.0),
+                            lon - lon_window, lon + lon_window, **filters)
+    x, y, z = aviation.unit_vectors(lat, lon)
+    chords = aviation.chord_squared(x, y, z, candidates['x'].to_numpy(dtype=float),
+                                    candidates['y'].to_numpy(dtype=float), candidates['z'].to_numpy(dtype=float))
+    inside = np.flatnonzero(chords <= aviation.chord_threshold(radius_km))
+    inside = inside[np.argsort(chords[inside], kind='stable')]
+    result = candidates.iloc[inside].reset_index(drop=True)
+    result['distance_km'] = aviation.chord_to_km(chords[inside])
+    return result
+
+
+if __name__ == '__main__':
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--database', default=aviation.AIRPORT_DB_FILE)
+    common.add_argument('--source', action='append', help='keep only these sources, may be repeated')
+    common.add_argument('--status', action='append', help='keep only these status codes, may be repeated')
+    common.add_argument('--out', help='write the rows to this CSV file instead of printing them')
+    parser = argparse.ArgumentParser(description='Radius and bounding box queries on the airport database')
+    commands = parser.add_subparsers(dest='command', required=True)
+    radius = commands.add_parser('radius', parents=[common],
+                                 help='airports within a distance of a point, nearest first')
+    radius.add_argument('lat', type=float)
+    radius.add_argument('lon', type=float)
+    radius.add_argument('radius_km', type=float)
+    bbox = commands.add_parser('bbox', parents=[common], help='airports inside a lat/lon box')
+    for argument in ['lat_min', 'lat_max', 'lon_min', 'lon_max']:
+        bbox.add_argument(argument, type=float)
+    args = parser.parse_args()
+
+    connection = connect(args.database)
+    if args.command == 'radius':
+        result = query_radius(connection, args.lat, args.lon, args.radius_km, source=args.source, status=args.status)
+    else:
+        result = query_bbox(connection, args.lat_min, args.lat_max, args.lon_min, args.lon_max,
+                            source=args.source, status=args.status)
+    if args.out:
+        result.to_csv(args.out, index=False)
+    else:
+        columns = [c for c in ['source', 'id', 'icao', 'iata', 'name', 'status', 'lat', 'lon', 'distance_km']
+                   if c in result]
+        print(result[columns].to_string(index=False))
+    print('{} airports'.format(len(result)))
@@ -6,15 +6,147 @@ Do not use output of this script for navigation.
 import zipfile
 import csv
 import pandas as pd
-from io import StringIO
 import datetime
 import nltk
 import numpy as np
 import os
-from fuzzywuzzy import fuzz
-from fuzzywuzzy import process
+import sys
+import json
+import hashlib
+import pickle
+import time
+import concurrent.futures
+import re
+import difflib
+import math
+import functools
+import cProfile
+import mmap
+import sqlite3
+import bisect
 
 INSPECTION_THRESHOLD = 365*5 # days, inspections before this age probably indicate a closed/outdated airport
+SEARCH_WINDOW = 0.2 # degrees, half-width of the lat/lon box searched around a test airport
+CACHE_DIR = 'cache' # parsed source frames, see load_cached
+CACHE_SCHEMA_VERSION = 7 # bump whenever the airport frame schema or a loader's output changes
+CACHE_MAX_BYTES = 2*1024**3 # oldest cached frames are evicted beyond this
+CSV_CHUNKSIZE = 100000 # rows parsed at a time by the CSV loaders
+SNAPSHOT_FILE = 'snapshot.pkl' # sources and match tables of the last run, see update_matches
+STORE_FILE = 'airports.store' # all source airports, memory mapped by AirportStore
+AIRPORT_DB_FILE = 'airports.sqlite' # all source airports with an R*Tree index, see airport_db.py
+MATCH_CACHE_FILE = 'match_cache.sqlite' # match_sources results of earlier runs, see MatchCache
+MATCH_CACHE_MAX_VERSIONS = 8 # comparison dataset/parameter combinations kept in the match cache
+MATCH_TILE_SIZE = 2.0 # degrees, side of the lat/lon tiles test airports are split into for parallel matching
+EARTH_RADIUS_KM = 6367 # used by haversine_np and the unit vector distances
+
+class PipelineStats:
+    '''
+    Per-stage timers and counters for one run, see STATS
+
+    Disabled by default: timed() hands back a shared do-nothing context manager and count()
+    returns straight away, so the hooks in the loaders and matchers cost one call each, never
+    per row. Counters are recorded against the innermost running timer, e.g. rows_read inside
+    timed('load.nfdc') is reported as 'load.nfdc.rows_read'.
+    '''
+    def __init__(self, enabled=False):
+        self.reset(enabled)
+
+    def reset(self, enabled=None):
+        if enabled is not None:
+            self.enabled = enabled
+        self.timers = {}
+        self.counters = {}
+        self.peaks = {}
+        self._stages = []
+
+    def timed(self, stage):
+        if not self.enabled:
+            return _NO_TIMER
+        return _StageTimer(self, stage)
+
+    def stage(self, stage):
+        '''
+        Decorator timing every call of a function as `stage`
+        '''
+        def decorator(function):
+            @functools.wraps(function)
+            def timed_function(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with _StageTimer(self, stage):
+                    return function(*args, **kwargs)
+            return timed_function
+        return decorator
+
+    def _key(self, name):
+        return '{}.{}'.format(self._stages[-1], name) if self._stages else name
+
+    def count(self, name, n=1):
+        if self.enabled:
+            key = self._key(name)
+            self.counters[key] = self.counters.get(key, 0) + int(n)
+
+    def peak(self, name, value):
+        if self.enabled:
+            key = self._key(name)
+            self.peaks[key] = max(self.peaks.get(key, value), value)
+
+    def report(self):
+        '''
+        {'timers': {stage: {'calls', 'seconds'}}, 'counters': {name: n}, 'peaks': {name: max}}
+        '''
+        return {'timers': dict((stage, dict(timer)) for stage, timer in sorted(self.timers.items())),
+                'counters': dict(sorted(self.counters.items())),
+                'peaks': dict(sorted(self.peaks.items()))}
+
+    def merge(self, report):
+        '''
+        Add a report from another process, e.g. a pool worker, to this one
+        '''
+        if not (self.enabled and report):
+            return
+        for stage, timer in report['timers'].items():
+            total = self.timers.setdefault(stage, {'calls': 0, 'seconds': 0.0})
+            total['calls'] += timer['calls']
+            total['seconds'] += timer['seconds']
+        for name, n in report['counters'].items():
+            self.counters[name] = self.counters.get(name, 0) + n
+        for name, value in report['peaks'].items():
+            self.peaks[name] = max(self.peaks.get(name, value), value)
+
+    def write_report(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=1)
+
+class _StageTimer:
+    def __init__(self, stats, stage):
+        self.stats = stats
+        self.stage = stage
+
+    def __enter__(self):
+        self.stats._stages.append(self.stage)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        self.stats._stages.pop()
+        timer = self.stats.timers.setdefault(self.stage, {'calls': 0, 'seconds': 0.0})
+        timer['calls'] += 1
+        timer['seconds'] += elapsed
+        return False
+
+class _NoTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NO_TIMER = _NoTimer()
+
+# The run's instrumentation, enabled by the --stats flag of the main script
+STATS = PipelineStats()
 
 class Airport:
     def __repr__ (self):
@@ -100,9 +232,24 @@ def ll_decimal_to_dms(lat,lon):
 def ll_dms_to_decimal(lat_dms,lon_dms):
     '''
     Convert degrees minutes seconds to decimal latitude/longitude
+
+    Takes the [hemisphere, degrees, minutes, seconds] lists returned by ll_decimal_to_dms or
+    ll_decimal_to_dms_np, holding either scalars or equal length arrays.
     '''
+    lat = _dms_to_decimal(lat_dms, 'S')
+    lon = _dms_to_decimal(lon_dms, 'W')
     return lat,lon
 
+def _dms_to_decimal(dms, negative_hemisphere):
+    hemisphere, degrees, minutes, seconds = dms
+    decimal_degrees = (np.asarray(degrees, dtype=float) +
+                       np.asarray(minutes, dtype=float)/60.0 +
+                       np.asarray(seconds, dtype=float)/3600.0)
+    decimal_degrees = np.where(np.asarray(hemisphere) == negative_hemisphere, -decimal_degrees, decimal_degrees)
+    if decimal_degrees.ndim == 0:
+        return float(decimal_degrees)
+    return decimal_degrees
+
 def ll_dms_to_string(lat_dms, lon_dms):
     '''
 
@@ -118,6 +265,67 @@ def ll_dms_to_string(lat_dms, lon_dms):
                               str(int(lon_dms[3])).zfill(2)])
     return lat_dms_string, lon_dms_string
 
+def get_dms_np(decimal_degrees):
+    '''
+    Array version of get_dms
+    '''
+    decimal_degrees = np.abs(np.asarray(decimal_degrees, dtype=float))
+    degrees = np.floor(decimal_degrees)
+    remainder = decimal_degrees - degrees
+    minutes = np.floor(remainder*60.0)
+    remainder = remainder - (minutes/60.0)
+    seconds = np.round(remainder*60.0*60.0, 4)
+    return degrees, minutes, seconds
+
+def ll_decimal_to_dms_np(lat,lon):
+    '''
+    Array version of ll_decimal_to_dms, each list item is an array
+    '''
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    lat_dms = [np.where(lat < 0, 'S', 'N')] + list(get_dms_np(lat))
+    lon_dms = [np.where(lon < 0, 'W', 'E')] + list(get_dms_np(lon))
+    return lat_dms, lon_dms
+
+def _zero_padded_digits(values, width):
+    # ASCII codes of the last `width` decimal digits of each value, one row per value
+    values = np.asarray(values, dtype=float).astype(np.int64).reshape(-1, 1)
+    powers = 10 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    return (values // powers % 10 + ord('0')).astype(np.uint8)
+
+def ll_dms_to_string_np(lat_dms, lon_dms):
+    '''
+    Array version of ll_dms_to_string
+
+    Builds the fixed width N223000/W0220730 strings from digit arithmetic instead of per-value
+    str/zfill calls. Components wider than their field keep only their last digits, which only
+    happens for invalid coordinates.
+    '''
+    dms_strings = []
+    for dms, degree_width in [(lat_dms, 2), (lon_dms, 3)]:
+        hemisphere = np.asarray(dms[0], dtype='S1').reshape(-1, 1).view(np.uint8)
+        characters = np.hstack([hemisphere,
+                                _zero_padded_digits(dms[1], degree_width),
+                                _zero_padded_digits(dms[2], 2),
+                                _zero_padded_digits(dms[3], 2)])
+        dms_strings.append(characters.view('S{}'.format(characters.shape[1])).ravel().astype(str))
+    return dms_strings[0], dms_strings[1]
+
+def dms_columns(lat, lon):
+    '''
+    Hemisphere, degree, minute, second and string columns of the airports_to_df schema
+    for arrays of decimal latitude/longitude
+    '''
+    lat_dms, lon_dms = ll_decimal_to_dms_np(lat, lon)
+    lat_dms_string, lon_dms_string = ll_dms_to_string_np(lat_dms, lon_dms)
+    columns = {'lat_dms_string': lat_dms_string, 'lon_dms_string': lon_dms_string}
+    for prefix, dms in [('lat', lat_dms), ('lon', lon_dms)]:
+        columns[prefix + '_hemisphere'] = dms[0]
+        columns[prefix + '_deg'] = dms[1].astype(int)
+        columns[prefix + '_min'] = dms[2].astype(int)
+        columns[prefix + '_sec'] = dms[3].astype(int)
+    return columns
+
 def haversine_np(lon1, lat1, lon2, lat2):
     """
     Calculate the great circle distance between two points
@@ -143,55 +351,885 @@ def haversine_np(lon1, lat1, lon2, lat2):
     a = np.sin(dlat / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2.0) ** 2
 
     c = 2 * np.arcsin(np.sqrt(a))
-    km = 6367 * c
+    km = EARTH_RADIUS_KM * c
     return km
 
+def unit_vectors(lat, lon):
+    '''
+    (x, y, z) of lat/lon degrees on the unit sphere, z towards the north pole
+    '''
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lon = np.radians(np.asarray(lon, dtype=float))
+    cos_lat = np.cos(lat)
+    return cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)
+
+def add_unit_vectors(airport_df):
+    '''
+    Add x, y, z columns (unit_vectors of lat/lon) to an airport frame
+    '''
+    airport_df['x'], airport_df['y'], airport_df['z'] = unit_vectors(airport_df['lat'], airport_df['lon'])
+    return airport_df
+
+def frame_unit_vectors(airport_df):
+    '''
+    x, y, z arrays of an airport frame, from its columns when it has them
+    '''
+    if 'z' in airport_df:
+        return tuple(airport_df[c].to_numpy(dtype=float) for c in ['x', 'y', 'z'])
+    return unit_vectors(airport_df['lat'].to_numpy(dtype=float), airport_df['lon'].to_numpy(dtype=float))
+
+def chord_squared(x1, y1, z1, x2, y2, z2):
+    '''
+    Squared straight line distance between unit vectors, scalars broadcast against arrays
+
+    Monotonic in great circle distance, so radius tests compare it against chord_threshold and
+    nearest-first ordering can sort on it without any trigonometry.
+    '''
+    return (x1 - x2) ** 2 + (y1 - y2) ** 2 + (z1 - z2) ** 2
+
+def chord_threshold(radius_km):
+    '''
+    chord_squared of two points radius_km apart
+    '''
+    angle = np.minimum(np.asarray(radius_km, dtype=float) / EARTH_RADIUS_KM, np.pi)
+    return (2 * np.sin(angle / 2)) ** 2
+
+def chord_to_km(chord_sq):
+    '''
+    Great circle km of a chord_squared, the same value haversine_np gives for the two points
+    '''
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(np.sqrt(chord_sq) / 2, 1.0))
+
+def unit_vector_distance_np(x1, y1, z1, x2, y2, z2):
+    '''
+    Great circle km between unit vectors, scalars broadcast against arrays
+
+    The haversine of the angle between two points is a quarter of their squared chord, so this
+    is haversine_np's formula with the trigonometry done once per point instead of per pair.
+    '''
+    return chord_to_km(chord_squared(x1, y1, z1, x2, y2, z2))
+
+class SpatialIndex:
+    '''
+    Grid bucket index over the lat/lon columns of an airport DataFrame
+
+    Row positions are sorted by grid cell once, so a bounding box lookup only
+    touches the cells it overlaps instead of masking the whole frame. Build it
+    once per comparison set and pass it along with that same DataFrame.
+    Box longitudes past +/-180 wrap around, e.g. -190 to -170 also covers 170 to 180.
+    '''
+    def __init__(self, airport_df, cell_size=SEARCH_WINDOW):
+        self.cell_size = cell_size
+        self.lat = airport_df['lat'].to_numpy(dtype=float)
+        self.lon = airport_df['lon'].to_numpy(dtype=float)
+        self.x, self.y, self.z = frame_unit_vectors(airport_df)
+        self.n_cols = int(np.ceil(360.0 / cell_size)) + 1
+        self.n_rows = int(np.ceil(180.0 / cell_size)) + 1
+
+        valid = np.flatnonzero(np.isfinite(self.lat) & np.isfinite(self.lon))
+        rows, cols = self._cells(self.lat[valid], self.lon[valid])
+        keys = rows * self.n_cols + cols
+        order = np.argsort(keys, kind='stable')
+        self.positions = valid[order]
+        self.keys = keys[order]
+
+    def __len__(self):
+        return len(self.lat)
+
+    def _cells(self, lat, lon):
+        rows = np.floor((np.asarray(lat, dtype=float) + 90.0) / self.cell_size).astype(np.int64)
+        cols = np.floor((np.asarray(lon, dtype=float) + 180.0) / self.cell_size).astype(np.int64)
+        return np.clip(rows, 0, self.n_rows - 1), np.clip(cols, 0, self.n_cols - 1)
+
+    def query_bbox(self, lat_min, lat_max, lon_min, lon_max):
+        '''
+        Return sorted row positions strictly inside the bounding box
+        '''
+        pieces = [self._query_bbox(lat_min, lat_max, lon_min + shift, lon_max + shift)
+                  for shift in _lon_shifts(lon_min, lon_max)]
+        return pieces[0] if len(pieces) == 1 else np.sort(np.concatenate(pieces))
+
+    def _query_bbox(self, lat_min, lat_max, lon_min, lon_max):
+        (row_min, row_max), (col_min, col_max) = self._cells([lat_min, lat_max], [lon_min, lon_max])
+        grid_rows = np.arange(row_min, row_max + 1)
+        starts = np.searchsorted(self.keys, grid_rows * self.n_cols + col_min, side='left')
+        ends = np.searchsorted(self.keys, grid_rows * self.n_cols + col_max, side='right')
+        if not (ends - starts).any():
+            return np.empty(0, dtype=np.int64)
+        candidates = np.concatenate([self.positions[s:e] for s, e in zip(starts, ends)])
+        inside = ((self.lat[candidates] > lat_min) &
+                  (self.lat[candidates] < lat_max) &
+                  (self.lon[candidates] > lon_min) &
+                  (self.lon[candidates] < lon_max))
+        return np.sort(candidates[inside])
+
+    def query_window(self, lat, lon, window=SEARCH_WINDOW):
+        '''
+        Return sorted row positions within +/- window degrees of a point
+        '''
+        return self.query_bbox(lat - window, lat + window, lon - window, lon + window)
+
+    def query_pairs(self, lat, lon, window=SEARCH_WINDOW, lon_window=None):
+        '''
+        Return (query position, row position) pairs for every row within +/- window degrees
+        of each query point, sorted by query position then row position
+
+        window, and lon_window if the longitude half-width differs, may be per query arrays.
+        '''
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        lat_window = np.broadcast_to(np.asarray(window, dtype=float), lat.shape)
+        lon_window = lat_window if lon_window is None else np.broadcast_to(np.asarray(lon_window, dtype=float),
+                                                                           lat.shape)
+        # Boxes crossing +/-180 are queried a second time shifted by 360 degrees
+        west = lon - lon_window < -180.0
+        east = lon + lon_window > 180.0
+        wrapped = np.flatnonzero(west ^ east)
+        if not len(wrapped):
+            return self._query_pairs(lat, lon, lat_window, lon_window)
+        queries = np.concatenate([np.arange(len(lat)), wrapped])
+        shifted_lon = np.concatenate([lon, lon[wrapped] + np.where(west[wrapped], 360.0, -360.0)])
+        query_positions, row_positions = self._query_pairs(lat[queries], shifted_lon,
+                                                           lat_window[queries], lon_window[queries])
+        query_positions = queries[query_positions]
+        order = np.lexsort((row_positions, query_positions))
+        return query_positions[order], row_positions[order]
+
+    def _query_pairs(self, lat, lon, lat_window, lon_window):
+        queries = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+        row_min, col_min = self._cells(lat[queries] - lat_window[queries], lon[queries] - lon_window[queries])
+        row_max, col_max = self._cells(lat[queries] + lat_window[queries], lon[queries] + lon_window[queries])
+
+        query_parts = []
+        row_parts = []
+        n_offsets = int((row_max - row_min).max()) + 1 if len(queries) else 0
+        for offset in range(n_offsets):
+            grid_rows = row_min + offset
+            starts = np.searchsorted(self.keys, grid_rows * self.n_cols + col_min, side='left')
+            ends = np.searchsorted(self.keys, grid_rows * self.n_cols + col_max, side='right')
+            counts = np.where(grid_rows <= row_max, ends - starts, 0)
+            total = counts.sum()
+            if not total:
+                continue
+            # Expand each query's [start, end) run of sorted keys into individual row positions
+            run_starts = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+            query_parts.append(np.repeat(queries, counts))
+            row_parts.append(self.positions[run_starts + np.arange(total)])
+
+        if not query_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        query_positions = np.concatenate(query_parts)
+        row_positions = np.concatenate(row_parts)
+        inside = ((self.lat[row_positions] > (lat[query_positions] - lat_window[query_positions])) &
+                  (self.lat[row_positions] < (lat[query_positions] + lat_window[query_positions])) &
+                  (self.lon[row_positions] > (lon[query_positions] - lon_window[query_positions])) &
+                  (self.lon[row_positions] < (lon[query_positions] + lon_window[query_positions])))
+        query_positions = query_positions[inside]
+        row_positions = row_positions[inside]
+        order = np.lexsort((row_positions, query_positions))
+        return query_positions[order], row_positions[order]
+
+def _lon_shifts(lon_min, lon_max):
+    # Shifts by 360 degrees that together bring every part of a longitude range onto -180..180
+    if lon_min < -180.0 and lon_max > 180.0:
+        return [0.0]
+    if lon_min < -180.0:
+        return [0.0, 360.0]
+    if lon_max > 180.0:
+        return [0.0, -360.0]
+    return [0.0]
+
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180.0 # along a meridian
+HALF_CIRCUMFERENCE_KM = np.pi * EARTH_RADIUS_KM # no two points are further apart
+
+def _chord_km(chord_sq):
+    # chord_to_km for one value, without numpy's per call overhead
+    return 2 * EARTH_RADIUS_KM * math.asin(min(math.sqrt(chord_sq) / 2, 1.0))
+
+def _ring_cells(row, col, ring):
+    # Grid cells on the border of the square ring cells away from (row, col)
+    if ring == 0:
+        return [(row, col)]
+    cells = [(row - ring, c) for c in range(col - ring, col + ring + 1)]
+    cells += [(row + ring, c) for c in range(col - ring, col + ring + 1)]
+    cells += [(r, col - ring) for r in range(row - ring + 1, row + ring)]
+    cells += [(r, col + ring) for r in range(row - ring + 1, row + ring)]
+    return cells
+
+def radius_windows(lat, radius_km):
+    '''
+    Half-widths in degrees (lat, lon) of the box around a circle of radius_km, see
+    http://janmatuschek.de/LatitudeLongitudeBoundingCoordinates
+    '''
+    angle = np.minimum(np.asarray(radius_km, dtype=float) / KM_PER_DEGREE, 180.0)
+    reaches_pole = np.abs(lat) + angle >= 90.0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = np.sin(np.radians(angle)) / np.cos(np.radians(lat))
+        lon_window = np.where(reaches_pole | (ratio >= 1), 360.0, np.degrees(np.arcsin(np.minimum(ratio, 1))))
+    # Rows exactly on the circle sit on the box edge, which the box itself excludes
+    return angle * (1 + 1e-9) + 1e-9, lon_window * (1 + 1e-9) + 1e-9
+
+class AirportIndex:
+    '''
+    Nearest airport, radius and bounding box lookups on an airports_to_df frame
+
+    Adds km radius and k nearest searches to SpatialIndex, returning row positions nearest first.
+    '''
+    def __init__(self, airport_df, cell_size=SEARCH_WINDOW, coarse_cell_size=5.0):
+        self.spatial_index = SpatialIndex(airport_df, cell_size)
+        # Boxes many fine cells across are scanned on a coarser grid instead
+        self.coarse_index = SpatialIndex(airport_df, coarse_cell_size)
+        self.lat = self.spatial_index.lat
+        self.lon = self.spatial_index.lon
+        self.n_located = len(self.spatial_index.positions)
+        self.start_radius_km = cell_size * KM_PER_DEGREE
+        # Grid columns lying wholly between -180 and 180, the ring scan wraps the others around
+        self.interior_cols = int(math.ceil(360.0 / cell_size - 1e-9)) - 1
+        # Single point queries scan grid cells in plain Python up to these sizes, larger ones go through numpy
+        self.max_scalar_cells = 64
+        self.max_scalar_rings = 4
+        self._cells = None
+
+    def __len__(self):
+        return len(self.lat)
+
+    def _windows(self, lat, radius_km):
+        return radius_windows(lat, radius_km)
+
+    def within_many(self, lat, lon, radius_km):
+        '''
+        Every airport within radius_km of each query point
+
+        :param radius_km: scalar or one radius per query point
+        :return: (query positions, row positions, distances in km), by query then distance
+        '''
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        radius_km = np.broadcast_to(np.asarray(radius_km, dtype=float), lat.shape)
+        lat_window, lon_window = self._windows(lat, radius_km)
+        coarse = lat_window > self.coarse_index.cell_size
+        if coarse.any():
+            fine_queries = np.flatnonzero(~coarse)
+            coarse_queries = np.flatnonzero(coarse)
+            fine = self.spatial_index.query_pairs(lat[fine_queries], lon[fine_queries],
+                                                  lat_window[fine_queries], lon_window[fine_queries])
+            wide = self.coarse_index.query_pairs(lat[coarse_queries], lon[coarse_queries],
+                                                 lat_window[coarse_queries], lon_window[coarse_queries])
+            query = np.concatenate([fine_queries[fine[0]], coarse_queries[wide[0]]])
+            rows = np.concatenate([fine[1], wide[1]])
+        else:
+            query, rows = self.spatial_index.query_pairs(lat, lon, lat_window, lon_window)
+        x, y, z = unit_vectors(lat, lon)
+        chords = chord_squared(x[query], y[query], z[query],
+                               self.spatial_index.x[rows], self.spatial_index.y[rows], self.spatial_index.z[rows])
+        inside = chords <= chord_threshold(radius_km)[query]
+        query, rows, chords = query[inside], rows[inside], chords[inside]
+        order = np.lexsort((rows, chords, query))
+        return query[order], rows[order], chord_to_km(chords[order])
+
+    def within(self, lat, lon, radius_km):
+        '''
+        (row positions, distances in km) of the airports within radius_km, nearest first
+        '''
+        if not math.isfinite(lat + lon + radius_km) or radius_km > self.max_scalar_cells * self.start_radius_km:
+            _, rows, distances = self.within_many([lat], [lon], radius_km)
+            return rows, distances
+        lat_window, lon_window = self._windows(lat, radius_km)
+        row_min, col_min = self._cell(lat - lat_window, lon - lon_window)
+        row_max, col_max = self._cell(lat + lat_window, lon + lon_window)
+        if (row_max - row_min + 1) * (col_max - col_min + 1) > self.max_scalar_cells or \
+                abs(lon) + lon_window > 180.0:
+            _, rows, distances = self.within_many([lat], [lon], radius_km)
+            return rows, distances
+        found = []
+        n_cols = self.spatial_index.n_cols
+        cells = self._scalar_cells()
+        x, y, z = [float(v) for v in unit_vectors(lat, lon)]
+        threshold = float(chord_threshold(radius_km))
+        for row in range(row_min, row_max + 1):
+            for col in range(col_min, col_max + 1):
+                for position, airport_x, airport_y, airport_z in cells.get(row * n_cols + col, ()):
+                    chord = (x - airport_x) ** 2 + (y - airport_y) ** 2 + (z - airport_z) ** 2
+                    if chord <= threshold:
+                        found.append((chord, position))
+        found.sort()
+        return (np.array([position for _, position in found], dtype=np.int64),
+                np.array([_chord_km(chord) for chord, _ in found], dtype=float))
+
+    def nearest_many(self, lat, lon, k=1):
+        '''
+        The k nearest airports to each query point
+
+        :return: (row positions, distances in km), both shaped (queries, k) and nearest first.
+                 Slots beyond the number of airports, or for queries without coordinates, hold
+                 -1 and inf.
+        '''
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        positions = np.full((len(lat), k), -1, dtype=np.int64)
+        distances = np.full((len(lat), k), np.inf)
+        wanted = min(k, self.n_located)
+        pending = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon)) if wanted else np.empty(0, dtype=np.int64)
+        radius = np.full(len(lat), self.start_radius_km)
+        while len(pending):
+            query, rows, pair_distances = self.within_many(lat[pending], lon[pending], radius[pending])
+            counts = np.bincount(query, minlength=len(pending))
+            # A circle holding k airports holds the k nearest ones
+            done = (counts >= wanted) | (radius[pending] >= HALF_CIRCUMFERENCE_KM)
+            rank = np.arange(len(query)) - (np.cumsum(counts) - counts)[query]
+            take = done[query] & (rank < k)
+            positions[pending[query[take]], rank[take]] = rows[take]
+            distances[pending[query[take]], rank[take]] = pair_distances[take]
+            pending = pending[~done]
+            radius[pending] *= 2
+        return positions, distances
+
+    def nearest(self, lat, lon, k=1):
+        '''
+        (row positions, distances in km) of the k nearest airports, nearest first
+        '''
+        if math.isfinite(lat + lon) and self.n_located:
+            # Scan rings of grid cells outwards until nothing outside them can be nearer
+            row, col = self._cell(lat, lon)
+            n_rows, n_cols = self.spatial_index.n_rows, self.spatial_index.n_cols
+            cells = self._scalar_cells()
+            x, y, z = [float(v) for v in unit_vectors(lat, lon)]
+            found = []
+            wrapped = set()
+            for ring in range(self.max_scalar_rings + 1):
+                for cell_row, cell_col in _ring_cells(row, col, ring):
+                    if not 0 <= cell_row < n_rows:
+                        continue
+                    if 0 <= cell_col < self.interior_cols:
+                        keys = [cell_row * n_cols + cell_col]
+                    else:
+                        # Columns at or past +/-180 map to the grid columns on both sides of it
+                        keys = [cell_row * n_cols + c for c in self._wrapped_cols(cell_col)]
+                        keys = [key for key in keys if key not in wrapped]
+                        wrapped.update(keys)
+                    for key in keys:
+                        for position, airport_x, airport_y, airport_z in cells.get(key, ()):
+                            found.append(((x - airport_x) ** 2 + (y - airport_y) ** 2 + (z - airport_z) ** 2,
+                                          position))
+                if wrapped:
+                    # Wrapped columns can repeat ones scanned directly
+                    found = list(set(found))
+                if len(found) >= min(k, self.n_located):
+                    found.sort()
+                    if _chord_km(found[min(k, len(found)) - 1][0]) <= self._unscanned_km(lat, lon, row, col, ring):
+                        found = found[:k]
+                        return (np.array([position for _, position in found], dtype=np.int64),
+                                np.array([_chord_km(chord) for chord, _ in found], dtype=float))
+        positions, distances = self.nearest_many([lat], [lon], k)
+        found = positions[0] >= 0
+        return positions[0][found], distances[0][found]
+
+    def _unscanned_km(self, lat, lon, row, col, ring):
+        '''
+        Lower bound on the distance from lat/lon to any airport outside the scanned square of cells
+        '''
+        cell_size = self.spatial_index.cell_size
+        lat_low = (row - ring) * cell_size - 90.0
+        lat_high = (row + ring + 1) * cell_size - 90.0
+        lon_low = (col - ring) * cell_size - 180.0
+        lon_high = (col + ring + 1) * cell_size - 180.0
+        bound = np.inf
+        if lat_low > -90.0:
+            bound = min(bound, (lat - lat_low) * KM_PER_DEGREE)
+        if lat_high < 90.0:
+            bound = min(bound, (lat_high - lat) * KM_PER_DEGREE)
+        # Longitudes wrap at +/-180, only a square all the way around leaves none unscanned
+        lon_gap = min(lon - lon_low, lon_high - lon) if lon_high - lon_low < 360.0 else np.inf
+        if lon_gap < np.inf:
+            # Inside the square's latitudes: hav(d) >= cos(lat1) cos(lat2) hav(dlon)
+            widest = math.radians(min(max(abs(lat_low), abs(lat_high)), 90.0))
+            bound = min(bound, 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.cos(widest) * math.sin(math.radians(min(lon_gap, 180.0)) / 2))))
+        return bound
+
+    def _wrapped_cols(self, col):
+        # Grid columns holding the longitudes of column col of an unbounded grid, shifted onto -180..180
+        cell_size = self.spatial_index.cell_size
+        lon_low = col * cell_size - 180.0
+        cols = []
+        for shift in [-360.0, 0.0, 360.0]:
+            low, high = lon_low + shift, lon_low + cell_size + shift
+            if high >= -180.0 and low <= 180.0:
+                cols.extend(range(self._cell(0.0, max(low, -180.0))[1], self._cell(0.0, min(high, 180.0))[1] + 1))
+        return cols
+
+    def _cell(self, lat, lon):
+        # SpatialIndex._cells for one point
+        cell_size = self.spatial_index.cell_size
+        row = min(max(int(math.floor((lat + 90.0) / cell_size)), 0), self.spatial_index.n_rows - 1)
+        col = min(max(int(math.floor((lon + 180.0) / cell_size)), 0), self.spatial_index.n_cols - 1)
+        return row, col
+
+    def _scalar_cells(self):
+        # {grid cell key: [(row position, x, y, z)]} for single point queries, built on first use
+        if self._cells is None:
+            spatial_index = self.spatial_index
+            keys, starts = np.unique(spatial_index.keys, return_index=True)
+            ends = np.append(starts[1:], len(spatial_index.keys))
+            positions = spatial_index.positions.tolist()
+            x, y, z = [v[spatial_index.positions].tolist() for v in [spatial_index.x, spatial_index.y, spatial_index.z]]
+            self._cells = dict((key, list(zip(positions[start:end], x[start:end], y[start:end], z[start:end])))
+                               for key, start, end in zip(keys.tolist(), starts.tolist(), ends.tolist()))
+        return self._cells
+
+    def bbox_many(self, lat_min, lat_max, lon_min, lon_max):
+        '''
+        Airports strictly inside each of a batch of lat/lon boxes
+
+        :return: (query positions, row positions), by query then row
+        '''
+        lat_min, lat_max, lon_min, lon_max = [np.asarray(v, dtype=float) for v in [lat_min, lat_max, lon_min, lon_max]]
+        return self.spatial_index.query_pairs((lat_min + lat_max) / 2, (lon_min + lon_max) / 2,
+                                              (lat_max - lat_min) / 2, (lon_max - lon_min) / 2)
+
+    def bbox(self, lat_min, lat_max, lon_min, lon_max):
+        '''
+        Sorted row positions strictly inside the box
+        '''
+        return self.spatial_index.query_bbox(lat_min, lat_max, lon_min, lon_max)
+
+# Expanded before noise words are dropped, so e.g. MUNI and MUNICIPAL compare equal
+NAME_ABBREVIATIONS = {'INTL': 'INTERNATIONAL',
+                      'RGNL': 'REGIONAL',
+                      'REGL': 'REGIONAL',
+                      'MUNI': 'MUNICIPAL',
+                      'ARPT': 'AIRPORT',
+                      'FLD': 'FIELD',
+                      'AFLD': 'AIRFIELD',
+                      'CO': 'COUNTY',
+                      'CNTY': 'COUNTY',
+                      'ST': 'SAINT',
+                      'STE': 'SAINTE',
+                      'MT': 'MOUNT',
+                      'FT': 'FORT',
+                      'PT': 'POINT',
+                      'LK': 'LAKE',
+                      'RNCH': 'RANCH',
+                      'AFB': 'AIR FORCE BASE',
+                      'NAS': 'NAVAL AIR STATION',
+                      'HELIPAD': 'HELIPORT',
+                      'STOLPORT': 'AIRPORT'}
+
+# Words that say what kind of facility it is rather than which one
+NAME_NOISE_WORDS = {'AIRPORT', 'AIRFIELD', 'AIRSTRIP', 'FIELD', 'STRIP', 'MUNICIPAL', 'REGIONAL',
+                    'INTERNATIONAL', 'LANDING', 'THE', 'OF'}
+
+_NON_ALPHANUMERIC = re.compile(r'(?ui)\W')
+_LATIN1_CHARACTERS = dict((c, None) for c in range(128, 256))
+
+def sorted_name_key(name):
+    '''
+    The token sorted form fuzz.token_sort_ratio compares: characters 128-255 dropped,
+    punctuation to spaces, lower case, tokens sorted
+    '''
+    name = str(name).translate(_LATIN1_CHARACTERS)
+    return ' '.join(sorted(_NON_ALPHANUMERIC.sub(' ', name).lower().split()))
+
+def normalized_name_key(name):
+    '''
+    Token sorted name with abbreviations expanded and noise words like AIRPORT/FIELD/STRIP dropped
+
+    Names made only of noise words keep them, so "MUNICIPAL AIRPORT" doesn't become empty.
+    '''
+    tokens = _NON_ALPHANUMERIC.sub(' ', str(name).upper().replace("'", '')).split()
+    tokens = ' '.join(NAME_ABBREVIATIONS.get(token, token) for token in tokens).split()
+    significant = [token for token in tokens if token not in NAME_NOISE_WORDS]
+    return ' '.join(sorted(significant or tokens))
+
+def add_name_keys(airport_df):
+    '''
+    Add name_sort (sorted_name_key) and name_key (normalized_name_key) columns, computed once per distinct name
+    '''
+    names = airport_df['name'].astype(str)
+    unique_names = names.drop_duplicates()
+    airport_df['name_sort'] = names.map(dict(zip(unique_names, unique_names.map(sorted_name_key))))
+    airport_df['name_key'] = names.map(dict(zip(unique_names, unique_names.map(normalized_name_key))))
+    return airport_df
+
+def _name_sort_keys(airport_df):
+    if 'name_sort' in airport_df:
+        return airport_df['name_sort'].to_numpy(dtype=object)
+    return np.array([sorted_name_key(name) for name in airport_df['name']], dtype=object)
+
+def _name_keys(airport_df):
+    if 'name_key' in airport_df:
+        return airport_df['name_key'].to_numpy(dtype=object)
+    return np.array([normalized_name_key(name) for name in airport_df['name']], dtype=object)
+
+def score_name_pairs(query_keys, candidate_keys):
+    '''
+    Similarity scores (0-100) for pairs of name keys from sorted_name_key or normalized_name_key
+
+    On sorted_name_key keys this is the same arithmetic as fuzz.token_sort_ratio on the original
+    names: difflib's ratio of the sorted strings, rounded, with identical keys scoring 100 and an
+    empty key 0. Scores are identical to fuzzywuzzy running on difflib; when fuzzywuzzy uses
+    python-Levenshtein its own scores can differ from these by a few points.
+
+    This is not a faster similarity kernel, it replaces the fuzzywuzzy dependency and caches:
+    pairs are still scored one at a time by difflib in Python. Each distinct candidate key is
+    indexed by SequenceMatcher once and each distinct pair is scored once, and callers only pass
+    the pairs their spatial or name index puts forward.
+    '''
+    query_keys = np.asarray(query_keys, dtype=object)
+    candidate_keys = np.asarray(candidate_keys, dtype=object)
+    scores = np.zeros(len(query_keys), dtype=float)
+    if not len(query_keys):
+        return scores
+
+    pair_scores = {}
+    matcher = difflib.SequenceMatcher(None)
+    candidate = None
+    # Visiting pairs grouped by candidate lets SequenceMatcher reuse its index of seq2
+    for i in np.argsort(candidate_keys.astype(str), kind='stable'):
+        query_key, candidate_key = query_keys[i], candidate_keys[i]
+        score = pair_scores.get((query_key, candidate_key))
+        if score is None:
+            if query_key == candidate_key:
+                score = 100
+            elif not query_key or not candidate_key:
+                score = 0
+            else:
+                if candidate_key != candidate:
+                    matcher.set_seq2(candidate_key)
+                    candidate = candidate_key
+                matcher.set_seq1(query_key)
+                score = int(round(100 * matcher.ratio()))
+            pair_scores[(query_key, candidate_key)] = score
+        scores[i] = score
+    STATS.count('name_pairs', len(query_keys))
+    STATS.count('fuzzy_comparisons', len(pair_scores))
+    return scores
+
+class NameIndex:
+    '''
+    Inverted index from normalized name tokens to row positions of an airport DataFrame
+
+    Each row is indexed under the tokens of its name_key and, with qgram > 0, the character
+    q-grams of those tokens (which tolerate typos such as KINGS/KING). Postings are sorted by
+    term once, so a lookup only touches the rows sharing a term with the query, rarest terms
+    first. Build it once per comparison set and pass it along with that same DataFrame.
+    '''
+    def __init__(self, airport_df, qgram=0, max_postings=5000):
+        self.qgram = qgram
+        self.max_postings = max_postings
+        self.lat = airport_df['lat'].to_numpy(dtype=float)
+        self.lon = airport_df['lon'].to_numpy(dtype=float)
+        self.x, self.y, self.z = frame_unit_vectors(airport_df)
+        self.state = airport_df['state'].astype(str).str.upper().to_numpy(dtype=object)
+        self.keys = _name_keys(airport_df)
+
+        row_terms = [self._terms(key) for key in self.keys]
+        rows = np.repeat(np.arange(len(row_terms)), [len(terms) for terms in row_terms])
+        term_ids, vocabulary = pd.factorize(pd.Series([term for terms in row_terms for term in terms],
+                                                      dtype=object))
+        order = np.argsort(term_ids, kind='stable')
+        self.postings = rows[order]
+        self.starts = np.searchsorted(term_ids[order], np.arange(len(vocabulary) + 1))
+        self.term_ids = dict(zip(vocabulary, range(len(vocabulary))))
+        # Inverse document frequency, rare tokens like a family name outweigh LAKE or COUNTY
+        self.weights = np.log((len(row_terms) + 1) / np.diff(self.starts))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _terms(self, key):
+        tokens = nltk.tokenize.wordpunct_tokenize(key)
+        terms = set(tokens)
+        if self.qgram:
+            for token in tokens:
+                terms.update('~' + ''.join(gram)
+                             for gram in nltk.ngrams(' {} '.format(token), self.qgram))
+        return sorted(terms)
+
+    def query(self, name, lat=np.nan, lon=np.nan, state='', radius_km=50, max_candidates=50):
+        '''
+        Return (row positions, rarity scores) of rows sharing name terms with `name`, best first
+
+        A row qualifies when it is in the same (non-blank) state or within radius_km of lat/lon.
+        Terms are visited rarest first and common ones are skipped once max_postings rows
+        have been gathered, so a query never scans the whole frame.
+        '''
+        term_ids = np.array([self.term_ids[term] for term in self._terms(normalized_name_key(name))
+                             if term in self.term_ids], dtype=np.int64)
+        if not len(term_ids):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        term_ids = term_ids[np.argsort(-self.weights[term_ids], kind='stable')]
+        counts = self.starts[term_ids + 1] - self.starts[term_ids]
+        # Always keep the rarest term, then others while the posting budget lasts
+        term_ids = term_ids[(np.cumsum(counts) <= self.max_postings) | (np.arange(len(term_ids)) == 0)]
+
+        rows = np.concatenate([self.postings[self.starts[t]:self.starts[t + 1]] for t in term_ids])
+        STATS.count('postings_visited', len(rows))
+        weights = np.repeat(self.weights[term_ids], self.starts[term_ids + 1] - self.starts[term_ids])
+        rows, inverse = np.unique(rows, return_inverse=True)
+        rarity = np.bincount(inverse, weights=weights)
+
+        chords = chord_squared(*unit_vectors(lat, lon), self.x[rows], self.y[rows], self.z[rows])
+        nearby = chords <= chord_threshold(radius_km)
+        state = str(state).upper()
+        if state:
+            nearby |= self.state[rows] == state
+        rows, rarity, chords = rows[nearby], rarity[nearby], chords[nearby]
+
+        # Rarest shared terms first, nearest first among equals
+        order = np.lexsort((chords, -rarity))[:max_candidates]
+        return rows[order], rarity[order]
+
+AIRPORT_COLUMNS = ['id','icao','iata','name','type','lat','lon',
+                   'lat_dms_string','lon_dms_string',
+                   'lat_hemisphere','lat_deg','lat_min','lat_sec',
+                   'lon_hemisphere','lon_deg','lon_min','lon_sec',
+                   'city','state','start_date','end_date','status',
+                   'source','source_id','link',
+                   'name_sort','name_key','x','y','z']
+# Computed from the other columns by add_name_keys and add_unit_vectors
+DERIVED_COLUMNS = ['name_sort','name_key','x','y','z']
+
 def airports_to_df(airports):
-    header = ['id','icao','iata','name','type','lat','lon',
-              'lat_dms_string','lon_dms_string',
-              'lat_hemisphere','lat_deg','lat_min','lat_sec',
-              'lon_hemisphere','lon_deg','lon_min','lon_sec',
-              'city','state','start_date','end_date','status',
-              'source','source_id','link']
+    if isinstance(airports, AirportTable):
+        return airports.to_df()
+    no_dms = ['', 0, 0, 0]
     data = [[a.id, a.icao, a.iata, a.name, a.type, a.lat, a.lon,
              a.lat_dms_string, a.lon_dms_string,
-             a.lat_dms[0], int(a.lat_dms[1]), int(a.lat_dms[2]), int(a.lat_dms[3]),
-             a.lon_dms[0], int(a.lon_dms[1]), int(a.lon_dms[2]), int(a.lon_dms[3]),
+             *[d if i == 0 else int(d) for i, d in enumerate(a.lat_dms or no_dms)],
+             *[d if i == 0 else int(d) for i, d in enumerate(a.lon_dms or no_dms)],
              a.city, a.state, a.start_date, a.end_date, a.status,
              a.source, a.source_id, a.link] for a in airports]
-    airport_df = pd.DataFrame.from_records(data, columns=header)
+    airport_df = pd.DataFrame.from_records(data, columns=[c for c in AIRPORT_COLUMNS if c not in DERIVED_COLUMNS])
+    add_name_keys(airport_df)
+    add_unit_vectors(airport_df)
+    # Airports at exactly 0,0 never get DMS from Airport.__init__, derive them for the whole batch
+    missing = np.array([not (a.lat_dms and a.lon_dms) for a in airports], dtype=bool)
+    if missing.any():
+        for column, values in dms_columns(airport_df.lat[missing], airport_df.lon[missing]).items():
+            airport_df.loc[missing, column] = values
     return airport_df
 
+def _finish_airport_frame(airport_df):
+    '''
+    Complete a partially filled airport frame to the airports_to_df schema
 
-def get_usgs_airport_list(flat_file):
-    airport_df = get_usgs_airport_df(flat_file)
+    Applies the same clean up as Airport.__init__ (upper case names, first part of city,
+    coordinates rounded to 7 places, DMS derived from decimal degrees when missing) to whole
+    columns at once. Rows without usable coordinates are dropped.
+    '''
+    located = np.isfinite(airport_df['lat'].astype(float)) & np.isfinite(airport_df['lon'].astype(float))
+    STATS.count('rows_without_coordinates', (~located).sum())
+    airport_df = airport_df[located].reset_index(drop=True)
+
+    if 'lat_deg' not in airport_df:
+        for column, values in dms_columns(airport_df['lat'], airport_df['lon']).items():
+            airport_df[column] = values
+    else:
+        for column in ['lat_deg', 'lat_min', 'lat_sec', 'lon_deg', 'lon_min', 'lon_sec']:
+            airport_df[column] = airport_df[column].astype(float).astype(int)
+        lat_dms = [airport_df[c].to_numpy() for c in ['lat_hemisphere', 'lat_deg', 'lat_min', 'lat_sec']]
+        lon_dms = [airport_df[c].to_numpy() for c in ['lon_hemisphere', 'lon_deg', 'lon_min', 'lon_sec']]
+        airport_df['lat_dms_string'], airport_df['lon_dms_string'] = ll_dms_to_string_np(lat_dms, lon_dms)
+
+    airport_df['lat'] = airport_df['lat'].astype(float).round(7)
+    airport_df['lon'] = airport_df['lon'].astype(float).round(7)
+    for column in ['id', 'icao', 'iata', 'name', 'type', 'city', 'state', 'status', 'source', 'source_id', 'link']:
+        if column in airport_df:
+            airport_df[column] = airport_df[column].astype(object).fillna('')
+        else:
+            airport_df[column] = ''
+    airport_df['name'] = airport_df['name'].astype(str).str.upper()
+    airport_df['city'] = airport_df['city'].astype(str).str.split(',').str[0].str.upper()
+    for column in ['start_date', 'end_date']:
+        if column not in airport_df:
+            airport_df[column] = pd.NaT
+    add_name_keys(airport_df)
+    add_unit_vectors(airport_df)
+    return airport_df[AIRPORT_COLUMNS]
+
+def df_to_airports(airport_df):
+    '''
+    Build Airport objects from an airports_to_df frame, reusing its DMS strings
+
+    DMS lists are derived from the decimal degrees for the whole frame at once, keeping the
+    fractional seconds Airport.__init__ gives, which the frame's whole second columns lack.
+    '''
     airports = []
-    AIRPORT_CLASS = {4:'International Airport',
-                     5:'Military',
-                     2:'Municipal Airstrip / Airport',
-                     1:'Private Airstrip / Airport',
-                     3:'Regional Airport',
-                     99:'Unknown'}
-
-    FCODE = {20000: 'Airport Complex',
-             22700: 'Control Tower',
-             20100: 'Runway',
-             20101: 'Taxiway',
-             20102: 'Apron\Hardstand',
-             }
-
-    for index, row in airport_df.iterrows():
-        airport = Airport(id=row['FAA_AIRPOR'],
-                          name=row['NAME'],
-                          lat=row['Y'],
-                          lon=row['X'],
-                          source='usgs',
-                          source_id=row['GLOBALID'],
-                          type=AIRPORT_CLASS.get(row['AIRPORT_CL'],'')
-                          )
-        airports.append(airport)
+    lat_dms, lon_dms = ll_decimal_to_dms_np(airport_df['lat'], airport_df['lon'])
+    lat_dms = zip(*[dms.tolist() for dms in lat_dms])
+    lon_dms = zip(*[dms.tolist() for dms in lon_dms])
+    for row, row_lat_dms, row_lon_dms in zip(airport_df.itertuples(index=False), lat_dms, lon_dms):
+        airports.append(Airport(id=row.id,
+                                name=row.name,
+                                lat=row.lat,
+                                lon=row.lon,
+                                lat_dms=list(row_lat_dms),
+                                lon_dms=list(row_lon_dms),
+                                lat_dms_string=row.lat_dms_string,
+                                lon_dms_string=row.lon_dms_string,
+                                city=row.city,
+                                state=row.state,
+                                icao=row.icao,
+                                iata=row.iata,
+                                start_date='' if pd.isna(row.start_date) else row.start_date,
+                                end_date='' if pd.isna(row.end_date) else row.end_date,
+                                type=row.type,
+                                status=row.status,
+                                source=row.source,
+                                source_id=row.source_id,
+                                link=row.link))
     return airports
 
+# Attributes of Airport read straight from an AirportTable column of the same name
+AIRPORT_TABLE_ATTRIBUTES = ['id', 'name', 'lat', 'lon', 'lat_dms_string', 'lon_dms_string', 'city', 'state',
+                            'icao', 'iata', 'type', 'status', 'source', 'source_id', 'link']
+
+class AirportTable:
+    '''
+    Struct of arrays alternative to a list of Airport objects
+
+    Holds one numpy array per airports_to_df column; indexing or iterating yields AirportRow
+    views that read (and write) those arrays on attribute access, so no per airport object is
+    kept alive. airports_to_df on a table hands the arrays back to pandas without copying the
+    numeric columns.
+
+    lat_dms/lon_dms are derived from lat/lon like Airport.__init__ does, so they keep fractional
+    seconds (the _sec columns are whole seconds), but from coordinates already rounded to 7
+    places, which can move the seconds by up to 0.0004.
+
+        airports = AirportTable(get_usgs_airport_frame(flat_file))
+        airports[0].name, airports[0].lat_dms
+    '''
+    def __init__(self, airport_df):
+        self.columns = dict((column, airport_df[column].to_numpy()) for column in airport_df.columns)
+        self.dtypes = airport_df.dtypes.to_dict()
+        self.rows = len(airport_df)
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, row):
+        if isinstance(row, (int, np.integer)):
+            if row < 0:
+                row += self.rows
+            if not 0 <= row < self.rows:
+                raise IndexError('AirportTable index out of range')
+            return AirportRow(self, int(row))
+        # Slices, boolean masks and position arrays give a smaller table
+        return AirportTable(self._frame(dict((column, values[row]) for column, values in self.columns.items())))
+
+    def __iter__(self):
+        for row in range(self.rows):
+            yield AirportRow(self, row)
+
+    def __repr__(self):
+        return 'AirportTable({} airports)'.format(self.rows)
+
+    def _frame(self, columns):
+        return pd.DataFrame(dict((column, pd.Series(values, dtype=self.dtypes[column], copy=False))
+                                 for column, values in columns.items()), copy=False)
+
+    def to_df(self):
+        return self._frame(self.columns)
+
+def _airport_table_property(column):
+    def get(self):
+        value = self._table.columns[column][self._row]
+        return value.item() if isinstance(value, np.generic) else value
+    def set(self, value):
+        self._table.columns[column][self._row] = value
+    return property(get, set)
+
+def _airport_table_date(column):
+    def get(self):
+        value = self._table.columns[column][self._row]
+        return '' if pd.isna(value) else pd.Timestamp(value)
+    return property(get)
+
+def _airport_table_dms(index):
+    # From the decimal degrees, as Airport.__init__ derives them: the _sec columns hold whole seconds
+    def get(self):
+        lat, lon = self.lat, self.lon
+        if not (lat or lon):
+            return []
+        return ll_decimal_to_dms(lat, lon)[index]
+    return property(get)
+
+class AirportRow:
+    '''
+    One airport of an AirportTable, with the attributes and repr of Airport
+    '''
+    __slots__ = ('_table', '_row')
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    __repr__ = Airport.__repr__
+
+    lat_dms = _airport_table_dms(0)
+    lon_dms = _airport_table_dms(1)
+    start_date = _airport_table_date('start_date')
+    end_date = _airport_table_date('end_date')
+
+for _attribute in AIRPORT_TABLE_ATTRIBUTES:
+    setattr(AirportRow, _attribute, _airport_table_property(_attribute))
+
+def read_csv_filtered(csvfile, usecols, dtype=None, row_filter=None, categories=(), chunksize=CSV_CHUNKSIZE):
+    '''
+    Read selected columns of a CSV in bounded chunks, keeping only the rows row_filter accepts
+
+    Peak memory is one raw chunk plus the rows kept so far rather than the whole file. Columns
+    named in categories are made categorical once the chunks are combined, so they share one
+    set of categories.
+
+    :param csvfile: path or open file handle
+    :param row_filter: function taking a chunk and returning a boolean mask of rows to keep
+    '''
+    kept = []
+    for chunk in pd.read_csv(csvfile, usecols=usecols, dtype=dtype, chunksize=chunksize, encoding='utf-8'):
+        STATS.count('rows_read', len(chunk))
+        if row_filter is not None:
+            rows_read = len(chunk)
+            chunk = chunk[row_filter(chunk)]
+            STATS.count('rows_filtered', rows_read - len(chunk))
+        kept.append(chunk)
+    if kept:
+        df = pd.concat(kept, ignore_index=True)
+    else:
+        df = pd.DataFrame(dict((column, pd.Series(dtype=(dtype or {}).get(column, object))) for column in usecols))
+    for column in categories:
+        df[column] = df[column].astype('category')
+    return df
+
+USGS_AIRPORT_CLASS = {4:'International Airport',
+                      5:'Military',
+                      2:'Municipal Airstrip / Airport',
+                      1:'Private Airstrip / Airport',
+                      3:'Regional Airport',
+                      99:'Unknown'}
+
+USGS_FCODE = {20000: 'Airport Complex',
+              22700: 'Control Tower',
+              20100: 'Runway',
+              20101: 'Taxiway',
+              20102: 'Apron\Hardstand',
+              }
+
+def get_usgs_airport_list(flat_file):
+    return AirportTable(get_usgs_airport_frame(flat_file))
+
+def get_usgs_airport_frame(flat_file):
+    airport_df = get_usgs_airport_df(flat_file)
+    airport_df = pd.DataFrame({'id': airport_df['FAA_AIRPOR'],
+                               'name': airport_df['NAME'],
+                               'lat': airport_df['Y'],
+                               'lon': airport_df['X'],
+                               'source': 'usgs',
+                               'source_id': airport_df['GLOBALID'],
+                               'type': airport_df['AIRPORT_CL'].map(USGS_AIRPORT_CLASS)})
+    return _finish_airport_frame(airport_df)
+
 def get_usgs_airport_df(flat_file):
     """Read USGS AirportPoint list and return airport details
 
@@ -203,58 +1241,42 @@ def get_usgs_airport_df(flat_file):
     # TODO: Download an updated file from https://www.transtats.bts.gov/DL_SelectFields.asp?Table_ID=288&DB_Short_Name=Aviation%20Support%20Tables
     # TODO: Allow closed or open runways to be returned
 
-    with open(flat_file, 'r') as csvfile:
-        file_contents = StringIO(csvfile.read())
-        df = pd.read_csv(file_contents)
-        us_airports = df.loc[(df.GEODB_SUB != 'Runway')]
+    with open(flat_file, 'rb') as csvfile:
+        us_airports = read_csv_filtered(csvfile,
+                                        usecols=['X', 'Y', 'FAA_AIRPOR', 'NAME', 'GLOBALID', 'AIRPORT_CL', 'GEODB_SUB'],
+                                        dtype={'X': 'float64', 'Y': 'float64', 'FAA_AIRPOR': str, 'NAME': str,
+                                               'GLOBALID': str, 'AIRPORT_CL': 'float64', 'GEODB_SUB': str},
+                                        row_filter=lambda chunk: chunk.GEODB_SUB != 'Runway',
+                                        categories=['GEODB_SUB'])
         return us_airports
 
 def get_bts_airport_list(archive):
-    airport_df = get_bts_airport_df(archive)
-    airports = []
-    for index, row in airport_df.iterrows():
-        if pd.isna(row['LAT_DEGREES']):
-            print('Skipping unknown airport:')
-            print(row)
-            continue
+    return AirportTable(get_bts_airport_frame(archive))
 
-        lat_dms = [row['LAT_HEMISPHERE'],
-                   row['LAT_DEGREES'],
-                   row['LAT_MINUTES'],
-                   row['LAT_SECONDS']]
-
-        lon_dms = [row['LON_HEMISPHERE'],
-                   row['LON_DEGREES'],
-                   row['LON_MINUTES'],
-                   row['LON_SECONDS']]
-
-        status = 'O'
-        if row['AIRPORT_IS_CLOSED'] == 1:
-            status = 'C'
-        start_date = ''
-        if not pd.isna(row['AIRPORT_START_DATE']):
-            start_date = datetime.datetime.strptime(row['AIRPORT_START_DATE'], '%Y-%m-%d')
-
-        end_date = ''
-        if not pd.isna(row['AIRPORT_THRU_DATE']):
-            end_date = datetime.datetime.strptime(row['AIRPORT_THRU_DATE'], '%Y-%m-%d')
-        airport = Airport(id=row['AIRPORT'],
-                          name=row['DISPLAY_AIRPORT_NAME'],
-                          lat=row['LATITUDE'],
-                          lon=row['LONGITUDE'],
-                          lat_dms=lat_dms,
-                          lon_dms=lon_dms,
-                          city=row['DISPLAY_AIRPORT_CITY_NAME_FULL'],
-                          state=row['AIRPORT_STATE_CODE'],
-                          icao='',
-                          start_date=start_date,
-                          end_date=end_date,
-                          status=status,
-                          source='bts',
-                          source_id=row['AIRPORT_ID']
-                          )
-        airports.append(airport)
-    return airports
+def get_bts_airport_frame(archive):
+    airport_df = get_bts_airport_df(archive)
+    # Unknown airports have no coordinates, skip them
+    airport_df = airport_df[airport_df['LAT_DEGREES'].notna()]
+    airport_df = pd.DataFrame({'id': airport_df['AIRPORT'],
+                               'name': airport_df['DISPLAY_AIRPORT_NAME'],
+                               'lat': airport_df['LATITUDE'],
+                               'lon': airport_df['LONGITUDE'],
+                               'lat_hemisphere': airport_df['LAT_HEMISPHERE'],
+                               'lat_deg': airport_df['LAT_DEGREES'],
+                               'lat_min': airport_df['LAT_MINUTES'],
+                               'lat_sec': airport_df['LAT_SECONDS'],
+                               'lon_hemisphere': airport_df['LON_HEMISPHERE'],
+                               'lon_deg': airport_df['LON_DEGREES'],
+                               'lon_min': airport_df['LON_MINUTES'],
+                               'lon_sec': airport_df['LON_SECONDS'],
+                               'city': airport_df['DISPLAY_AIRPORT_CITY_NAME_FULL'],
+                               'state': airport_df['AIRPORT_STATE_CODE'],
+                               'start_date': airport_df['AIRPORT_START_DATE'],
+                               'end_date': airport_df['AIRPORT_THRU_DATE'],
+                               'status': np.where(airport_df['AIRPORT_IS_CLOSED'] == 1, 'C', 'O'),
+                               'source': 'bts',
+                               'source_id': airport_df['AIRPORT_ID']})
+    return _finish_airport_frame(airport_df)
 
 def get_bts_airport_df(archive):
     """Read BTS Master Coordinates list and return airport details
@@ -263,65 +1285,64 @@ def get_bts_airport_df(archive):
     """
     # TODO: Download an updated file from https://www.transtats.bts.gov/DL_SelectFields.asp?Table_ID=288&DB_Short_Name=Aviation%20Support%20Tables
     # TODO: Allow closed or open runways to be returned
-    zf = zipfile.ZipFile(archive)
-    contained_files = zf.namelist()
-
-    with zf.open(contained_files[0], 'r') as csvfile:
-        file_contents = StringIO(csvfile.read().decode('utf-8'))
-        df = pd.read_csv(file_contents)
-        us_airports = df.loc[(df.AIRPORT_IS_LATEST == 1) &
-                             (df.AIRPORT_COUNTRY_CODE_ISO == 'US')   ]
-        us_airports = us_airports[['AIRPORT',
-                                   'DISPLAY_AIRPORT_NAME',
-                                   'DISPLAY_AIRPORT_CITY_NAME_FULL',
-                                   'AIRPORT_STATE_CODE',
-                                   'LATITUDE',
-                                   'LAT_HEMISPHERE',
-                                   'LAT_DEGREES',
-                                   'LAT_MINUTES',
-                                   'LAT_SECONDS',
-                                   'LONGITUDE',
-                                   'LON_HEMISPHERE',
-                                   'LON_DEGREES',
-                                   'LON_MINUTES',
-                                   'LON_SECONDS',
-                                   'AIRPORT_IS_CLOSED',
-                                   'AIRPORT_START_DATE',
-                                   'AIRPORT_THRU_DATE',
-                                   'AIRPORT_ID'
-                                   ]]
-        return us_airports
+    columns = {'AIRPORT': str,
+               'DISPLAY_AIRPORT_NAME': str,
+               'DISPLAY_AIRPORT_CITY_NAME_FULL': str,
+               'AIRPORT_STATE_CODE': str,
+               'LATITUDE': 'float64',
+               'LAT_HEMISPHERE': str,
+               'LAT_DEGREES': 'float64',
+               'LAT_MINUTES': 'float64',
+               'LAT_SECONDS': 'float64',
+               'LONGITUDE': 'float64',
+               'LON_HEMISPHERE': str,
+               'LON_DEGREES': 'float64',
+               'LON_MINUTES': 'float64',
+               'LON_SECONDS': 'float64',
+               'AIRPORT_IS_CLOSED': 'float64',
+               'AIRPORT_START_DATE': str,
+               'AIRPORT_THRU_DATE': str,
+               'AIRPORT_ID': 'int64'
+               }
+    filter_columns = {'AIRPORT_IS_LATEST': 'float64',
+                      'AIRPORT_COUNTRY_CODE_ISO': str}
+
+    # Most rows are superseded versions or foreign airports, drop them chunk by chunk while
+    # streaming the member straight out of the zip
+    with zipfile.ZipFile(archive) as zf:
+        contained_files = zf.namelist()
+        with zf.open(contained_files[0], 'r') as csvfile:
+            us_airports = read_csv_filtered(csvfile,
+                                            usecols=list(columns) + list(filter_columns),
+                                            dtype=dict(columns, **filter_columns),
+                                            row_filter=lambda chunk: ((chunk.AIRPORT_IS_LATEST == 1) &
+                                                                      (chunk.AIRPORT_COUNTRY_CODE_ISO == 'US')),
+                                            categories=['AIRPORT_STATE_CODE', 'LAT_HEMISPHERE', 'LON_HEMISPHERE'])
+    us_airports = us_airports[list(columns)]
+    for column in ['AIRPORT_START_DATE', 'AIRPORT_THRU_DATE']:
+        us_airports[column] = pd.to_datetime(us_airports[column], format='%Y-%m-%d', errors='coerce')
+    return us_airports
 
 
 def get_ourairports_airports_list(flat_file):
+    return AirportTable(get_ourairports_airports_frame(flat_file))
+
+def get_ourairports_airports_frame(flat_file):
     airport_df = get_ourairports_airports_df(flat_file)
-    airports = []
-    for index, row in airport_df.iterrows():
-        # if pd.isna(row['LAT_DEGREES']):
-        #     print('Skipping unknown airport:')
-        #     print(row)
-        #     continue
-
-        status = 'O'
-        if row['type'] == 'closed':
-            status = 'C'
-
-        airport = Airport(id=row['local_code'],
-                          name=row['name'],
-                          lat=row['latitude_deg'],
-                          lon=row['longitude_deg'],
-                          city=row['municipality'],
-                          state=row['iso_region'][-2:],
-                          icao=row['ident'],
-                          iata=row['iata_code'],
-                          status=status,
-                          type=row['type'],
-                          source='ourairports',
-                          source_id=row['id'],
-                          link=row['link']
-                          )
-        airports.append(airport)
-    return airports
+    airport_df = pd.DataFrame({'id': airport_df['local_code'],
+                               'name': airport_df['name'],
+                               'lat': airport_df['latitude_deg'],
+                               'lon': airport_df['longitude_deg'],
+                               'city': airport_df['municipality'],
+                               'state': airport_df['iso_region'].str[-2:],
+                               'icao': airport_df['ident'],
+                               'iata': airport_df['iata_code'],
+                               'status': np.where(airport_df['type'] == 'closed', 'C', 'O'),
+                               'type': airport_df['type'],
+                               'source': 'ourairports',
+                               'source_id': airport_df['id'],
+                               'link': airport_df['link']})
+    return _finish_airport_frame(airport_df)
 
 def get_ourairports_airports_df(flat_file):
     '''
@@ -333,20 +1354,23 @@ def get_ourairports_airports_df(flat_file):
     # airport_file = os.path.join(folder,'airports.csv')
 
     with open(flat_file, 'rb') as csvfile:
-        file_contents = StringIO(csvfile.read().decode('utf-8'))
-        df = pd.read_csv(file_contents)
-        us_airports = df.loc[(df.iso_country == 'US')]
-        # us_airports.fillna('')
+        us_airports = read_csv_filtered(csvfile,
+                                        usecols=['id', 'ident', 'type', 'name', 'latitude_deg', 'longitude_deg',
+                                                 'iso_country', 'iso_region', 'municipality', 'iata_code',
+                                                 'local_code', 'home_link', 'wikipedia_link'],
+                                        dtype={'id': 'int64', 'ident': str, 'type': str, 'name': str,
+                                               'latitude_deg': 'float64', 'longitude_deg': 'float64',
+                                               'iso_country': str, 'iso_region': str, 'municipality': str,
+                                               'iata_code': str, 'local_code': str, 'home_link': str,
+                                               'wikipedia_link': str},
+                                        row_filter=lambda chunk: chunk.iso_country == 'US',
+                                        categories=['type', 'iso_country', 'iso_region'])
         us_airports[['iata_code','local_code','municipality']] = us_airports[['iata_code','local_code','municipality']].fillna('')
-        merged_links = us_airports.wikipedia_link.fillna(us_airports.home_link).fillna('')
-        us_airports['link'] = merged_links
+        us_airports['link'] = us_airports.wikipedia_link.fillna(us_airports.home_link).fillna('')
         return us_airports
 
 
-def get_osm_airports_list(flat_file):
-    airport_df = get_osm_airports_df(flat_file)
-    airports = []
-    CLOSED_TYPES = {'aerodrome (historical)',
+OSM_CLOSED_TYPES = {'aerodrome (historical)',
                     'closed_aerodrome',
                     'aerodrome_closed',
                     'obsolete',
@@ -354,30 +1378,23 @@ def get_osm_airports_list(flat_file):
                     'disused',
                     'runway_disused'}
 
-    for index, row in airport_df.iterrows():
-        # if pd.isna(row['LAT_DEGREES']):
-        #     print('Skipping unknown airport:')
-        #     print(row)
-        #     continue
-        if row['aeroway'] in CLOSED_TYPES:
-            status = 'C'
-        else:
-            status = 'O'
-
-        airport = Airport(id=row['ref'],
-                          name=row['name'],
-                          # state=row['postal'],
-                          lat=row['Y'],
-                          lon=row['X'],
-                          iata=row['iata'],
-                          icao=row['icao'],
-                          status=status,
-                          source='openstreetmaps',
-                          type=row['aeroway'],
-                          source_id=row['NodeId']
-                          )
-        airports.append(airport)
-    return airports
+def get_osm_airports_list(flat_file):
+    return AirportTable(get_osm_airports_frame(flat_file))
+
+def get_osm_airports_frame(flat_file):
+    airport_df = get_osm_airports_df(flat_file)
+    airport_df = pd.DataFrame({'id': airport_df['ref'],
+                               'name': airport_df['name'],
+                               # 'state': airport_df['postal'],
+                               'lat': airport_df['Y'],
+                               'lon': airport_df['X'],
+                               'iata': airport_df['iata'],
+                               'icao': airport_df['icao'],
+                               'status': np.where(airport_df['aeroway'].isin(OSM_CLOSED_TYPES), 'C', 'O'),
+                               'source': 'openstreetmaps',
+                               'type': airport_df['aeroway'],
+                               'source_id': airport_df['NodeId']})
+    return _finish_airport_frame(airport_df)
 
 def get_osm_airports_df(flat_file):
     '''
@@ -415,50 +1432,48 @@ def get_osm_airports_df(flat_file):
                     'displaced_threshold',
                     'threshold',
                     'fbo'}
+    def is_named_facility(chunk):
+        return (~chunk['aeroway'].isin(NON_FACILITY) &
+                ((chunk.iata.notna()) |
+                 (chunk.icao.notna()) |
+                 (chunk.ref.notna()) |
+                 (chunk.name.notna())))
+
     with open(flat_file, 'rb') as csvfile:
-        file_contents = StringIO(csvfile.read().decode('utf-8'))
-        df = pd.read_csv(file_contents)
-        df = df[~df['aeroway'].isin(NON_FACILITY)]
-        us_airports = df.loc[(df.iata.notna()) |
-                             (df.icao.notna()) |
-                             (df.ref.notna()) |
-                             (df.name.notna())]
-        print(us_airports.aeroway.unique())
+        us_airports = read_csv_filtered(csvfile,
+                                        usecols=['X', 'Y', 'NodeId', 'aeroway', 'name', 'ref', 'iata', 'icao'],
+                                        dtype={'X': 'float64', 'Y': 'float64', 'NodeId': 'int64', 'aeroway': str,
+                                               'name': str, 'ref': str, 'iata': str, 'icao': str},
+                                        row_filter=is_named_facility,
+                                        categories=['aeroway'])
+        if STATS.enabled:
+            for aeroway, n in us_airports.aeroway.value_counts().items():
+                STATS.count('aeroway.' + str(aeroway), n)
         # The ref seems to be used as a generic ID key. The OSM wiki says to use the "faa" field for FAA LOCID, but
         # that is not present in the shapefiles download from http://osm2shp.ru/, so I'm not including it here
-        us_airports.ref.fillna(us_airports.icao, inplace=True)
-        us_airports.fillna('', inplace=True)
+        us_airports['ref'] = us_airports.ref.fillna(us_airports.icao)
+        us_airports[['name', 'ref', 'iata', 'icao']] = us_airports[['name', 'ref', 'iata', 'icao']].fillna('')
 
     return us_airports
 
 def get_abandoned_airports_list(flat_file):
+    return AirportTable(get_abandoned_airports_frame(flat_file))
+
+def get_abandoned_airports_frame(flat_file):
     airport_df = get_abandoned_airports_df(flat_file)
-    airports = []
-    for index, row in airport_df.iterrows():
-        # if pd.isna(row['LAT_DEGREES']):
-        #     print('Skipping unknown airport:')
-        #     print(row)
-        #     continue
-
-        airport_parts = row['Airport'].split(',')
-        name = ','.join(airport_parts[:-2])
-        city = airport_parts[-2]
-        if len(airport_parts) < 3:
-            # Malformed (city, state), just split it up into two parts
-            name = airport_parts[0]
-            city = airport_parts[-1]
-
-        airport = Airport(name=name,
-                          lat=row['Lat'],
-                          lon=row['Lon'],
-                          city=city,
-                          state=row['State'],
-                          status='C',
-                          source='abandoned_airfields',
-                          link=row['Link']
-                          )
-        airports.append(airport)
-    return airports
+    # "Name, City, State": everything before the last two commas is the name
+    airport_parts = airport_df['Airport'].str.rsplit(',', n=2, expand=True).reindex(columns=[0, 1, 2])
+    # Malformed (city, state), just split it up into two parts
+    city = airport_parts[1].fillna(airport_parts[0])
+    airport_df = pd.DataFrame({'name': airport_parts[0],
+                               'lat': airport_df['Lat'],
+                               'lon': airport_df['Lon'],
+                               'city': city,
+                               'state': airport_df['State'],
+                               'status': 'C',
+                               'source': 'abandoned_airfields',
+                               'link': airport_df['Link']})
+    return _finish_airport_frame(airport_df)
 
 def get_abandoned_airports_df(flat_file):
     '''
@@ -468,419 +1483,1743 @@ def get_abandoned_airports_df(flat_file):
     http://www.airfields-freeman.com/
     '''
 
-    with open(flat_file, 'r') as csvfile:
-        file_contents = StringIO(csvfile.read())
-        df = pd.read_csv(file_contents)
+    with open(flat_file, 'rb') as csvfile:
+        df = read_csv_filtered(csvfile,
+                               usecols=['Airport', 'Lat', 'Lon', 'State', 'Link'],
+                               dtype={'Airport': str, 'Lat': 'float64', 'Lon': 'float64', 'State': str, 'Link': str},
+                               categories=['State'])
         return df
 
 def get_nfdc_airport_list(archive):
-    airport_df = get_nfdc_airport_df(archive)
-    airports = []
-    for index, row in airport_df.iterrows():
-        # us_airports = df[['LOCATION IDENTIFIER',
-        #                   'LANDING FACILITY TYPE',
-        #                   'BOUNDARY ARTCC IDENTIFIER',
-        #                   'RESPONSIBLE ARTCC IDENTIFIER',
-        #                   'AIR TRAFFIC CONTROL TOWER LOCATED ON AIRPORT',
-        #                   'LENS COLOR OF OPERABLE BEACON LOCATED ON THE AIRPORT',
-        #                   'ICAO IDENTIFIER'
-        #                   ]]
-
-        lat_formatted = row['AIRPORT REFERENCE POINT LATITUDE (FORMATTED)']
-
-        lat_dms = [lat_formatted[-1],
-                   float(lat_formatted[:2]),
-                   float(lat_formatted[3:5]),
-                   float(lat_formatted[6:13])]
-        lat = row['AIRPORT REFERENCE POINT LATITUDE (SECONDS)']
-        lat = float(lat[0:-1])/3600.0
-        if lat_dms[0] == 'S':
-            lat = lat*(-1)
-
-        lon_formatted = row['AIRPORT REFERENCE POINT LONGITUDE (FORMATTED)']
-
-        lon_dms = [lon_formatted[-1],
-                   float(lon_formatted[:3]),
-                   float(lon_formatted[4:6]),
-                   float(lon_formatted[7:14])]
-        lon = row['AIRPORT REFERENCE POINT LONGITUDE (SECONDS)']
-        lon = float(lon[0:-1])/3600.0
-        if lon_dms[0] == 'W':
-            lon = lon*(-1)
-
-        status = row['AIRPORT STATUS CODE']
-
-        start_date = ''
-        if not pd.isna(row['AIRPORT ACTIVATION DATE (MM/YYYY)']):
-            start_date = datetime.datetime.strptime(row['AIRPORT ACTIVATION DATE (MM/YYYY)'], '%m/%Y')
-
-        end_date = ''
-        if not pd.isna(row['LAST PHYSICAL INSPECTION DATE (MMDDYYYY)']):
-            inspection_date = str(int(row['LAST PHYSICAL INSPECTION DATE (MMDDYYYY)'])).zfill(8)
-            end_date = datetime.datetime.strptime(inspection_date, '%m%d%Y')
-            if datetime.datetime.now() - end_date < datetime.timedelta(days = INSPECTION_THRESHOLD):
-                # This aiport was inspected resently, probably not a closure time?
-                end_date = ''
-
-        airport = Airport(id=row['LOCATION IDENTIFIER'],
-                          name=row['OFFICIAL FACILITY NAME'],
-                          lat=lat,
-                          lon=lon,
-                          lat_dms=lat_dms,
-                          lon_dms=lon_dms,
-                          city=row['ASSOCIATED CITY NAME'],
-                          state=row['ASSOCIATED STATE POST OFFICE CODE'],
-                          icao=row['ICAO IDENTIFIER'],
-                          start_date=start_date,
-                          end_date=end_date,
-                          type=row['LANDING FACILITY TYPE'],
-                          status=status,
-                          source='nfdc',
-                          source_id=row['LANDING FACILITY SITE NUMBER']
-                          )
-        airports.append(airport)
-    return airports
-
-def get_nfdc_airport_df(archive):
+    return AirportTable(get_nfdc_airport_frame(archive))
+
+def get_nfdc_airport_frame(archive):
+    return _nfdc_airport_frame(get_nfdc_airport_df(archive))
+
+def _nfdc_airport_frame(airport_df):
+    # airports_to_df frame from the APT table of get_nfdc_tables
+    lat_formatted = airport_df['AIRPORT REFERENCE POINT LATITUDE (FORMATTED)'].astype(str)
+    lat_seconds = airport_df['AIRPORT REFERENCE POINT LATITUDE (SECONDS)'].astype(str)
+    lat = lat_seconds.str[0:-1].astype(float)/3600.0
+    lat = lat.where(lat_formatted.str[-1] != 'S', -lat)
+
+    lon_formatted = airport_df['AIRPORT REFERENCE POINT LONGITUDE (FORMATTED)'].astype(str)
+    lon_seconds = airport_df['AIRPORT REFERENCE POINT LONGITUDE (SECONDS)'].astype(str)
+    lon = lon_seconds.str[0:-1].astype(float)/3600.0
+    lon = lon.where(lon_formatted.str[-1] != 'W', -lon)
+
+    start_date = pd.to_datetime(airport_df['AIRPORT ACTIVATION DATE (MM/YYYY)'], format='%m/%Y', errors='coerce')
+
+    inspection_date = pd.to_numeric(airport_df['LAST PHYSICAL INSPECTION DATE (MMDDYYYY)'], errors='coerce')
+    inspection_date = inspection_date.astype('Int64').astype(str).str.zfill(8)
+    end_date = pd.to_datetime(inspection_date, format='%m%d%Y', errors='coerce')
+    # Airports inspected recently are probably not closed, don't treat the inspection as a closure time
+    end_date = end_date.where(datetime.datetime.now() - end_date >= datetime.timedelta(days=INSPECTION_THRESHOLD))
+
+    airport_df = pd.DataFrame({'id': airport_df['LOCATION IDENTIFIER'],
+                               'name': airport_df['OFFICIAL FACILITY NAME'],
+                               'lat': lat,
+                               'lon': lon,
+                               'lat_hemisphere': lat_formatted.str[-1],
+                               'lat_deg': lat_formatted.str[:2].astype(float),
+                               'lat_min': lat_formatted.str[3:5].astype(float),
+                               'lat_sec': lat_formatted.str[6:13].astype(float),
+                               'lon_hemisphere': lon_formatted.str[-1],
+                               'lon_deg': lon_formatted.str[:3].astype(float),
+                               'lon_min': lon_formatted.str[4:6].astype(float),
+                               'lon_sec': lon_formatted.str[7:14].astype(float),
+                               # Commas in NFDC city names aren't a city, state separator, keep all of the name
+                               'city': airport_df['ASSOCIATED CITY NAME'].astype(str).str.replace(',', ';'),
+                               'state': airport_df['ASSOCIATED STATE POST OFFICE CODE'],
+                               'icao': airport_df['ICAO IDENTIFIER'],
+                               'start_date': start_date,
+                               'end_date': end_date,
+                               'type': airport_df['LANDING FACILITY TYPE'],
+                               'status': airport_df['AIRPORT STATUS CODE'],
+                               'source': 'nfdc',
+                               'source_id': airport_df['LANDING FACILITY SITE NUMBER']})
+    return _finish_airport_frame(airport_df)
+
+# Fixed width layout of APT records in the NASR APT.txt file: (field name, start, end) slices
+NFDC_APT_FIELDS = [("RECORD TYPE INDICATOR", 0, 3),
+                   ("LANDING FACILITY SITE NUMBER", 3, 14),
+                   ("LANDING FACILITY TYPE", 14, 27),
+                   ("LOCATION IDENTIFIER", 27, 31),
+                   ("INFORMATION EFFECTIVE DATE (MM/DD/YYYY)", 31, 41),
+                   ("FAA REGION CODE", 41, 44),
+                   ("FAA DISTRICT OR FIELD OFFICE CODE", 44, 48),
+                   ("ASSOCIATED STATE POST OFFICE CODE", 48, 50),
+                   ("ASSOCIATED STATE NAME", 50, 70),
+                   ("ASSOCIATED COUNTY (OR PARISH) NAME", 70, 91),
+                   ("ASSOCIATED COUNTYS STATE (POST OFFICE CODE)", 91, 93),
+                   ("ASSOCIATED CITY NAME", 93, 133),
+                   ("OFFICIAL FACILITY NAME", 133, 183),
+                   ("AIRPORT OWNERSHIP TYPE", 183, 185),
+                   ("FACILITY USE", 185, 187),
+                   ("FACILITY OWNERS NAME", 187, 222),
+                   ("OWNERS ADDRESS", 222, 294),
+                   ("OWNERS CITY, STATE AND ZIP CODE", 294, 339),
+                   ("FACILITY MANAGERS NAME", 355, 390),
+                   ("MANAGERS ADDRESS", 390, 462),
+                   ("MANAGERS CITY, STATE AND ZIP CODE", 462, 507),
+                   ("AIRPORT REFERENCE POINT LATITUDE (FORMATTED)", 523, 538),
+                   ("AIRPORT REFERENCE POINT LATITUDE (SECONDS)", 538, 550),
+                   ("AIRPORT REFERENCE POINT LONGITUDE (FORMATTED)", 550, 565),
+                   ("AIRPORT REFERENCE POINT LONGITUDE (SECONDS)", 565, 577),
+                   ("AIRPORT REFERENCE POINT DETERMINATION METHOD", 577, 578),
+                   ("AIRPORT ELEVATION DETERMINATION METHOD", 585, 586),
+                   ("MAGNETIC VARIATION AND DIRECTION", 586, 589),
+                   ("MAGNETIC VARIATION EPOCH YEAR", 589, 593),
+                   ("AERONAUTICAL SECTIONAL CHART ON WHICH FACILITY", 597, 627),
+                   ("DISTANCE FROM CENTRAL BUSINESS DISTRICT OF", 627, 629),
+                   ("DIRECTION OF AIRPORT FROM CENTRAL BUSINESS", 629, 632),
+                   ("BOUNDARY ARTCC IDENTIFIER", 637, 641),
+                   ("BOUNDARY ARTCC (FAA) COMPUTER IDENTIFIER", 641, 644),
+                   ("BOUNDARY ARTCC NAME", 644, 674),
+                   ("RESPONSIBLE ARTCC IDENTIFIER", 674, 678),
+                   ("RESPONSIBLE ARTCC (FAA) COMPUTER IDENTIFIER", 678, 681),
+                   ("RESPONSIBLE ARTCC NAME", 681, 711),
+                   ("TIE-IN FSS PHYSICALLY LOCATED ON FACILITY", 711, 712),
+                   ("TIE-IN FLIGHT SERVICE STATION (FSS) IDENTIFIER", 712, 716),
+                   ("TIE-IN FSS NAME", 716, 746),
+                   ("LOCAL PHONE NUMBER FROM AIRPORT TO FSS", 746, 762),
+                   ("TOLL FREE PHONE NUMBER FROM AIRPORT TO FSS", 762, 778),
+                   ("ALTERNATE FSS IDENTIFIER", 778, 782),
+                   ("ALTERNATE FSS NAME", 782, 812),
+                   ("TOLL FREE PHONE NUMBER FROM AIRPORT TO", 812, 828),
+                   ("IDENTIFIER OF THE FACILITY RESPONSIBLE FOR", 828, 832),
+                   ("AVAILABILITY OF NOTAM D SERVICE AT AIRPORT", 832, 833),
+                   ("AIRPORT ACTIVATION DATE (MM/YYYY)", 833, 840),
+                   ("AIRPORT STATUS CODE", 840, 842),
+                   ("AIRPORT ARFF CERTIFICATION TYPE AND DATE", 842, 857),
+                   ("NPIAS/FEDERAL AGREEMENTS CODE", 857, 864),
+                   ("AIRPORT AIRSPACE ANALYSIS DETERMINATION", 864, 877),
+                   ("FACILITY HAS BEEN DESIGNATED BY THE U.S. TREASURY", 877, 878),
+                   ("FACILITY HAS BEEN DESIGNATED BY THE U.S. TREASURY (LANDING RIGHTS)", 878, 879),
+                   ("FACILITY HAS MILITARY/CIVIL JOINT USE AGREEMENT", 879, 880),
+                   ("AIRPORT HAS ENTERED INTO AN AGREEMENT THAT", 880, 881),
+                   ("AIRPORT INSPECTION METHOD", 881, 883),
+                   ("AGENCY/GROUP PERFORMING PHYSICAL INSPECTION", 883, 884),
+                   ("LAST PHYSICAL INSPECTION DATE (MMDDYYYY)", 884, 892),
+                   ("LAST DATE INFORMATION REQUEST WAS COMPLETED", 892, 900),
+                   ("FUEL TYPES AVAILABLE FOR PUBLIC USE AT THE", 900, 940),
+                   ("AIRFRAME REPAIR SERVICE AVAILABILITY/TYPE", 940, 945),
+                   ("POWER PLANT (ENGINE) REPAIR AVAILABILITY/TYPE", 945, 950),
+                   ("TYPE OF BOTTLED OXYGEN AVAILABLE (VALUE REPRESENTS", 950, 958),
+                   ("TYPE OF BULK OXYGEN AVAILABLE (VALUE REPRESENTS", 958, 966),
+                   ("AIRPORT LIGHTING SCHEDULE", 966, 973),
+                   ("BEACON LIGHTING SCHEDULE", 973, 980),
+                   ("AIR TRAFFIC CONTROL TOWER LOCATED ON AIRPORT", 980, 981),
+                   ("UNICOM FREQUENCY AVAILABLE AT THE AIRPORT", 981, 988),
+                   ("COMMON TRAFFIC ADVISORY FREQUENCY (CTAF)", 988, 995),
+                   ("SEGMENTED CIRCLE AIRPORT MARKER SYSTEM ON THE AIRPORT", 995, 999),
+                   ("LENS COLOR OF OPERABLE BEACON LOCATED ON THE AIRPORT", 999, 1002),
+                   ("LANDING FEE CHARGED TO NON-COMMERCIAL USERS OF", 1002, 1003),
+                   ("A Y IN THIS FIELD INDICATES THAT THE LANDING", 1003, 1004),
+                   ("12-MONTH ENDING DATE ON WHICH ANNUAL OPERATIONS DATA", 1061, 1071),
+                   ("AIRPORT POSITION SOURCE", 1071, 1087),
+                   ("AIRPORT POSITION SOURCE DATE (MM/DD/YYYY)", 1087, 1097),
+                   ("AIRPORT ELEVATION SOURCE", 1097, 1113),
+                   ("AIRPORT ELEVATION SOURCE DATE (MM/DD/YYYY)", 1113, 1123),
+                   ("CONTRACT FUEL AVAILABLE", 1123, 1124),
+                   ("TRANSIENT STORAGE FACILITIES", 1124, 1136),
+                   ("OTHER AIRPORT SERVICES AVAILABLE", 1136, 1207),
+                   ("WIND INDICATOR", 1207, 1210),
+                   ("ICAO IDENTIFIER", 1210, 1217),
+                   ("AIRPORT RECORD FILLER (BLANK)", 1217, 1529)]
+
+# Fixed width layouts of the other APT.txt record types, keyed to their APT record by site number
+NFDC_ATT_FIELDS = [("RECORD TYPE INDICATOR", 0, 3),
+                   ("LANDING FACILITY SITE NUMBER", 3, 14),
+                   ("LANDING FACILITY STATE POST OFFICE CODE", 14, 16),
+                   ("ATTENDANCE SCHEDULE SEQUENCE NUMBER", 16, 18),
+                   ("AIRPORT ATTENDANCE SCHEDULE", 18, 126)]
+
+def _nfdc_runway_end_fields(end, offset):
+    # Base and reciprocal runway end blocks of RWY records share one layout, offset apart
+    return [("{} END IDENTIFIER".format(end), 65 + offset, 68 + offset),
+            ("{} END TRUE ALIGNMENT".format(end), 68 + offset, 71 + offset),
+            ("{} END INSTRUMENT LANDING SYSTEM (ILS) TYPE".format(end), 71 + offset, 81 + offset),
+            ("{} END RIGHT HAND TRAFFIC PATTERN".format(end), 81 + offset, 82 + offset),
+            ("{} END RUNWAY MARKINGS (TYPE)".format(end), 82 + offset, 87 + offset),
+            ("{} END RUNWAY MARKINGS (CONDITION)".format(end), 87 + offset, 88 + offset),
+            ("{} END LATITUDE OF PHYSICAL RUNWAY END (FORMATTED)".format(end), 88 + offset, 103 + offset),
+            ("{} END LATITUDE OF PHYSICAL RUNWAY END (SECONDS)".format(end), 103 + offset, 115 + offset),
+            ("{} END LONGITUDE OF PHYSICAL RUNWAY END (FORMATTED)".format(end), 115 + offset, 130 + offset),
+            ("{} END LONGITUDE OF PHYSICAL RUNWAY END (SECONDS)".format(end), 130 + offset, 142 + offset),
+            ("{} END ELEVATION AT PHYSICAL RUNWAY END".format(end), 142 + offset, 149 + offset),
+            ("{} END THRESHOLD CROSSING HEIGHT".format(end), 149 + offset, 152 + offset),
+            ("{} END VISUAL GLIDE PATH ANGLE".format(end), 152 + offset, 156 + offset),
+            ("{} END LATITUDE AT DISPLACED THRESHOLD (FORMATTED)".format(end), 156 + offset, 171 + offset),
+            ("{} END LATITUDE AT DISPLACED THRESHOLD (SECONDS)".format(end), 171 + offset, 183 + offset),
+            ("{} END LONGITUDE AT DISPLACED THRESHOLD (FORMATTED)".format(end), 183 + offset, 198 + offset),
+            ("{} END LONGITUDE AT DISPLACED THRESHOLD (SECONDS)".format(end), 198 + offset, 210 + offset),
+            ("{} END ELEVATION AT DISPLACED THRESHOLD".format(end), 210 + offset, 217 + offset),
+            ("{} END DISPLACED THRESHOLD LENGTH FROM RUNWAY END".format(end), 217 + offset, 221 + offset),
+            ("{} END ELEVATION AT TOUCHDOWN ZONE".format(end), 221 + offset, 228 + offset)]
+
+NFDC_RWY_FIELDS = [("RECORD TYPE INDICATOR", 0, 3),
+                   ("LANDING FACILITY SITE NUMBER", 3, 14),
+                   ("LANDING FACILITY STATE POST OFFICE CODE", 14, 16),
+                   ("RUNWAY IDENTIFICATION", 16, 23),
+                   ("PHYSICAL RUNWAY LENGTH (NEAREST FOOT)", 23, 28),
+                   ("PHYSICAL RUNWAY WIDTH (NEAREST FOOT)", 28, 32),
+                   ("RUNWAY SURFACE TYPE AND CONDITION", 32, 44),
+                   ("RUNWAY SURFACE TREATMENT", 44, 49),
+                   ("PAVEMENT CLASSIFICATION NUMBER (PCN)", 49, 60),
+                   ("RUNWAY LIGHTS EDGE INTENSITY", 60, 65)] + \
+                  _nfdc_runway_end_fields('BASE', 0) + _nfdc_runway_end_fields('RECIPROCAL', 222)
+
+NFDC_ARS_FIELDS = [("RECORD TYPE INDICATOR", 0, 3),
+                   ("LANDING FACILITY SITE NUMBER", 3, 14),
+                   ("LANDING FACILITY STATE POST OFFICE CODE", 14, 16),
+                   ("RUNWAY IDENTIFICATION", 16, 23),
+                   ("RUNWAY END IDENTIFIER", 23, 26),
+                   ("TYPE OF AIRCRAFT ARRESTING DEVICE", 26, 35)]
+
+NFDC_RMK_FIELDS = [("RECORD TYPE INDICATOR", 0, 3),
+                   ("LANDING FACILITY SITE NUMBER", 3, 14),
+                   ("LANDING FACILITY STATE POST OFFICE CODE", 14, 16),
+                   ("REMARK ELEMENT NAME", 16, 29),
+                   ("REMARK TEXT", 29, 1529)]
+
+NFDC_RECORD_FIELDS = {'APT': NFDC_APT_FIELDS,
+                      'ATT': NFDC_ATT_FIELDS,
+                      'RWY': NFDC_RWY_FIELDS,
+                      'ARS': NFDC_ARS_FIELDS,
+                      'RMK': NFDC_RMK_FIELDS}
+
+NFDC_AIRPORT_COLUMNS = ['LOCATION IDENTIFIER',
+                        'OFFICIAL FACILITY NAME',
+                        'ASSOCIATED CITY NAME',
+                        'ASSOCIATED STATE POST OFFICE CODE',
+                        'AIRPORT REFERENCE POINT LATITUDE (SECONDS)',
+                        'AIRPORT REFERENCE POINT LATITUDE (FORMATTED)',
+                        'AIRPORT REFERENCE POINT LONGITUDE (SECONDS)',
+                        'AIRPORT REFERENCE POINT LONGITUDE (FORMATTED)',
+                        'AIRPORT STATUS CODE',
+                        'AIRPORT ACTIVATION DATE (MM/YYYY)',
+                        'LAST PHYSICAL INSPECTION DATE (MMDDYYYY)',
+                        'LANDING FACILITY TYPE',
+                        'BOUNDARY ARTCC IDENTIFIER',
+                        'RESPONSIBLE ARTCC IDENTIFIER',
+                        'AIR TRAFFIC CONTROL TOWER LOCATED ON AIRPORT',
+                        'LENS COLOR OF OPERABLE BEACON LOCATED ON THE AIRPORT',
+                        'ICAO IDENTIFIER',
+                        'LANDING FACILITY SITE NUMBER'
+                        ]
+
+# Columns get_nfdc_tables keeps by default: the airport columns of APT records and everything else
+NFDC_RECORD_COLUMNS = dict((record_type, [name for name, start, end in fields if name != 'RECORD TYPE INDICATOR'])
+                           for record_type, fields in NFDC_RECORD_FIELDS.items())
+NFDC_RECORD_COLUMNS['APT'] = NFDC_AIRPORT_COLUMNS
+
+def get_nfdc_airport_df(archive, columns=NFDC_AIRPORT_COLUMNS):
     """Read NFDC airport list and return: Country, State, Airport name, Lat, Lon, Operational
 
+    APT records are sliced straight out of APT.txt inside the zip using NFDC_APT_FIELDS, keeping
+    only the requested columns. Records without a state or without readable reference point
+    coordinates are skipped.
+
     source data:
     https://www.faa.gov/air_traffic/flight_info/aeronav/aero_data/NASR_Subscription/
     """
-    airport_list = []
-    nfdc_filename = 'nfdc_airports.csv'
-    nfdc_file = open(nfdc_filename, 'w')
-    nfdc_header = '"' + '","'.join(
-        ["RECORD TYPE INDICATOR".replace("'", ''), "LANDING FACILITY SITE NUMBER".replace("'", ''),
-         "LANDING FACILITY TYPE".replace("'", ''), "LOCATION IDENTIFIER".replace("'", ''),
-         "INFORMATION EFFECTIVE DATE (MM/DD/YYYY)".replace("'", ''), "FAA REGION CODE".replace("'", ''),
-         "FAA DISTRICT OR FIELD OFFICE CODE".replace("'", ''), "ASSOCIATED STATE POST OFFICE CODE".replace("'", ''),
-         "ASSOCIATED STATE NAME".replace("'", ''), "ASSOCIATED COUNTY (OR PARISH) NAME".replace("'", ''),
-         "ASSOCIATED COUNTY'S STATE (POST OFFICE CODE)".replace("'", ''), "ASSOCIATED CITY NAME".replace("'", ''),
-         "OFFICIAL FACILITY NAME".replace("'", ''), "AIRPORT OWNERSHIP TYPE".replace("'", ''),
-         "FACILITY USE".replace("'", ''), "FACILITY OWNER'S NAME".replace("'", ''), "OWNER'S ADDRESS".replace("'", ''),
-         "OWNER'S CITY, STATE AND ZIP CODE".replace("'", ''), "FACILITY MANAGER'S NAME".replace("'", ''),
-         "MANAGER'S ADDRESS".replace("'", ''), "MANAGER'S CITY, STATE AND ZIP CODE".replace("'", ''),
-         "AIRPORT REFERENCE POINT LATITUDE (FORMATTED)".replace("'", ''),
-         "AIRPORT REFERENCE POINT LATITUDE (SECONDS)".replace("'", ''),
-         "AIRPORT REFERENCE POINT LONGITUDE (FORMATTED)".replace("'", ''),
-         "AIRPORT REFERENCE POINT LONGITUDE (SECONDS)".replace("'", ''),
-         "AIRPORT REFERENCE POINT DETERMINATION METHOD".replace("'", ''),
-         "AIRPORT ELEVATION DETERMINATION METHOD".replace("'", ''), "MAGNETIC VARIATION AND DIRECTION".replace("'", ''),
-         "MAGNETIC VARIATION EPOCH YEAR".replace("'", ''),
-         "AERONAUTICAL SECTIONAL CHART ON WHICH FACILITY".replace("'", ''),
-         "DISTANCE FROM CENTRAL BUSINESS DISTRICT OF".replace("'", ''),
-         "DIRECTION OF AIRPORT FROM CENTRAL BUSINESS".replace("'", ''), "BOUNDARY ARTCC IDENTIFIER".replace("'", ''),
-         "BOUNDARY ARTCC (FAA) COMPUTER IDENTIFIER".replace("'", ''), "BOUNDARY ARTCC NAME".replace("'", ''),
-         "RESPONSIBLE ARTCC IDENTIFIER".replace("'", ''),
-         "RESPONSIBLE ARTCC (FAA) COMPUTER IDENTIFIER".replace("'", ''), "RESPONSIBLE ARTCC NAME".replace("'", ''),
-         "TIE-IN FSS PHYSICALLY LOCATED ON FACILITY".replace("'", ''),
-         "TIE-IN FLIGHT SERVICE STATION (FSS) IDENTIFIER".replace("'", ''), "TIE-IN FSS NAME".replace("'", ''),
-         "LOCAL PHONE NUMBER FROM AIRPORT TO FSS".replace("'", ''),
-         "TOLL FREE PHONE NUMBER FROM AIRPORT TO FSS".replace("'", ''), "ALTERNATE FSS IDENTIFIER".replace("'", ''),
-         "ALTERNATE FSS NAME".replace("'", ''), "TOLL FREE PHONE NUMBER FROM AIRPORT TO".replace("'", ''),
-         "IDENTIFIER OF THE FACILITY RESPONSIBLE FOR".replace("'", ''),
-         "AVAILABILITY OF NOTAM 'D' SERVICE AT AIRPORT".replace("'", ''),
-         "AIRPORT ACTIVATION DATE (MM/YYYY)".replace("'", ''), "AIRPORT STATUS CODE".replace("'", ''),
-         "AIRPORT ARFF CERTIFICATION TYPE AND DATE".replace("'", ''), "NPIAS/FEDERAL AGREEMENTS CODE".replace("'", ''),
-         "AIRPORT AIRSPACE ANALYSIS DETERMINATION".replace("'", ''),
-         "FACILITY HAS BEEN DESIGNATED BY THE U.S. TREASURY".replace("'", ''),
-         "FACILITY HAS BEEN DESIGNATED BY THE U.S. TREASURY".replace("'", ''),
-         "FACILITY HAS MILITARY/CIVIL JOINT USE AGREEMENT".replace("'", ''),
-         "AIRPORT HAS ENTERED INTO AN AGREEMENT THAT".replace("'", ''), "AIRPORT INSPECTION METHOD".replace("'", ''),
-         "AGENCY/GROUP PERFORMING PHYSICAL INSPECTION".replace("'", ''),
-         "LAST PHYSICAL INSPECTION DATE (MMDDYYYY)".replace("'", ''),
-         "LAST DATE INFORMATION REQUEST WAS COMPLETED".replace("'", ''),
-         "FUEL TYPES AVAILABLE FOR PUBLIC USE AT THE".replace("'", ''),
-         "AIRFRAME REPAIR SERVICE AVAILABILITY/TYPE".replace("'", ''),
-         "POWER PLANT (ENGINE) REPAIR AVAILABILITY/TYPE".replace("'", ''),
-         "TYPE OF BOTTLED OXYGEN AVAILABLE (VALUE REPRESENTS".replace("'", ''),
-         "TYPE OF BULK OXYGEN AVAILABLE (VALUE REPRESENTS".replace("'", ''),
-         "AIRPORT LIGHTING SCHEDULE".replace("'", ''), "BEACON LIGHTING SCHEDULE".replace("'", ''),
-         "AIR TRAFFIC CONTROL TOWER LOCATED ON AIRPORT".replace("'", ''),
-         "UNICOM FREQUENCY AVAILABLE AT THE AIRPORT".replace("'", ''),
-         "COMMON TRAFFIC ADVISORY FREQUENCY (CTAF)".replace("'", ''),
-         "SEGMENTED CIRCLE AIRPORT MARKER SYSTEM ON THE AIRPORT".replace("'", ''),
-         "LENS COLOR OF OPERABLE BEACON LOCATED ON THE AIRPORT".replace("'", ''),
-         "LANDING FEE CHARGED TO NON-COMMERCIAL USERS OF".replace("'", ''),
-         "A Y IN THIS FIELD INDICATES THAT THE LANDING".replace("'", ''),
-         "12-MONTH ENDING DATE ON WHICH ANNUAL OPERATIONS DATA".replace("'", ''),
-         "AIRPORT POSITION SOURCE".replace("'", ''), "AIRPORT POSITION SOURCE DATE (MM/DD/YYYY)".replace("'", ''),
-         "AIRPORT ELEVATION SOURCE".replace("'", ''), "AIRPORT ELEVATION SOURCE DATE (MM/DD/YYYY)".replace("'", ''),
-         "CONTRACT FUEL AVAILABLE".replace("'", ''), "TRANSIENT STORAGE FACILITIES".replace("'", ''),
-         "OTHER AIRPORT SERVICES AVAILABLE".replace("'", ''), "WIND INDICATOR".replace("'", ''),
-         "ICAO IDENTIFIER".replace("'", ''), "AIRPORT RECORD FILLER (BLANK)".replace("'", '')]) + '"'
-    nfdc_file.write(nfdc_header)
-
-    i = 0
-    zf = zipfile.ZipFile(archive)
-
-    with zf.open('APT.txt', 'r') as aptfile:
-        line = aptfile.readline()
-        while len(line) > 0:
-            try:
-                line = line.decode('utf-8').replace(',', ';')
-                i = i + 1
-                if line[0:3] == 'APT':
+    return get_nfdc_tables(archive, {'APT': columns})['APT']
+
+def get_nfdc_tables(archive, record_columns=NFDC_RECORD_COLUMNS):
+    '''
+    Split APT.txt into one table per record type in a single pass over the file
+
+    Every record type in record_columns is sliced with its NFDC_RECORD_FIELDS layout, the
+    others are skipped. APT records are checked as get_nfdc_airport_df always has, the other
+    tables join to them on LANDING FACILITY SITE NUMBER.
+
+    :param record_columns: {record type: [field names]}, e.g. {'APT': NFDC_AIRPORT_COLUMNS, 'RWY': [...]}
+    :return: {record type: DataFrame of the requested columns}, all fields as stripped strings
+    '''
+    slices = {}
+    for record_type, columns in record_columns.items():
+        field_slices = dict((name, (start, end)) for name, start, end in NFDC_RECORD_FIELDS[record_type])
+        slices[record_type.encode('ascii')] = [field_slices[column] for column in columns]
+    records = dict((record_type, []) for record_type in slices)
+    counts = dict((record_type, 0) for record_type in slices)
+    skipped = 0
+    other_skipped = 0
+    stateless = 0
+
+    with zipfile.ZipFile(archive) as zf, zf.open('APT.txt', 'r') as aptfile:
+        for line_number, line in enumerate(aptfile, 1):
+            record_type = line[:3]
+            if record_type not in slices:
+                continue
+            counts[record_type] += 1
+            if record_type == b'APT':
+                try:
+                    line = line.decode('utf-8')
                     latsec = line[538:550].strip()
                     lonsec = line[565:577].strip()
-                    NS = 1
-                    if latsec[-1] == 'S':
-                        NS = -1
-                    EW = 1
-                    if lonsec[-1] == 'W':
-                        EW = -1
-                    airport_list.append({'airport': line[133:183].strip(),
-                                         'lat': NS * float(latsec[0:-1]) / 3600,
-                                         'lon': EW * float(lonsec[0:-1]) / 3600,
-                                         'link': 'nfdc',
-                                         'state': line[48:50].strip(),
-                                         'city': line[93:133].strip(),
-                                         'start': line[31:41].strip(),
-                                         'id': line[27:31].strip()})
-                    if len(line[48:50].strip()) > 0:
-                        nfdc_line = '\n"' + '","'.join(
-                            [line[0:3].strip(), line[3:14].strip(), line[14:27].strip(), line[27:31].strip(),
-                             line[31:41].strip(), line[41:44].strip(), line[44:48].strip(), line[48:50].strip(),
-                             line[50:70].strip(), line[70:91].strip(), line[91:93].strip(), line[93:133].strip(),
-                             line[133:183].strip(), line[183:185].strip(), line[185:187].strip(), line[187:222].strip(),
-                             line[222:294].strip(), line[294:339].strip(), line[355:390].strip(), line[390:462].strip(),
-                             line[462:507].strip(), line[523:538].strip(), line[538:550].strip(), line[550:565].strip(),
-                             line[565:577].strip(), line[577:578].strip(), line[585:586].strip(), line[586:589].strip(),
-                             line[589:593].strip(), line[597:627].strip(), line[627:629].strip(), line[629:632].strip(),
-                             line[637:641].strip(), line[641:644].strip(), line[644:674].strip(), line[674:678].strip(),
-                             line[678:681].strip(), line[681:711].strip(), line[711:712].strip(), line[712:716].strip(),
-                             line[716:746].strip(), line[746:762].strip(), line[762:778].strip(), line[778:782].strip(),
-                             line[782:812].strip(), line[812:828].strip(), line[828:832].strip(), line[832:833].strip(),
-                             line[833:840].strip(), line[840:842].strip(), line[842:857].strip(), line[857:864].strip(),
-                             line[864:877].strip(), line[877:878].strip(), line[878:879].strip(), line[879:880].strip(),
-                             line[880:881].strip(), line[881:883].strip(), line[883:884].strip(), line[884:892].strip(),
-                             line[892:900].strip(), line[900:940].strip(), line[940:945].strip(), line[945:950].strip(),
-                             line[950:958].strip(), line[958:966].strip(), line[966:973].strip(), line[973:980].strip(),
-                             line[980:981].strip(), line[981:988].strip(), line[988:995].strip(), line[995:999].strip(),
-                             line[999:1002].strip(), line[1002:1003].strip(), line[1003:1004].strip(),
-                             line[1061:1071].strip(), line[1071:1087].strip(), line[1087:1097].strip(),
-                             line[1097:1113].strip(), line[1113:1123].strip(), line[1123:1124].strip(),
-                             line[1124:1136].strip(), line[1136:1207].strip(), line[1207:1210].strip(),
-                             line[1210:1217].strip(), line[1217:1529].strip()]) + '"'
-                        nfdc_file.write(nfdc_line)
-                line = aptfile.readline()
-                """
-                airport = dict()
-                airport["RECORD TYPE INDICATOR"] = line[0:3].strip()
-                airport["LANDING FACILITY SITE NUMBER"] = line[3:14].strip()
-                airport["LANDING FACILITY TYPE"] = line[14:27].strip()
-                airport["LOCATION IDENTIFIER"] = line[27:31].strip()
-                airport["INFORMATION EFFECTIVE DATE (MM/DD/YYYY)"] = line[31:41].strip()
-                airport["FAA REGION CODE"] = line[41:44].strip()
-                airport["FAA DISTRICT OR FIELD OFFICE CODE"] = line[44:48].strip()
-                airport["ASSOCIATED STATE POST OFFICE CODE"] = line[48:50].strip()
-                airport["ASSOCIATED STATE NAME"] = line[50:70].strip()
-                airport["ASSOCIATED COUNTY (OR PARISH) NAME"] = line[70:91].strip()
-                airport["ASSOCIATED COUNTY'S STATE (POST OFFICE CODE)"] = line[91:93].strip()
-                airport["ASSOCIATED CITY NAME"] = line[93:133].strip()
-                airport["OFFICIAL FACILITY NAME"] = line[133:183].strip()
-                airport["AIRPORT OWNERSHIP TYPE"] = line[183:185].strip()
-                airport["FACILITY USE"] = line[185:187].strip()
-                airport["FACILITY OWNER'S NAME"] = line[187:222].strip()
-                airport["OWNER'S ADDRESS"] = line[222:294].strip()
-                airport["OWNER'S CITY, STATE AND ZIP CODE"] = line[294:339].strip()
-                airport["FACILITY MANAGER'S NAME"] = line[355:390].strip()
-                airport["MANAGER'S ADDRESS"] = line[390:462].strip()
-                airport["MANAGER'S CITY, STATE AND ZIP CODE"] = line[462:507].strip()
-                airport["AIRPORT REFERENCE POINT LATITUDE (FORMATTED)"] = line[523:538].strip()
-                airport["AIRPORT REFERENCE POINT LATITUDE (SECONDS)"] = line[538:550].strip()
-                airport["AIRPORT REFERENCE POINT LONGITUDE (FORMATTED)"] = line[550:565].strip()
-                airport["AIRPORT REFERENCE POINT LONGITUDE (SECONDS)"] = line[565:577].strip()
-                airport["AIRPORT REFERENCE POINT DETERMINATION METHOD"] = line[577:578].strip()
-                airport["AIRPORT ELEVATION DETERMINATION METHOD"] = line[585:586].strip()
-                airport["MAGNETIC VARIATION AND DIRECTION"] = line[586:589].strip()
-                airport["MAGNETIC VARIATION EPOCH YEAR"] = line[589:593].strip()
-                airport["AERONAUTICAL SECTIONAL CHART ON WHICH FACILITY"] = line[597:627].strip()
-                airport["DISTANCE FROM CENTRAL BUSINESS DISTRICT OF"] = line[627:629].strip()
-                airport["DIRECTION OF AIRPORT FROM CENTRAL BUSINESS"] = line[629:632].strip()
-                airport["BOUNDARY ARTCC IDENTIFIER"] = line[637:641].strip()
-                airport["BOUNDARY ARTCC (FAA) COMPUTER IDENTIFIER"] = line[641:644].strip()
-                airport["BOUNDARY ARTCC NAME"] = line[644:674].strip()
-                airport["RESPONSIBLE ARTCC IDENTIFIER"] = line[674:678].strip()
-                airport["RESPONSIBLE ARTCC (FAA) COMPUTER IDENTIFIER"] = line[678:681].strip()
-                airport["RESPONSIBLE ARTCC NAME"] = line[681:711].strip()
-                airport["TIE-IN FSS PHYSICALLY LOCATED ON FACILITY"] = line[711:712].strip()
-                airport["TIE-IN FLIGHT SERVICE STATION (FSS) IDENTIFIER"] = line[712:716].strip()
-                airport["TIE-IN FSS NAME"] = line[716:746].strip()
-                airport["LOCAL PHONE NUMBER FROM AIRPORT TO FSS"] = line[746:762].strip()
-                airport["TOLL FREE PHONE NUMBER FROM AIRPORT TO FSS"] = line[762:778].strip()
-                airport["ALTERNATE FSS IDENTIFIER"] = line[778:782].strip()
-                airport["ALTERNATE FSS NAME"] = line[782:812].strip()
-                airport["TOLL FREE PHONE NUMBER FROM AIRPORT TO"] = line[812:828].strip()
-                airport["IDENTIFIER OF THE FACILITY RESPONSIBLE FOR"] = line[828:832].strip()
-                airport["AVAILABILITY OF NOTAM 'D' SERVICE AT AIRPORT"] = line[832:833].strip()
-                airport["AIRPORT ACTIVATION DATE (MM/YYYY)"] = line[833:840].strip()
-                airport["AIRPORT STATUS CODE"] = line[840:842].strip()
-                airport["AIRPORT ARFF CERTIFICATION TYPE AND DATE"] = line[842:857].strip()
-                airport["NPIAS/FEDERAL AGREEMENTS CODE"] = line[857:864].strip()
-                airport["AIRPORT AIRSPACE ANALYSIS DETERMINATION"] = line[864:877].strip()
-                airport["FACILITY HAS BEEN DESIGNATED BY THE U.S. TREASURY"] = line[877:878].strip()
-                airport["FACILITY HAS BEEN DESIGNATED BY THE U.S. TREASURY"] = line[878:879].strip()
-                airport["FACILITY HAS MILITARY/CIVIL JOINT USE AGREEMENT"] = line[879:880].strip()
-                airport["AIRPORT HAS ENTERED INTO AN AGREEMENT THAT"] = line[880:881].strip()
-                airport["AIRPORT INSPECTION METHOD"] = line[881:883].strip()
-                airport["AGENCY/GROUP PERFORMING PHYSICAL INSPECTION"] = line[883:884].strip()
-                airport["LAST PHYSICAL INSPECTION DATE (MMDDYYYY)"] = line[884:892].strip()
-                airport["LAST DATE INFORMATION REQUEST WAS COMPLETED"] = line[892:900].strip()
-                airport["FUEL TYPES AVAILABLE FOR PUBLIC USE AT THE"] = line[900:940].strip()
-                airport["AIRFRAME REPAIR SERVICE AVAILABILITY/TYPE"] = line[940:945].strip()
-                airport["POWER PLANT (ENGINE) REPAIR AVAILABILITY/TYPE"] = line[945:950].strip()
-                airport["TYPE OF BOTTLED OXYGEN AVAILABLE (VALUE REPRESENTS"] = line[950:958].strip()
-                airport["TYPE OF BULK OXYGEN AVAILABLE (VALUE REPRESENTS"] = line[958:966].strip()
-                airport["AIRPORT LIGHTING SCHEDULE"] = line[966:973].strip()
-                airport["BEACON LIGHTING SCHEDULE"] = line[973:980].strip()
-                airport["AIR TRAFFIC CONTROL TOWER LOCATED ON AIRPORT"] = line[980:981].strip()
-                airport["UNICOM FREQUENCY AVAILABLE AT THE AIRPORT"] = line[981:988].strip()
-                airport["COMMON TRAFFIC ADVISORY FREQUENCY (CTAF)"] = line[988:995].strip()
-                airport["SEGMENTED CIRCLE AIRPORT MARKER SYSTEM ON THE AIRPORT"] = line[995:999].strip()
-                airport["LENS COLOR OF OPERABLE BEACON LOCATED ON THE AIRPORT"] = line[999:1002].strip()
-                airport["LANDING FEE CHARGED TO NON-COMMERCIAL USERS OF"] = line[1002:1003].strip()
-                airport['A "Y" IN THIS FIELD INDICATES THAT THE LANDING'] = line[1003:1004].strip()
-                airport["12-MONTH ENDING DATE ON WHICH ANNUAL OPERATIONS DATA"] = line[1061:1071].strip()
-                airport["AIRPORT POSITION SOURCE"] = line[1071:1087].strip()
-                airport["AIRPORT POSITION SOURCE DATE (MM/DD/YYYY)"] = line[1087:1097].strip()
-                airport["AIRPORT ELEVATION SOURCE"] = line[1097:1113].strip()
-                airport["AIRPORT ELEVATION SOURCE DATE (MM/DD/YYYY)"] = line[1113:1123].strip()
-                airport["CONTRACT FUEL AVAILABLE"] = line[1123:1124].strip()
-                airport["TRANSIENT STORAGE FACILITIES"] = line[1124:1136].strip()
-                airport["OTHER AIRPORT SERVICES AVAILABLE"] = line[1136:1207].strip()
-                airport["WIND INDICATOR"] = line[1207:1210].strip()
-                airport["ICAO IDENTIFIER"] = line[1210:1217].strip()
-                airport["AIRPORT RECORD FILLER (BLANK)"] = line[1217:1529].strip()
-                """
-
-            except:
-                """This is a dumb solution."""
-                print('error at line {}, skipped:'.format(i))
-                print(line)
-                line = aptfile.readline()
-                continue
-    print(i)
-    nfdc_file.close()
-
-    df = pd.read_csv(nfdc_filename)
-
-    us_airports = df[['LOCATION IDENTIFIER',
-                       'OFFICIAL FACILITY NAME',
-                       'ASSOCIATED CITY NAME',
-                       'ASSOCIATED STATE POST OFFICE CODE',
-                       'AIRPORT REFERENCE POINT LATITUDE (SECONDS)',
-                       'AIRPORT REFERENCE POINT LATITUDE (FORMATTED)',
-                       'AIRPORT REFERENCE POINT LONGITUDE (SECONDS)',
-                       'AIRPORT REFERENCE POINT LONGITUDE (FORMATTED)',
-                       'AIRPORT STATUS CODE',
-                       'AIRPORT ACTIVATION DATE (MM/YYYY)',
-                       'LAST PHYSICAL INSPECTION DATE (MMDDYYYY)',
-                       'LANDING FACILITY TYPE',
-                       'BOUNDARY ARTCC IDENTIFIER',
-                       'RESPONSIBLE ARTCC IDENTIFIER',
-                       'AIR TRAFFIC CONTROL TOWER LOCATED ON AIRPORT',
-                       'LENS COLOR OF OPERABLE BEACON LOCATED ON THE AIRPORT',
-                       'ICAO IDENTIFIER',
-                       'LANDING FACILITY SITE NUMBER'
-                       ]]
+                    float(latsec[0:-1])
+                    float(lonsec[0:-1])
+                except (UnicodeDecodeError, ValueError):
+                    if not skipped:
+                        first_skipped = line_number
+                    skipped += 1
+                    continue
+                if not line[48:50].strip():
+                    stateless += 1
+                    continue
+            else:
+                try:
+                    line = line.decode('utf-8')
+                except UnicodeDecodeError:
+                    other_skipped += 1
+                    continue
+            records[record_type].append([line[start:end].strip() for start, end in slices[record_type]])
+
+    if b'APT' in slices:
+        STATS.count('rows_read', counts[b'APT'])
+        STATS.count('rows_filtered', stateless)
+    for record_type, count in counts.items():
+        if record_type != b'APT':
+            STATS.count('{}_records'.format(record_type.decode('ascii').lower()), count)
+    STATS.count('parse_errors', skipped + other_skipped)
+    if skipped:
+        print('{} malformed APT records skipped, the first at line {}'.format(skipped, first_skipped))
+    if other_skipped:
+        print('{} undecodable non-APT records skipped'.format(other_skipped))
+    return dict((record_type.decode('ascii'), pd.DataFrame.from_records(records[record_type],
+                                                                        columns=record_columns[record_type.decode('ascii')]))
+                for record_type in slices)
+
+def _nfdc_seconds_to_degrees(seconds):
+    # Decimal degrees from NASR "(SECONDS)" fields such as 140400.0000N, NaN when blank
+    seconds = seconds.astype(str).str.strip()
+    degrees = pd.to_numeric(seconds.str[:-1], errors='coerce') / 3600.0
+    return degrees.where(~seconds.str[-1:].isin(['S', 'W']), -degrees).to_numpy(dtype=float)
+
+# Columns of nfdc_runway_frame
+RUNWAY_COLUMNS = ['site_number', 'airport_id', 'state', 'runway_id', 'length_ft', 'width_ft', 'surface',
+                  'base_end', 'base_lat', 'base_lon', 'reciprocal_end', 'reciprocal_lat', 'reciprocal_lon',
+                  'lat', 'lon']
+
+def nfdc_runway_frame(tables):
+    '''
+    One row per runway from the RWY (and APT) tables of get_nfdc_tables
 
-    return us_airports
+    base_/reciprocal_lat/lon are the physical runway ends. lat/lon is the midpoint of the ends
+    that have both coordinates, or the airport reference point when neither does, so runways can be
+    put through the same spatial indexes as airports, see match_runways.
+    '''
+    runway_df = tables['RWY']
+    airport_df = tables['APT']
+    site_numbers = airport_df['LANDING FACILITY SITE NUMBER']
+    airport_ids = pd.Series(airport_df['LOCATION IDENTIFIER'].to_numpy(), index=site_numbers).groupby(level=0).first()
+    airport_lat = pd.Series(_nfdc_seconds_to_degrees(airport_df['AIRPORT REFERENCE POINT LATITUDE (SECONDS)']),
+                            index=site_numbers).groupby(level=0).first()
+    airport_lon = pd.Series(_nfdc_seconds_to_degrees(airport_df['AIRPORT REFERENCE POINT LONGITUDE (SECONDS)']),
+                            index=site_numbers).groupby(level=0).first()
+
+    ends = {}
+    for end in ['BASE', 'RECIPROCAL']:
+        ends[end] = (_nfdc_seconds_to_degrees(runway_df['{} END LATITUDE OF PHYSICAL RUNWAY END (SECONDS)'.format(end)]),
+                     _nfdc_seconds_to_degrees(runway_df['{} END LONGITUDE OF PHYSICAL RUNWAY END (SECONDS)'.format(end)]))
+    located = [np.isfinite(ends[end][0]) & np.isfinite(ends[end][1]) for end in ['BASE', 'RECIPROCAL']]
+    n_ends = located[0].astype(int) + located[1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        lat, lon = [sum(np.where(located[i], ends[end][axis], 0.0) for i, end in enumerate(['BASE', 'RECIPROCAL']))
+                    / n_ends for axis in [0, 1]]
+    site = runway_df['LANDING FACILITY SITE NUMBER']
+    no_ends = n_ends == 0
+    lat = np.where(no_ends, site.map(airport_lat).to_numpy(dtype=float), lat)
+    lon = np.where(no_ends, site.map(airport_lon).to_numpy(dtype=float), lon)
+
+    return pd.DataFrame({'site_number': site.to_numpy(dtype=object),
+                         'airport_id': site.map(airport_ids).fillna('').to_numpy(dtype=object),
+                         'state': runway_df['LANDING FACILITY STATE POST OFFICE CODE'].to_numpy(dtype=object),
+                         'runway_id': runway_df['RUNWAY IDENTIFICATION'].to_numpy(dtype=object),
+                         'length_ft': pd.to_numeric(runway_df['PHYSICAL RUNWAY LENGTH (NEAREST FOOT)'], errors='coerce'),
+                         'width_ft': pd.to_numeric(runway_df['PHYSICAL RUNWAY WIDTH (NEAREST FOOT)'], errors='coerce'),
+                         'surface': runway_df['RUNWAY SURFACE TYPE AND CONDITION'].to_numpy(dtype=object),
+                         'base_end': runway_df['BASE END IDENTIFIER'].to_numpy(dtype=object),
+                         'base_lat': ends['BASE'][0],
+                         'base_lon': ends['BASE'][1],
+                         'reciprocal_end': runway_df['RECIPROCAL END IDENTIFIER'].to_numpy(dtype=object),
+                         'reciprocal_lat': ends['RECIPROCAL'][0],
+                         'reciprocal_lon': ends['RECIPROCAL'][1],
+                         'lat': lat,
+                         'lon': lon}, columns=RUNWAY_COLUMNS)
+
+def get_nfdc_runway_frame(archive):
+    return nfdc_runway_frame(get_nfdc_tables(archive, {'APT': NFDC_AIRPORT_COLUMNS,
+                                                       'RWY': NFDC_RECORD_COLUMNS['RWY']}))
+
+def get_nfdc_frames(archive):
+    '''
+    Everything in APT.txt from one pass: the airports frame (as get_nfdc_airport_frame), the
+    runways frame (nfdc_runway_frame) and the raw attendance, arresting gear and remark tables
+    '''
+    tables = get_nfdc_tables(archive)
+    return {'airports': _nfdc_airport_frame(tables['APT']),
+            'runways': nfdc_runway_frame(tables),
+            'attendance': tables['ATT'],
+            'arresting': tables['ARS'],
+            'remarks': tables['RMK']}
+
+def match_runways(runway_df, airport_df, max_km=5):
+    '''
+    Nearest airport to each runway midpoint, a spatial join through AirportIndex
 
-def get_best_match(test_airport, comparison_airports):
+    :param runway_df: nfdc_runway_frame output, or any frame with lat/lon
+    :param airport_df: frame with lat/lon to join to, e.g. reconcile_sources entities
+    :return: runway_df with airport_row (position in airport_df, -1 beyond max_km) and distance_km
+    '''
+    positions, distances = AirportIndex(airport_df).nearest_many(runway_df['lat'].to_numpy(dtype=float),
+                                                                 runway_df['lon'].to_numpy(dtype=float))
+    positions, distances = positions[:, 0], distances[:, 0]
+    near = distances <= max_km
+    runway_df = runway_df.copy()
+    runway_df['airport_row'] = np.where(near, positions, -1)
+    runway_df['distance_km'] = np.where(near, distances, np.nan)
+    return runway_df
+
+def file_fingerprint(path, block_size=1024*1024):
+    '''
+    SHA-1 of a file's contents
+    '''
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+def _cache_entries(cache_dir):
+    entries = []
+    if not os.path.isdir(cache_dir):
+        return entries
+    for filename in os.listdir(cache_dir):
+        if not filename.endswith('.json'):
+            continue
+        metadata_file = os.path.join(cache_dir, filename)
+        try:
+            with open(metadata_file, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            continue
+        entry['metadata_file'] = metadata_file
+        entry['frame_file'] = metadata_file[:-len('.json')] + '.pkl'
+        if os.path.exists(entry['frame_file']):
+            entries.append(entry)
+    return entries
+
+def _write_cache_metadata(metadata_file, entry):
+    entry = dict((k, v) for k, v in entry.items() if k not in ('metadata_file', 'frame_file'))
+    with open(metadata_file + '.tmp', 'w') as f:
+        json.dump(entry, f, indent=1)
+    os.replace(metadata_file + '.tmp', metadata_file)
+
+def _remove_cache_entry(entry):
+    # Another process may be evicting the same entry
+    for filename in [entry['frame_file'], entry['metadata_file']]:
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass
+
+def _cache_file_stat(entry):
+    # os.stat of an entry's frame file, None once another process has removed it
+    try:
+        return os.stat(entry['frame_file'])
+    except FileNotFoundError:
+        return None
+
+def load_cached(loader, path, cache_dir=CACHE_DIR, use_cache=True, max_bytes=CACHE_MAX_BYTES):
+    '''
+    Return loader(path), reusing the frame cached by an earlier run when the source file is unchanged
+
+    Entries are keyed by loader name, source path, size, mtime and content hash, plus
+    CACHE_SCHEMA_VERSION. A file whose size or mtime changed is re-hashed, so touching a file
+    without changing it still hits the cache. Frames are stored as pickles with a small JSON
+    metadata file next to each one, which keeps concurrent writers from different processes
+    out of each other's way. Least recently used entries are evicted beyond max_bytes.
+
+    :param loader: one of the get_*_frame functions, or get_nfdc_frames (a dict of frames)
+    :param use_cache: False bypasses the cache entirely, neither reading nor writing it
+    '''
+    if not use_cache:
+        return loader(path)
+
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    entries = [e for e in _cache_entries(cache_dir)
+               if e['loader'] == loader.__name__ and e['schema'] == CACHE_SCHEMA_VERSION]
+
+    sha1 = None
+    matches = [e for e in entries
+               if e['path'] == path and e['size'] == stat.st_size and e['mtime_ns'] == stat.st_mtime_ns]
+    if not matches:
+        sha1 = file_fingerprint(path)
+        matches = [e for e in entries if e['sha1'] == sha1]
+    if matches:
+        entry = matches[0]
+        try:
+            airport_df = pd.read_pickle(entry['frame_file'])
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError) as e:
+            print('Discarding unreadable cache entry {}: {}'.format(entry['frame_file'], e))
+            _remove_cache_entry(entry)
+        else:
+            if sha1 is not None:
+                # Same contents under a new path or mtime, remember it so the next lookup skips hashing
+                _write_cache_metadata(entry['metadata_file'], dict(entry, path=path, size=stat.st_size,
+                                                                   mtime_ns=stat.st_mtime_ns))
+            # The frame file's mtime doubles as the last-used time for eviction
+            try:
+                os.utime(entry['frame_file'])
+            except FileNotFoundError:
+                pass
+            STATS.count('cache_hits')
+            return airport_df
+
+    STATS.count('cache_misses')
+    airport_df = loader(path)
+    if sha1 is None:
+        sha1 = file_fingerprint(path)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    key = '{}-{}-v{}'.format(loader.__name__, sha1[:16], CACHE_SCHEMA_VERSION)
+    frame_file = os.path.join(cache_dir, key + '.pkl')
+    pd.to_pickle(airport_df, frame_file + '.tmp')
+    os.replace(frame_file + '.tmp', frame_file)
+    _write_cache_metadata(os.path.join(cache_dir, key + '.json'),
+                          {'loader': loader.__name__,
+                           'path': path,
+                           'size': stat.st_size,
+                           'mtime_ns': stat.st_mtime_ns,
+                           'sha1': sha1,
+                           'schema': CACHE_SCHEMA_VERSION,
+                           'rows': len(airport_df) if isinstance(airport_df, pd.DataFrame) else None,
+                           'created': datetime.datetime.now().isoformat()})
+
+    _evict_cache(cache_dir, max_bytes, keep=frame_file)
+    return airport_df
+
+def _evict_cache(cache_dir, max_bytes, keep=None):
+    entries = _cache_entries(cache_dir)
+    for entry in entries:
+        if entry['schema'] != CACHE_SCHEMA_VERSION:
+            _remove_cache_entry(entry)
+    files = []
+    for entry in entries:
+        stat = _cache_file_stat(entry) if entry['schema'] == CACHE_SCHEMA_VERSION else None
+        if stat is not None:
+            files.append((stat.st_mtime, stat.st_size, entry))
+    files.sort(key=lambda f: f[0])
+    total = sum(size for _, size, _ in files)
+    for _, size, entry in files:
+        if total <= max_bytes:
+            break
+        if entry['frame_file'] == keep:
+            continue
+        total -= size
+        _remove_cache_entry(entry)
+
+def clear_cache(cache_dir=CACHE_DIR, loader=None, path=None):
+    '''
+    Remove cached frames, all of them or only those of one loader and/or source path
+    '''
+    if path is not None:
+        path = os.path.abspath(path)
+    for entry in _cache_entries(cache_dir):
+        if loader is not None and entry['loader'] != loader.__name__:
+            continue
+        if path is not None and entry['path'] != path:
+            continue
+        _remove_cache_entry(entry)
+
+SOURCE_LOADERS = {'openstreetmaps': get_osm_airports_frame,
+                  'abandoned_airfields': get_abandoned_airports_frame,
+                  'ourairports': get_ourairports_airports_frame,
+                  'usgs': get_usgs_airport_frame,
+                  'bts': get_bts_airport_frame,
+                  'nfdc': get_nfdc_airport_frame}
+
+def _load_source(source, path, use_cache, cache_dir, collect_stats=False, loader=None):
+    # Pool workers start with the parent's registry when forked, collect this load's stats only
+    STATS.reset(enabled=collect_stats)
+    start = time.perf_counter()
+    try:
+        with STATS.timed('load.' + source):
+            airport_df = load_cached(loader or SOURCE_LOADERS[source], path, cache_dir=cache_dir, use_cache=use_cache)
+    except Exception as e:
+        return None, {'path': path, 'seconds': time.perf_counter() - start, 'rows': 0,
+                      'error': '{}: {}'.format(type(e).__name__, e), 'stats': STATS.report()}
+    frames = None
+    if isinstance(airport_df, dict):
+        frames, airport_df = airport_df, airport_df['airports']
+    STATS.count('load.{}.rows'.format(source), len(airport_df))
+    report = {'path': path, 'seconds': time.perf_counter() - start, 'rows': len(airport_df),
+              'error': None, 'stats': STATS.report()}
+    if frames is not None:
+        report['frames'] = frames
+    return airport_df, report
+
+@STATS.stage('load_all_sources')
+def load_all_sources(config, max_workers=None, use_cache=True, cache_dir=CACHE_DIR, loaders=None):
+    '''
+    Load independent sources side by side in a process pool
+
+    Each worker runs one get_*_frame loader (through load_cached) and sends back the finished
+    airport frame, so only columnar frames cross the process boundary. A source that fails is
+    reported and left out without stopping the others.
+
+    :param config: {source name: path}, source names as in SOURCE_LOADERS
+    :param loaders: {source name: loader} replacing SOURCE_LOADERS entries. A loader returning a
+                    dict of frames, like get_nfdc_frames, supplies the airport frame under
+                    'airports' and the whole dict under the report's 'frames'.
+    :return: ({source: airport frame}, {source: {'path', 'seconds', 'rows', 'error'}})
+             Worker timers and counters are merged into STATS when it is enabled.
+    '''
+    sources = {}
+    report = {}
+    max_workers = max_workers or min(len(config), os.cpu_count() or 1) or 1
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = dict((executor.submit(_load_source, source, path, use_cache, cache_dir, STATS.enabled,
+                                        (loaders or {}).get(source)), source)
+                       for source, path in config.items())
+        for future in concurrent.futures.as_completed(futures):
+            source = futures[future]
+            try:
+                airport_df, report[source] = future.result()
+            except Exception as e:
+                # The worker itself died, e.g. killed for running out of memory
+                airport_df, report[source] = None, {'path': config[source], 'seconds': None, 'rows': 0,
+                                                    'error': '{}: {}'.format(type(e).__name__, e), 'stats': None}
+            STATS.merge(report[source].pop('stats'))
+            if airport_df is not None:
+                sources[source] = airport_df
+    return sources, report
+
+@STATS.stage('get_best_match')
+def get_best_match(test_airport, comparison_airports, spatial_index=None):
     '''
     Check for reasonable matches, return best match
 
     :param test_airport:
     :param comparison_airports:
+    :param spatial_index: optional SpatialIndex built from comparison_airports, avoids scanning the whole frame
     :return:
     '''
     # print(len(comparison_airports))
-    local_comparison_airports = comparison_airports[(comparison_airports.lat > (test_airport.lat - 0.2)) &
-                                                    (comparison_airports.lat < (test_airport.lat + 0.2)) &
-                                                    (comparison_airports.lon > (test_airport.lon - 0.2)) &
-                                                    (comparison_airports.lon < (test_airport.lon + 0.2))]
+    if spatial_index is not None:
+        local_comparison_airports = comparison_airports.iloc[spatial_index.query_window(test_airport.lat,
+                                                                                        test_airport.lon)]
+    else:
+        local_comparison_airports = comparison_airports[(comparison_airports.lat > (test_airport.lat - SEARCH_WINDOW)) &
+                                                        (comparison_airports.lat < (test_airport.lat + SEARCH_WINDOW)) &
+                                                        (comparison_airports.lon > (test_airport.lon - SEARCH_WINDOW)) &
+                                                        (comparison_airports.lon < (test_airport.lon + SEARCH_WINDOW))]
     # print(len(local_comparison_airports))
+    STATS.count('queries')
+    STATS.count('candidates', len(local_comparison_airports))
     if local_comparison_airports.empty:
         return
 
-    distance_results = haversine_np([test_airport.lon]*len(local_comparison_airports), [test_airport.lat]*len(local_comparison_airports), local_comparison_airports.lon, local_comparison_airports.lat)
+    distance_results = unit_vector_distance_np(*unit_vectors(test_airport.lat, test_airport.lon),
+                                               *frame_unit_vectors(local_comparison_airports))
     closest = distance_results.min()
     distance_max = 20 # km
     distance_matches = local_comparison_airports[(distance_results == closest ) &
                                                  (distance_results <= distance_max)]
     if not distance_matches.empty:
         if test_airport.name:
-            comparison_names = distance_matches.name.unique()
-            name_scores = process.extract(test_airport.name, comparison_names, limit=100, scorer=fuzz.token_sort_ratio)
-            for name, score in [m for m in name_scores if m[1] > 70]:
-                print(name,score)
-                name_matches = local_comparison_airports[(local_comparison_airports.name == name)]
-                return name_matches.head(1)
+            name_scores = score_name_pairs([sorted_name_key(test_airport.name)] * len(distance_matches),
+                                           _name_sort_keys(distance_matches))
+            best = int(np.argmax(name_scores))
+            if name_scores[best] > 70:
+                name = distance_matches.name.iloc[best]
+                STATS.count('name_matches')
+                # The first airport in the search window carrying the best scoring name
+                positions = np.flatnonzero(local_comparison_airports.name.to_numpy() == name)
+                return local_comparison_airports.iloc[positions[:1]]
     if closest < 1:
         # Within 1km of an existing item, that's probably it regardless of the name
         return local_comparison_airports[(distance_results == closest )]
     return
 
+MATCH_COLUMNS = ['test_row', 'match_row', 'test_id', 'match_id', 'test_source_id', 'match_source_id',
+                 'distance_km', 'name_score', 'match_reason']
 
-if __name__ == '__main__':
+@STATS.stage('match_sources')
+def match_sources(test_df, comparison_df, distance_max=20, window=SEARCH_WINDOW, name_cutoff=70,
+                  override_distance=1, spatial_index=None):
+    '''
+    Match every airport in test_df against comparison_df in one pass
+
+    Applies the same rules as get_best_match to all test airports at once: candidates inside
+    the +/- window box, the nearest of them within distance_max (km) accepted if the name
+    scores above name_cutoff, otherwise the nearest accepted if closer than override_distance (km).
+    Names are scored on name_key rather than get_best_match's token sorted names, so KING FIELD
+    and KING AIRPORT count as the same name.
+
+    :param test_df: airports_to_df frame of airports to look up
+    :param comparison_df: airports_to_df frame to search
+    :param spatial_index: optional SpatialIndex already built from comparison_df
+    :return: DataFrame with MATCH_COLUMNS, one row per matched pair plus one 'unmatched' row
+             per test airport without a match. test_row/match_row are positions in the frames.
+    '''
+    if spatial_index is None:
+        spatial_index = SpatialIndex(comparison_df)
+
+    test_lat = test_df['lat'].to_numpy(dtype=float)
+    test_lon = test_df['lon'].to_numpy(dtype=float)
+    test_names = test_df['name'].to_numpy(dtype=object)
+    comparison_names = comparison_df['name'].to_numpy(dtype=object)
+
+    query, rows = spatial_index.query_pairs(test_lat, test_lon, window)
+    test_x, test_y, test_z = frame_unit_vectors(test_df)
+    distances = unit_vector_distance_np(test_x[query], test_y[query], test_z[query],
+                                        spatial_index.x[rows], spatial_index.y[rows], spatial_index.z[rows])
+
+    # Nearest candidate distance for every pair's test airport
+    queries, group_starts, group_counts = np.unique(query, return_index=True, return_counts=True)
+    closest = np.repeat(np.minimum.reduceat(distances, group_starts), group_counts) \
+        if len(query) else np.empty(0)
+    at_closest = distances == closest
+    STATS.count('queries', len(test_df))
+    STATS.count('candidates', len(query))
+    if len(group_counts):
+        STATS.peak('candidates_per_query', int(group_counts.max()))
+
+    # Name scores are only needed for the nearest candidates within distance_max
+    scored = np.flatnonzero(at_closest & (distances <= distance_max))
+    scored = scored[np.array([bool(test_names[q]) for q in query[scored]], dtype=bool)]
+    scores = score_name_pairs(_name_keys(test_df)[query[scored]], _name_keys(comparison_df)[rows[scored]])
+
+    # Highest score per test airport, ties going to the first candidate
+    order = np.lexsort((scored, -scores, query[scored]))
+    best_queries, best_index = np.unique(query[scored][order], return_index=True)
+    best = order[best_index]
+    accepted = scores[best] > name_cutoff
+    name_queries = best_queries[accepted]
+    best_names = pd.Series(comparison_names[rows[scored][best][accepted]], index=name_queries)
+    best_scores = pd.Series(scores[best][accepted], index=name_queries)
+
+    # The matched row is the first candidate in the window that carries the winning name
+    is_named = np.isin(query, name_queries)
+    named_pairs = np.flatnonzero(is_named)
+    named_pairs = named_pairs[comparison_names[rows[named_pairs]] ==
+                              best_names.loc[query[named_pairs]].to_numpy()]
+    name_pairs = named_pairs[np.unique(query[named_pairs], return_index=True)[1]]
+
+    distance_pairs = np.flatnonzero(~is_named & at_closest & (closest < override_distance))
+
+    pair_scores = np.full(len(query), np.nan)
+    pair_scores[scored] = scores
+    pair_scores[name_pairs] = best_scores.loc[query[name_pairs]].to_numpy()
+
+    matched = np.concatenate([name_pairs, distance_pairs])
+    reasons = np.array(['name'] * len(name_pairs) + ['distance'] * len(distance_pairs), dtype=object)
+    unmatched = np.setdiff1d(np.arange(len(test_df)), query[matched])
+    STATS.count('name_matches', len(name_pairs))
+    STATS.count('distance_matches', len(distance_pairs))
+    STATS.count('unmatched', len(unmatched))
+
+    matches = pd.DataFrame({'test_row': np.concatenate([query[matched], unmatched]),
+                            'match_row': np.concatenate([rows[matched], np.full(len(unmatched), -1)]),
+                            'distance_km': np.concatenate([distances[matched], np.full(len(unmatched), np.nan)]),
+                            'name_score': np.concatenate([pair_scores[matched], np.full(len(unmatched), np.nan)]),
+                            'match_reason': np.concatenate([reasons,
+                                                            np.array(['unmatched'] * len(unmatched), dtype=object)])})
+    matches = matches.sort_values(['test_row', 'match_row'], kind='stable').reset_index(drop=True)
+    test_rows = matches.test_row.to_numpy()
+    match_rows = matches.match_row.to_numpy()
+    matches['test_id'] = test_df['id'].to_numpy(dtype=object)[test_rows]
+    matches['test_source_id'] = test_df['source_id'].to_numpy(dtype=object)[test_rows]
+    # A trailing blank lets match_row == -1 pick up an empty id for unmatched airports
+    matches['match_id'] = np.append(comparison_df['id'].to_numpy(dtype=object), '')[match_rows]
+    matches['match_source_id'] = np.append(comparison_df['source_id'].to_numpy(dtype=object), '')[match_rows]
+    return matches[MATCH_COLUMNS]
+
+# Columns match_sources reads, the only ones shipped to matching worker processes
+MATCH_INPUT_COLUMNS = ['id', 'name', 'name_key', 'lat', 'lon', 'source_id']
+
+def _match_batch(test_df, comparison_df, test_rows, comparison_rows, match_kwargs, collect_stats=False):
+    # Pool workers start with the parent's registry when forked, collect this batch's stats only
+    STATS.reset(enabled=collect_stats)
+    matches = match_sources(test_df, comparison_df, **match_kwargs)
+    matches['test_row'] = test_rows[matches.test_row.to_numpy()]
+    matches['match_row'] = np.append(comparison_rows, -1)[matches.match_row.to_numpy()]
+    return matches, STATS.report()
+
+@STATS.stage('match_sources_parallel')
+def match_sources_parallel(test_df, comparison_df, distance_max=20, window=SEARCH_WINDOW, name_cutoff=70,
+                           override_distance=1, tile_size=MATCH_TILE_SIZE, max_workers=None, spatial_index=None):
+    '''
+    match_sources spread over a process pool, returning exactly the same match table
+
+    Test airports are split into tile_size degree lat/lon tiles, and neighbouring tiles are
+    grouped into one batch per worker with about the same number of test airports each. A
+    worker gets its batch's test airports plus only the comparison airports within `window`
+    degrees of its tiles, which is every candidate match_sources could consider for them.
+    Batch results are mapped back to positions in the full frames and merged in test_row,
+    match_row order.
+    '''
+    if spatial_index is None:
+        spatial_index = SpatialIndex(comparison_df)
+    match_kwargs = {'distance_max': distance_max, 'window': window, 'name_cutoff': name_cutoff,
+                    'override_distance': override_distance}
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or not len(test_df):
+        return match_sources(test_df, comparison_df, spatial_index=spatial_index, **match_kwargs)
+    test_input = test_df[[c for c in MATCH_INPUT_COLUMNS if c in test_df]]
+    comparison_input = comparison_df[[c for c in MATCH_INPUT_COLUMNS if c in comparison_df]]
+
+    test_lat = test_df['lat'].to_numpy(dtype=float)
+    test_lon = test_df['lon'].to_numpy(dtype=float)
+    located = np.isfinite(test_lat) & np.isfinite(test_lon)
+    tile_keys = np.full(len(test_df), -1, dtype=np.int64)
+    tile_keys[located] = (np.floor((test_lat[located] + 90.0) / tile_size).astype(np.int64) * 100000 +
+                          np.floor((test_lon[located] + 180.0) / tile_size).astype(np.int64))
+    tile_order = np.argsort(tile_keys, kind='stable')
+    tile_starts = np.flatnonzero(np.diff(tile_keys[tile_order], prepend=-2))
+    tile_ends = np.append(tile_starts[1:], len(test_df))
+    # Consecutive tiles in key order (rows of tiles) go to the same batch until it holds its share
+    batch_of_tile = tile_starts * max_workers // len(test_df)
+    STATS.count('tiles', len(tile_starts))
+
+    batches = []
+    for batch in np.unique(batch_of_tile):
+        tiles = np.flatnonzero(batch_of_tile == batch)
+        comparison_rows = []
+        for start, end in zip(tile_starts[tiles], tile_ends[tiles]):
+            tile_rows = tile_order[start:end]
+            if tile_keys[tile_rows[0]] < 0:
+                # Airports without coordinates can't match anything
+                continue
+            comparison_rows.append(spatial_index.query_bbox(test_lat[tile_rows].min() - window,
+                                                            test_lat[tile_rows].max() + window,
+                                                            test_lon[tile_rows].min() - window,
+                                                            test_lon[tile_rows].max() + window))
+        test_rows = np.sort(tile_order[tile_starts[tiles[0]]:tile_ends[tiles[-1]]])
+        comparison_rows = np.unique(np.concatenate(comparison_rows)) if comparison_rows else \
+            np.empty(0, dtype=np.int64)
+        batches.append((test_input.iloc[test_rows], comparison_input.iloc[comparison_rows],
+                        test_rows, comparison_rows, match_kwargs))
+
+    STATS.count('batches', len(batches))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+        futures = [executor.submit(_match_batch, *batch, STATS.enabled) for batch in batches]
+        results = []
+        for future in futures:
+            matches, stats = future.result()
+            results.append(matches)
+            STATS.merge(stats)
+
+    matches = pd.concat(results, ignore_index=True)
+    return matches.sort_values(['test_row', 'match_row'], kind='stable').reset_index(drop=True)
+
+def unmatched_airports(test_df, matches):
+    '''
+    Return the rows of test_df that match_sources could not match
+    '''
+    return test_df.iloc[matches.test_row[matches.match_reason == 'unmatched'].to_numpy()]
 
-    lat_dms, lon_dms = ll_decimal_to_dms(22.125, -22.125)
-    assert(lat_dms == ['N', 22.0, 7.0, 30.0])
-    assert(lon_dms == ['W', 22.0, 7.0, 30.0])
+@STATS.stage('match_by_name')
+def match_by_name(test_df, comparison_df, name_index=None, radius_km=50, name_cutoff=85, max_candidates=50):
+    '''
+    Find matches for airports whose coordinates are too far off for match_sources' search window
+
+    Candidates come from a NameIndex: comparison airports sharing rare name tokens that are in
+    the same state or within radius_km. They are scored on name_key, so KING FIELD and
+    KING AIRPORT compare equal. The best score above name_cutoff wins, ties going to the
+    candidate sharing the rarer tokens, then the nearest. Meant to be run on the
+    unmatched_airports of a match_sources run.
+
+    :param test_df: airports_to_df frame of airports to look up
+    :param comparison_df: airports_to_df frame to search
+    :param name_index: optional NameIndex already built from comparison_df
+    :return: DataFrame with MATCH_COLUMNS like match_sources, matched rows have match_reason 'name_search'
+    '''
+    if name_index is None:
+        name_index = NameIndex(comparison_df)
+
+    test_lat = test_df['lat'].to_numpy(dtype=float)
+    test_lon = test_df['lon'].to_numpy(dtype=float)
+    test_names = test_df['name'].to_numpy(dtype=object)
+    test_states = test_df['state'].to_numpy(dtype=object)
+    test_keys = _name_keys(test_df)
+
+    match_rows = np.full(len(test_df), -1, dtype=np.int64)
+    name_scores = np.full(len(test_df), np.nan)
+    for i in range(len(test_df)):
+        if not test_names[i]:
+            continue
+        rows, _ = name_index.query(test_names[i], test_lat[i], test_lon[i], test_states[i],
+                                   radius_km=radius_km, max_candidates=max_candidates)
+        STATS.count('candidates', len(rows))
+        if not len(rows):
+            continue
+        scores = score_name_pairs([test_keys[i]] * len(rows), name_index.keys[rows])
+        best = int(np.argmax(scores))
+        if scores[best] > name_cutoff:
+            match_rows[i] = rows[best]
+            name_scores[i] = scores[best]
+
+    matched = match_rows >= 0
+    STATS.count('queries', len(test_df))
+    STATS.count('name_search_matches', matched.sum())
+    distances = np.full(len(test_df), np.nan)
+    test_x, test_y, test_z = frame_unit_vectors(test_df)
+    matched_rows = match_rows[matched]
+    distances[matched] = unit_vector_distance_np(test_x[matched], test_y[matched], test_z[matched],
+                                                 name_index.x[matched_rows], name_index.y[matched_rows],
+                                                 name_index.z[matched_rows])
+    matches = pd.DataFrame({'test_row': np.arange(len(test_df)),
+                            'match_row': match_rows,
+                            'distance_km': distances,
+                            'name_score': name_scores,
+                            'match_reason': np.where(matched, 'name_search', 'unmatched').astype(object)})
+    matches['test_id'] = test_df['id'].to_numpy(dtype=object)
+    matches['test_source_id'] = test_df['source_id'].to_numpy(dtype=object)
+    matches['match_id'] = np.append(comparison_df['id'].to_numpy(dtype=object), '')[match_rows]
+    matches['match_source_id'] = np.append(comparison_df['source_id'].to_numpy(dtype=object), '')[match_rows]
+    return matches[MATCH_COLUMNS]
+
+def _union_find(n, left, right):
+    '''
+    Connected components of n items joined by left[k]-right[k] edges, labelled by their smallest member
+    '''
+    parent = list(range(n))
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    for a, b in zip(left.tolist(), right.tolist()):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+    return np.array([find(i) for i in range(n)], dtype=np.int64)
+
+# Identifier columns compared across sources, a shared non-blank code links two nearby airports
+IDENTIFIER_COLUMNS = ['id', 'icao', 'iata']
+
+def _identifier_codes(airport_df):
+    # IDENTIFIER_COLUMNS as an object array of stripped, upper case codes, '' where blank
+    codes = airport_df[IDENTIFIER_COLUMNS].astype(str).apply(lambda column: column.str.strip().str.upper())
+    return codes.to_numpy(dtype=object)
+
+def _shared_identifier_mask(codes, left, right):
+    '''
+    Whether each left[k]-right[k] pair shares a non-blank code in any of the IDENTIFIER_COLUMNS,
+    e.g. one's id is the other's icao
+    '''
+    same_code = np.zeros(len(left), dtype=bool)
+    for i in range(len(IDENTIFIER_COLUMNS)):
+        for j in range(len(IDENTIFIER_COLUMNS)):
+            same_code |= (codes[left, i] == codes[right, j]) & (codes[left, i] != '')
+    return same_code
 
-    unmatched_closed_airports = []
+MEMBER_COLUMNS = ['entity_id', 'source', 'row', 'id', 'icao', 'iata', 'name', 'lat', 'lon', 'source_id']
+
+@STATS.stage('reconcile_sources')
+def reconcile_sources(sources, distance_max=5, id_distance_max=20, name_cutoff=85, override_distance=0.5,
+                      window=SEARCH_WINDOW):
+    '''
+    Cluster the airports of several sources into entities, one per physical airfield
+
+    Candidate pairs are airports from different sources within `window` degrees of each other,
+    found with a SpatialIndex over all sources at once. A pair is linked when
+      - it shares an identifier (id/icao/iata) and is within id_distance_max km, or
+      - its name_key score is above name_cutoff and it is within distance_max km, or
+      - it is within override_distance km and each is the other's nearest airport in that source.
+    Linked pairs are merged with union-find, so an airport can join an entity through any member.
+
+    :param sources: {source name: airports_to_df frame}, e.g. load_all_sources output
+    :return: (entities, members). members has MEMBER_COLUMNS, one row per airport, with `row` its
+             position in its source frame. entities has one row per entity_id with a representative
+             name and location, member counts and, per source, the ';' joined source_record_ids
+             of its members.
+    '''
+    source_names = list(sources)
+    frames = [sources[source] for source in source_names]
+    combined = pd.concat([df[['id', 'icao', 'iata', 'name', 'name_key', 'lat', 'lon', 'source_id']]
+                          for df in frames], ignore_index=True)
+    source_codes = np.repeat(np.arange(len(frames)), [len(df) for df in frames])
+    source_rows = np.concatenate([np.arange(len(df)) for df in frames]) if frames else np.empty(0, dtype=np.int64)
+
+    lat = combined['lat'].to_numpy(dtype=float)
+    lon = combined['lon'].to_numpy(dtype=float)
+    spatial_index = SpatialIndex(combined)
+    left, right = spatial_index.query_pairs(lat, lon, window)
+    # Each unordered pair once, never two airports of the same source
+    keep = (left < right) & (source_codes[left] != source_codes[right])
+    left, right = left[keep], right[keep]
+    x, y, z = spatial_index.x, spatial_index.y, spatial_index.z
+    distances = unit_vector_distance_np(x[left], y[left], z[left], x[right], y[right], z[right])
+    near = distances <= max(distance_max, id_distance_max, override_distance)
+    left, right, distances = left[near], right[near], distances[near]
+
+    same_code = _shared_identifier_mask(_identifier_codes(combined), left, right)
+    linked = same_code & (distances <= id_distance_max)
+
+    scored = np.flatnonzero(~linked & (distances <= distance_max))
+    name_keys = combined['name_key'].to_numpy(dtype=object)
+    scores = score_name_pairs(name_keys[left[scored]], name_keys[right[scored]])
+    linked[scored[scores > name_cutoff]] = True
+
+    # Mutual nearest neighbours: nearest of the other source for both airports of the pair
+    nearest = np.full(len(combined) * max(len(frames), 1), np.inf)
+    left_slots = left * len(frames) + source_codes[right]
+    right_slots = right * len(frames) + source_codes[left]
+    np.minimum.at(nearest, left_slots, distances)
+    np.minimum.at(nearest, right_slots, distances)
+    linked |= ((distances <= override_distance) &
+               (distances == nearest[left_slots]) & (distances == nearest[right_slots]))
+
+    STATS.count('airports', len(combined))
+    STATS.count('candidate_pairs', len(left))
+    STATS.count('linked_pairs', linked.sum())
+    roots = _union_find(len(combined), left[linked], right[linked])
+    entity_ids = pd.factorize(roots)[0]
+
+    members = combined.drop(columns='name_key')
+    members['entity_id'] = entity_ids
+    members['source'] = np.array(source_names, dtype=object)[source_codes] if frames else ''
+    members['row'] = source_rows
+    members = members[MEMBER_COLUMNS]
+
+    member_ids = pd.Series(np.concatenate([source_record_ids(df).to_numpy(dtype=object) for df in frames])
+                           if frames else np.empty(0, dtype=object), index=members.index)
+    grouped = members.groupby('entity_id', sort=True)
+    # First non-blank name in source order
+    names = members['name'].where(members['name'] != '').groupby(members['entity_id'], sort=True).first()
+    entities = pd.DataFrame({'name': names.reindex(grouped.size().index).fillna(''),
+                             'lat': grouped['lat'].mean(),
+                             'lon': grouped['lon'].mean(),
+                             'n_members': grouped.size(),
+                             'n_sources': grouped['source'].nunique()})
+    for source in source_names:
+        in_source = members['source'] == source
+        entities[source] = member_ids[in_source].groupby(members['entity_id'][in_source]).agg(';'.join)
+        entities[source] = entities[source].fillna('')
+    return entities.reset_index(), members
+
+# Added by dedup_source: members of the collapsed cluster and their ';' joined source_record_ids
+DEDUP_COLUMNS = ['duplicate_count', 'duplicate_ids']
+
+@STATS.stage('dedup_source')
+def dedup_source(airport_df, radius_km=2, name_cutoff=85, id_distance_max=5, override_distance=0.2):
+    '''
+    Collapse duplicate records of one source, e.g. an OSM node and way centroid of the same field
+
+    A self-join through a SpatialIndex finds the pairs of records within the largest of the
+    distances below, without comparing all pairs. A pair is a duplicate when
+      - it shares an identifier (id/icao/iata) and is within id_distance_max km, or
+      - its name_key score is above name_cutoff and it is within radius_km, or
+      - it is within override_distance km whatever the names.
+    Duplicates are merged with union-find, and each cluster is represented by its most complete
+    record (a name, then the most identifiers, then the first row), kept with its own coordinates.
+    Merging is single linkage: a chain of duplicate pairs becomes one cluster however far apart
+    its ends are, so a dense field of records sharing a generic name, or a string of points
+    each within override_distance of the next, can collapse into one large cluster. The largest cluster size is
+    recorded in STATS as cluster_size.
+
+    :param airport_df: airports_to_df frame of a single source
+    :return: (deduped, clusters). deduped holds the representative rows in their original order
+             plus DEDUP_COLUMNS, clusters the position in deduped of every row of airport_df.
+    '''
+    lat = airport_df['lat'].to_numpy(dtype=float)
+    reach_km = max(radius_km, id_distance_max, override_distance)
+    lat_window, lon_window = radius_windows(lat, reach_km)
+    spatial_index = SpatialIndex(airport_df, cell_size=max(reach_km / KM_PER_DEGREE, 0.01))
+    left, right = spatial_index.query_pairs(lat, airport_df['lon'].to_numpy(dtype=float), lat_window, lon_window)
+    keep = left < right
+    left, right = left[keep], right[keep]
+    x, y, z = spatial_index.x, spatial_index.y, spatial_index.z
+    distances = unit_vector_distance_np(x[left], y[left], z[left], x[right], y[right], z[right])
+    near = distances <= reach_km
+    left, right, distances = left[near], right[near], distances[near]
+
+    codes = _identifier_codes(airport_df)
+    same_code = _shared_identifier_mask(codes, left, right)
+    linked = (same_code & (distances <= id_distance_max)) | (distances <= override_distance)
+
+    scored = np.flatnonzero(~linked & (distances <= radius_km))
+    name_keys = _name_keys(airport_df)
+    scores = score_name_pairs(name_keys[left[scored]], name_keys[right[scored]])
+    linked[scored[scores > name_cutoff]] = True
+
+    STATS.count('airports', len(airport_df))
+    STATS.count('candidate_pairs', len(left))
+    STATS.count('linked_pairs', linked.sum())
+    roots = _union_find(len(airport_df), left[linked], right[linked])
+
+    # Most complete record of each cluster first
+    completeness = (airport_df['name'].astype(str).str.strip() != '').to_numpy(dtype=int) * len(IDENTIFIER_COLUMNS) + \
+        (codes != '').sum(axis=1)
+    order = np.lexsort((np.arange(len(airport_df)), -completeness, roots))
+    cluster_roots, first = np.unique(roots[order], return_index=True)
+    representative_of_root = order[first]
+    representatives = np.sort(representative_of_root)
+    clusters = np.searchsorted(representatives, representative_of_root[np.searchsorted(cluster_roots, roots)])
+    STATS.count('duplicates', len(airport_df) - len(representatives))
+
+    member_ids = source_record_ids(airport_df).to_numpy(dtype=object)
+    counts = np.bincount(clusters, minlength=len(representatives))
+    if len(counts):
+        STATS.peak('cluster_size', int(counts.max()))
+    duplicate_ids = member_ids[representatives].copy()
+    # Representative first, then the other members in row order; singletons keep their own id
+    grouped = np.flatnonzero(counts[clusters] > 1)
+    grouped = grouped[np.lexsort((grouped, ~np.isin(grouped, representatives), clusters[grouped]))]
+    starts = np.flatnonzero(np.diff(clusters[grouped], prepend=-1))
+    for start, end in zip(starts.tolist(), np.append(starts[1:], len(grouped)).tolist()):
+        duplicate_ids[clusters[grouped[start]]] = ';'.join(member_ids[grouped[start:end]])
+
+    deduped = airport_df.iloc[representatives].reset_index(drop=True)
+    deduped['duplicate_count'] = counts
+    deduped['duplicate_ids'] = duplicate_ids
+    return deduped, clusters
+
+def source_record_ids(airport_df):
+    '''
+    Record id of each row within its source: source_id, falling back to id then link for
+    sources without record ids of their own
+    '''
+    record_id = airport_df['source_id'].astype(str)
+    for column in ['id', 'link']:
+        record_id = record_id.where(record_id != '', airport_df[column].astype(str))
+    return record_id
+
+def source_record_keys(airport_df):
+    '''
+    Stable record keys: source + source_record_ids. Repeated keys get a running count so every
+    row has a unique key.
+    '''
+    key = airport_df['source'].astype(str) + '|' + source_record_ids(airport_df)
+    if key.duplicated().any():
+        key = key + '#' + key.groupby(key).cumcount().astype(str)
+    return key.to_numpy(dtype=object)
+
+CHANGE_COLUMNS = ['key', 'previous_row', 'current_row', 'moved_km', 'change']
+
+def diff_source_frames(previous_df, current_df, move_tolerance_km=0.01, previous_keys=None, current_keys=None):
+    '''
+    Records that differ between two loads of the same source, matched up by source_record_keys
+
+    :return: DataFrame with CHANGE_COLUMNS, one row per changed record. previous_row/current_row are
+             positions in the frames, -1 where the record is missing. change is 'added', 'removed' or
+             a comma separated mix of 'moved' (further than move_tolerance_km), 'renamed' and
+             'status_changed'.
+    '''
+    if previous_keys is None:
+        previous_keys = source_record_keys(previous_df)
+    if current_keys is None:
+        current_keys = source_record_keys(current_df)
+    previous = pd.DataFrame({'key': previous_keys, 'previous_row': np.arange(len(previous_df))})
+    current = pd.DataFrame({'key': current_keys, 'current_row': np.arange(len(current_df))})
+    changes = previous.merge(current, on='key', how='outer', sort=False)
+    changes[['previous_row', 'current_row']] = changes[['previous_row', 'current_row']].fillna(-1).astype(np.int64)
+    previous_rows = changes['previous_row'].to_numpy()
+    current_rows = changes['current_row'].to_numpy()
+    both = (previous_rows >= 0) & (current_rows >= 0)
+
+    moved_km = np.full(len(changes), np.nan)
+    previous_x, previous_y, previous_z = frame_unit_vectors(previous_df)
+    current_x, current_y, current_z = frame_unit_vectors(current_df)
+    previous_both, current_both = previous_rows[both], current_rows[both]
+    moved_km[both] = unit_vector_distance_np(previous_x[previous_both], previous_y[previous_both],
+                                             previous_z[previous_both], current_x[current_both],
+                                             current_y[current_both], current_z[current_both])
+    changes['moved_km'] = moved_km
+    change = np.where(previous_rows < 0, 'added', np.where(current_rows < 0, 'removed', '')).astype(object)
+    for label, differs in [('moved', moved_km[both] > move_tolerance_km),
+                           ('renamed', previous_df['name'].to_numpy(dtype=object)[previous_rows[both]] !=
+                                       current_df['name'].to_numpy(dtype=object)[current_rows[both]]),
+                           ('status_changed', previous_df['status'].to_numpy(dtype=object)[previous_rows[both]] !=
+                                              current_df['status'].to_numpy(dtype=object)[current_rows[both]])]:
+        rows = np.flatnonzero(both)[differs]
+        change[rows] = np.where(change[rows] == '', label, change[rows] + ',' + label)
+    changes['change'] = change
+    return changes[change != ''][CHANGE_COLUMNS].reset_index(drop=True)
+
+def _position_map(previous_keys, current_keys):
+    '''
+    Current position of each previous row by record key, -1 for records no longer present
+    '''
+    current = pd.Series(np.arange(len(current_keys)), index=current_keys)
+    return current.reindex(previous_keys).fillna(-1).to_numpy(dtype=np.int64)
+
+def _out_of_order(positions):
+    '''
+    Mask of the fewest elements to drop so the rest of positions is increasing, the complement
+    of a longest increasing subsequence
+    '''
+    positions = np.asarray(positions)
+    out = np.zeros(len(positions), dtype=bool)
+    if (np.diff(positions) > 0).all():
+        return out
+    tails = []
+    tail_index = []
+    previous = np.full(len(positions), -1, dtype=np.int64)
+    for i, position in enumerate(positions.tolist()):
+        j = bisect.bisect_left(tails, position)
+        if j == len(tails):
+            tails.append(position)
+            tail_index.append(i)
+        else:
+            tails[j] = position
+            tail_index[j] = i
+        previous[i] = tail_index[j - 1] if j else -1
+    out[:] = True
+    i = tail_index[-1]
+    while i >= 0:
+        out[i] = False
+        i = previous[i]
+    return out
+
+@STATS.stage('update_matches')
+def update_matches(previous_matches, previous_test_df, test_df, previous_comparison_df, comparison_df,
+                   distance_max=20, window=SEARCH_WINDOW, name_cutoff=70, override_distance=1,
+                   spatial_index=None):
+    '''
+    Patch a match_sources result after new loads of its test and/or comparison frames
+
+    Only test airports that were added, moved or renamed, or that have a comparison airport
+    added, removed, moved, renamed or reordered within `window` degrees of them (at its old or
+    new location), are matched again; match_sources only ever looks inside that window, so every
+    other result carries over with its rows renumbered. Reordered airports are the fewest whose
+    removal leaves the rest in their old relative order, since match_sources breaks ties by row
+    order. Cost follows the size of the change set rather than the frames.
+
+    :param previous_matches: match_sources(previous_test_df, previous_comparison_df) output
+    :param spatial_index: optional SpatialIndex already built from comparison_df
+    :return: the match table match_sources(test_df, comparison_df) would return
+    '''
+    keys = [source_record_keys(df) for df in [previous_test_df, test_df, previous_comparison_df, comparison_df]]
+    test_changes = diff_source_frames(previous_test_df, test_df, previous_keys=keys[0], current_keys=keys[1])
+    comparison_changes = diff_source_frames(previous_comparison_df, comparison_df,
+                                            previous_keys=keys[2], current_keys=keys[3])
+    comparison_changes = comparison_changes[comparison_changes.change != 'status_changed']
+
+    affected = np.zeros(len(test_df), dtype=bool)
+    changed_rows = test_changes.current_row.to_numpy()
+    affected[changed_rows[changed_rows >= 0]] = True
+    test_map = _position_map(keys[0], keys[1])
+    comparison_map = _position_map(keys[2], keys[3])
+    # Old and new locations of the changed comparison airports, and where the reordered ones are now
+    previous_rows = comparison_changes.previous_row.to_numpy()
+    current_rows = comparison_changes.current_row.to_numpy()
+    surviving = comparison_map[comparison_map >= 0]
+    reordered = surviving[_out_of_order(surviving)]
+    STATS.count('comparison_reordered', len(reordered))
+    current_rows = np.concatenate([current_rows, reordered])
+    changed_points = pd.DataFrame({
+        'lat': np.concatenate([previous_comparison_df['lat'].to_numpy(dtype=float)[previous_rows[previous_rows >= 0]],
+                               comparison_df['lat'].to_numpy(dtype=float)[current_rows[current_rows >= 0]]]),
+        'lon': np.concatenate([previous_comparison_df['lon'].to_numpy(dtype=float)[previous_rows[previous_rows >= 0]],
+                               comparison_df['lon'].to_numpy(dtype=float)[current_rows[current_rows >= 0]]])})
+    if len(changed_points):
+        near_change, _ = SpatialIndex(changed_points).query_pairs(test_df['lat'].to_numpy(dtype=float),
+                                                                  test_df['lon'].to_numpy(dtype=float), window)
+        affected[near_change] = True
+
+    kept = previous_matches.copy()
+    kept['test_row'] = test_map[kept.test_row.to_numpy()]
+    kept = kept[kept.test_row >= 0]
+    kept = kept[~affected[kept.test_row.to_numpy()]]
+    kept['match_row'] = np.append(comparison_map, -1)[kept.match_row.to_numpy()]
+
+    rematch_rows = np.flatnonzero(affected)
+    STATS.count('test_changes', len(test_changes))
+    STATS.count('comparison_changes', len(comparison_changes))
+    STATS.count('carried_over', len(test_df) - len(rematch_rows))
+    STATS.count('rematched', len(rematch_rows))
+    rematched = match_sources(test_df.iloc[rematch_rows], comparison_df, distance_max=distance_max,
+                              window=window, name_cutoff=name_cutoff, override_distance=override_distance,
+                              spatial_index=spatial_index)
+    rematched['test_row'] = rematch_rows[rematched.test_row.to_numpy()]
+
+    matches = pd.concat([kept, rematched], ignore_index=True)
+    return matches.sort_values(['test_row', 'match_row'], kind='stable').reset_index(drop=True)[MATCH_COLUMNS]
+
+def save_snapshot(snapshot, path=SNAPSHOT_FILE):
+    '''
+    Pickle {'sources': ..., 'matches': ...} for the next run's update_matches
+    '''
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+
+def load_snapshot(path=SNAPSHOT_FILE):
+    '''
+    The snapshot saved by save_snapshot, or None if there isn't a readable one
+    '''
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+        return None
 
-    osm_airports = get_osm_airports_list(r'osm\osm_aeroway_pnt.csv')
-    osm_airport_df = airports_to_df(osm_airports)
 
-    aa_airports = get_abandoned_airports_list(r'abandoned\abandoned_airports.csv')
-    aa_airport_df = airports_to_df(aa_airports)
+def match_dataset_fingerprint(comparison_df):
+    '''
+    SHA-1 of the comparison frame columns match_sources reads, in row order
+    '''
+    sha1 = hashlib.sha1()
+    sha1.update(str(len(comparison_df)).encode('utf-8'))
+    columns = [c for c in MATCH_INPUT_COLUMNS if c in comparison_df]
+    sha1.update(pd.util.hash_pandas_object(comparison_df[columns], index=False).to_numpy().tobytes())
+    return sha1.hexdigest()
 
-    for test_airport in [a for a in osm_airports if a.status == 'C']:
-        matched_airport = get_best_match(test_airport, aa_airport_df)
-        if not isinstance(matched_airport, pd.DataFrame):
-            print('Unmatched: {}'.format(test_airport))
-            unmatched_closed_airports.append(test_airport)
+def match_record_keys(test_df):
+    '''
+    int64 key per test airport from its source, source_id, coordinates and name
+    '''
+    columns = ['source', 'source_id', 'lat', 'lon', 'name']
+    keys = pd.util.hash_pandas_object(test_df[columns].astype(object).fillna(''), index=False)
+    return keys.to_numpy().view(np.int64)
 
-    oa_airports = get_ourairports_airports_list(r'ourairports\airports.csv')
-    oa_airport_df = airports_to_df(oa_airports)
+class MatchCache:
+    '''
+    match_sources results persisted in SQLite across runs
 
-    for test_airport in [a for a in oa_airports if a.status == 'C']:
-        matched_airport = get_best_match(test_airport, aa_airport_df)
-        if not isinstance(matched_airport, pd.DataFrame):
-            print('Unmatched: {}'.format(test_airport))
-            unmatched_closed_airports.append(test_airport)
+    A cached result belongs to a version: the fingerprint of the comparison frame together with
+    the matching parameters. Within a version each test airport is looked up by
+    match_record_keys, so only new or changed test airports are matched again. Versions are
+    pruned least recently used first beyond max_versions. hits and misses count test airports
+    served from and added to the cache since it was opened.
 
-    usgs_airports = get_usgs_airport_list(r'usgs\usgs_tran_national_AirportPoint.csv')
-    usgs_airport_df = airports_to_df(usgs_airports)
-    # No status in usgs data
+        with MatchCache() as cache:
+            matches = cache.match(closed_df, aa_airport_df, spatial_index=aa_index)
+    '''
+    def __init__(self, path=MATCH_CACHE_FILE, max_versions=MATCH_CACHE_MAX_VERSIONS):
+        self.path = path
+        self.max_versions = max_versions
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS versions (version TEXT PRIMARY KEY, dataset TEXT, params TEXT,
+                                                 last_used REAL);
+            CREATE TABLE IF NOT EXISTS matches (version TEXT, test_key INTEGER, match_row INTEGER,
+                                                distance_km REAL, name_score REAL, match_reason TEXT);
+            CREATE INDEX IF NOT EXISTS matches_version ON matches (version, test_key);
+        ''')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def match(self, test_df, comparison_df, distance_max=20, window=SEARCH_WINDOW, name_cutoff=70,
+              override_distance=1, spatial_index=None, max_workers=1):
+        '''
+        match_sources(test_df, comparison_df, ...) with unchanged test airports served from the cache
+
+        :param max_workers: processes the cache misses are matched over, see match_sources_parallel
+        '''
+        params = json.dumps({'distance_max': distance_max, 'window': window, 'name_cutoff': name_cutoff,
+                             'override_distance': override_distance, 'schema': CACHE_SCHEMA_VERSION},
+                            sort_keys=True)
+        dataset = match_dataset_fingerprint(comparison_df)
+        version = hashlib.sha1((dataset + params).encode('utf-8')).hexdigest()
+
+        with STATS.timed('match_cache.lookup'):
+            keys = match_record_keys(test_df)
+            # Only the rows of the keys asked for, through a temporary table of them
+            self.connection.execute('CREATE TEMP TABLE IF NOT EXISTS lookup (test_key INTEGER PRIMARY KEY)')
+            self.connection.execute('DELETE FROM lookup')
+            self.connection.executemany('INSERT OR IGNORE INTO lookup VALUES (?)', zip(keys.tolist()))
+            cached = pd.read_sql_query('SELECT test_key, match_row, distance_km, name_score, match_reason '
+                                       'FROM matches JOIN lookup USING (test_key) WHERE version = ?',
+                                       self.connection, params=(version,))
+            hit = np.isin(keys, cached['test_key'].to_numpy())
+        hits, misses = int(hit.sum()), int((~hit).sum())
+        self.hits += hits
+        self.misses += misses
+        STATS.count('match_cache_hits', hits)
+        STATS.count('match_cache_misses', misses)
+
+        # Cached rows for every test airport that has them, in test_df positions
+        hit_rows = np.flatnonzero(hit)
+        cached_matches = pd.DataFrame({'test_row': hit_rows, 'test_key': keys[hit_rows]}).merge(cached, on='test_key')
+
+        miss_rows = np.flatnonzero(~hit)
+        new_matches = match_sources_parallel(test_df.iloc[miss_rows], comparison_df, distance_max=distance_max,
+                                             window=window, name_cutoff=name_cutoff,
+                                             override_distance=override_distance, spatial_index=spatial_index,
+                                             max_workers=max_workers)
+        new_matches['test_row'] = miss_rows[new_matches.test_row.to_numpy()]
+        new_matches['test_key'] = keys[new_matches.test_row.to_numpy()]
+        # Identical test airports share a key, store the results of the first of them
+        first_rows = miss_rows[np.unique(keys[miss_rows], return_index=True)[1]]
+        self._store(version, dataset, params, new_matches[np.isin(new_matches.test_row.to_numpy(), first_rows)])
+
+        matches = pd.concat([cached_matches[['test_row', 'match_row', 'distance_km', 'name_score', 'match_reason']],
+                             new_matches[['test_row', 'match_row', 'distance_km', 'name_score', 'match_reason']]],
+                            ignore_index=True)
+        matches = matches.sort_values(['test_row', 'match_row'], kind='stable').reset_index(drop=True)
+        test_rows = matches.test_row.to_numpy(dtype=np.int64)
+        match_rows = matches.match_row.to_numpy(dtype=np.int64)
+        matches['test_row'] = test_rows
+        matches['match_row'] = match_rows
+        matches['distance_km'] = matches.distance_km.to_numpy(dtype=float)
+        matches['name_score'] = matches.name_score.to_numpy(dtype=float)
+        matches['match_reason'] = matches.match_reason.to_numpy(dtype=object)
+        matches['test_id'] = test_df['id'].to_numpy(dtype=object)[test_rows]
+        matches['test_source_id'] = test_df['source_id'].to_numpy(dtype=object)[test_rows]
+        matches['match_id'] = np.append(comparison_df['id'].to_numpy(dtype=object), '')[match_rows]
+        matches['match_source_id'] = np.append(comparison_df['source_id'].to_numpy(dtype=object), '')[match_rows]
+        return matches[MATCH_COLUMNS]
+
+    def _store(self, version, dataset, params, new_matches):
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO versions VALUES (?, ?, ?, ?)',
+                                    (version, dataset, params, time.time()))
+            self.connection.executemany(
+                'INSERT INTO matches VALUES (?, ?, ?, ?, ?, ?)',
+                zip([version] * len(new_matches), new_matches.test_key.tolist(), new_matches.match_row.tolist(),
+                    [None if np.isnan(d) else d for d in new_matches.distance_km.tolist()],
+                    [None if np.isnan(d) else d for d in new_matches.name_score.tolist()],
+                    new_matches.match_reason.tolist()))
+            stale = [row[0] for row in self.connection.execute(
+                'SELECT version FROM versions ORDER BY last_used DESC LIMIT -1 OFFSET ?', (self.max_versions,))]
+            for stale_version in stale:
+                self.connection.execute('DELETE FROM matches WHERE version = ?', (stale_version,))
+                self.connection.execute('DELETE FROM versions WHERE version = ?', (stale_version,))
+            STATS.count('match_cache_pruned', len(stale))
+
+# Columns of the airports table with a plain index, for filters in ad-hoc queries
+AIRPORT_DB_INDEXES = ['id', 'icao', 'iata', 'source', 'status']
+
+def export_airport_database(sources, path=AIRPORT_DB_FILE):
+    '''
+    Write every source frame into one SQLite database for ad-hoc queries, see airport_db.py
 
-    bts_airports = get_bts_airport_list(r'bts\787626600_T_MASTER_CORD.zip')
-    bts_airport_df = airports_to_df(bts_airports)
+    Tables:
+      - airports: the airports_to_df columns of all sources, dates as ISO strings
+      - airports_rtree: R*Tree on lat/lon keyed by airports.rowid
+      - metadata: schema version and row counts per source
+    with an index on each of AIRPORT_DB_INDEXES.
 
-    for test_airport in [a for a in bts_airports if a.status == 'C']:
-        matched_airport = get_best_match(test_airport, aa_airport_df)
-        if not isinstance(matched_airport, pd.DataFrame):
-            print('Unmatched: {}'.format(test_airport))
-            unmatched_closed_airports.append(test_airport)
+    :param sources: {source name: airports_to_df frame}, e.g. load_all_sources output
+    '''
+    airport_df = pd.concat([df[AIRPORT_COLUMNS] for df in sources.values()], ignore_index=True)
+    for column in ['start_date', 'end_date']:
+        dates = pd.to_datetime(airport_df[column])
+        airport_df[column] = dates.dt.strftime('%Y-%m-%d').where(dates.notna(), None)
+
+    if os.path.exists(path + '.tmp'):
+        os.remove(path + '.tmp')
+    connection = sqlite3.connect(path + '.tmp')
+    try:
+        with connection:
+            airport_df.to_sql('airports', connection, index=False, chunksize=CSV_CHUNKSIZE)
+            connection.execute('CREATE VIRTUAL TABLE airports_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)')
+            connection.execute('INSERT INTO airports_rtree SELECT rowid, lat, lat, lon, lon FROM airports')
+            for column in AIRPORT_DB_INDEXES:
+                connection.execute('CREATE INDEX airports_{0} ON airports ({0})'.format(column))
+            connection.execute('CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT)')
+            connection.executemany('INSERT INTO metadata VALUES (?, ?)',
+                                   [('schema', str(CACHE_SCHEMA_VERSION)),
+                                    ('sources', json.dumps(dict((source, len(df)) for source, df in sources.items())))])
+    finally:
+        connection.close()
+    os.replace(path + '.tmp', path)
+
+STORE_MAGIC = b'AIRSTOR1'
+STORE_ALIGNMENT = 64 # bytes, every column buffer starts on a multiple of this
+
+def _store_aligned(offset):
+    return -(-offset // STORE_ALIGNMENT) * STORE_ALIGNMENT
+
+def _store_column(values):
+    # (kind, dtype, [buffers]) for one column of write_airport_store
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return 'datetime', '<i8', [values.to_numpy(dtype='datetime64[ns]').view('<i8')]
+    if pd.api.types.is_bool_dtype(values) or pd.api.types.is_numeric_dtype(values):
+        array = values.to_numpy()
+        dtype = array.dtype.newbyteorder('<').str
+        return 'numeric', dtype, [np.ascontiguousarray(array, dtype=dtype)]
+    encoded = [str(v).encode('utf-8') for v in values.astype(object).fillna('')]
+    offsets = np.zeros(len(encoded) + 1, dtype='<i8')
+    np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+    return 'string', '<i8', [offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)]
+
+def write_airport_store(airport_df, path=STORE_FILE):
+    '''
+    Write an airport frame as a columnar file that AirportStore can memory map
 
-    nfdc_airports = get_nfdc_airport_list(r'nfdc\APT.zip')
-    nfdc_airport_df = airports_to_df(nfdc_airports)
+    Numeric columns (lat/lon, DMS degrees/minutes/seconds, x/y/z) are stored as fixed width
+    little-endian arrays, dates as int64 nanoseconds, and everything else as utf-8 strings: an
+    int64 offsets array with one entry per row plus one, then the concatenated bytes. A JSON
+    header after STORE_MAGIC lists each column's kind, dtype and buffer positions.
 
+    :param airport_df: frame in the airports_to_df schema, any extra columns are kept too
+    '''
+    columns = []
+    buffers = []
+    for name in airport_df.columns:
+        kind, dtype, column_buffers = _store_column(airport_df[name])
+        columns.append({'name': str(name), 'kind': kind, 'dtype': dtype,
+                        'buffers': [[0, int(b.nbytes)] for b in column_buffers]})
+        buffers.extend(column_buffers)
+    # Buffer offsets are relative to the data section, which starts after the header
+    offset = 0
+    for column in columns:
+        for buffer in column['buffers']:
+            buffer[0] = offset
+            offset = _store_aligned(offset + buffer[1])
+    header = {'version': CACHE_SCHEMA_VERSION, 'rows': len(airport_df), 'columns': columns}
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    data_start = _store_aligned(len(STORE_MAGIC) + 8 + len(header_bytes))
+
+    with open(path + '.tmp', 'wb') as f:
+        f.write(STORE_MAGIC)
+        f.write(np.array(len(header_bytes), dtype='<u8').tobytes())
+        f.write(header_bytes)
+        for buffer, (start, _) in zip(buffers, [b for c in columns for b in c['buffers']]):
+            f.write(b'\0' * (data_start + start - f.tell()))
+            f.write(buffer.tobytes())
+    os.replace(path + '.tmp', path)
+
+class AirportStore:
+    '''
+    Read only, zero copy view of a write_airport_store file
 
-    for test_airport in [a for a in nfdc_airports if a.status == 'CP']:
-        matched_airport = get_best_match(test_airport, aa_airport_df)
-        if not isinstance(matched_airport, pd.DataFrame):
-            print('Unmatched: {}'.format(test_airport))
-            unmatched_closed_airports.append(test_airport)
+    The file is memory mapped, so opening only parses the header and every process that opens
+    the same file shares its pages through the OS page cache. Numeric and date columns are
+    numpy views straight onto the mapping; string columns are decoded on access, for all rows
+    or just the requested ones.
 
-    unmatched_closed_airports_df = airports_to_df(unmatched_closed_airports)
-    # Filter out helipads/heliports, too many to sift through
-    unmatched_closed_airports_noheli_df = unmatched_closed_airports_df[~unmatched_closed_airports_df['name'].str.contains('HELI')]
-    unmatched_closed_airports_noheli_df.to_csv('unmatched_closed_airports.csv')
+        store = AirportStore('airports.store')
+        lat, lon = store['lat'], store['lon']
+        names = store.strings('name', rows)
+        airport_df = store.to_df(['id', 'name', 'lat', 'lon'])
+    '''
+    def __init__(self, path=STORE_FILE):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(STORE_MAGIC)] != STORE_MAGIC:
+            self._map.close()
+            raise ValueError('{} is not an airport store'.format(path))
+        header_start = len(STORE_MAGIC) + 8
+        header_length = int(np.frombuffer(self._map, dtype='<u8', count=1, offset=len(STORE_MAGIC))[0])
+        header = json.loads(self._map[header_start:header_start + header_length].decode('utf-8'))
+        data_start = _store_aligned(header_start + header_length)
+        for column in header['columns']:
+            for buffer in column['buffers']:
+                buffer[0] += data_start
+        self.version = header['version']
+        self.rows = header['rows']
+        self._columns = dict((column['name'], column) for column in header['columns'])
+        self.columns = [column['name'] for column in header['columns']]
+
+    def __len__(self):
+        return self.rows
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        # Views handed out keep the mapping alive, it is unmapped once they are gone too
+        self._map = None
+
+    def _buffer(self, start, length, dtype):
+        dtype = np.dtype(dtype)
+        return np.frombuffer(self._map, dtype=dtype, count=length // dtype.itemsize, offset=start)
+
+    def __getitem__(self, name):
+        '''
+        Numeric or datetime64 column as a read only array over the mapping
+        '''
+        column = self._columns[name]
+        if column['kind'] == 'string':
+            return self.strings(name)
+        values = self._buffer(*column['buffers'][0], column['dtype'])
+        if column['kind'] == 'datetime':
+            values = values.view('datetime64[ns]')
+        return values
+
+    def strings(self, name, rows=None):
+        '''
+        String column decoded to an object array, for the given row positions or all rows
+        '''
+        column = self._columns[name]
+        offsets = self._buffer(*column['buffers'][0], column['dtype'])
+        data_start = column['buffers'][1][0]
+        if rows is None:
+            data = self._map[data_start:data_start + column['buffers'][1][1]]
+            starts, ends = offsets[:-1].tolist(), offsets[1:].tolist()
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+            data = self._map
+            starts, ends = (offsets[rows] + data_start).tolist(), (offsets[rows + 1] + data_start).tolist()
+        values = np.empty(len(starts), dtype=object)
+        values[:] = [data[start:end].decode('utf-8') for start, end in zip(starts, ends)]
+        return values
+
+    def to_df(self, columns=None, rows=None):
+        '''
+        pandas frame of some or all columns and rows; numeric columns are copied out of the mapping
+        '''
+        columns = self.columns if columns is None else columns
+        data = {}
+        for name in columns:
+            if self._columns[name]['kind'] == 'string':
+                data[name] = self.strings(name, rows)
+            else:
+                values = self[name]
+                data[name] = values.copy() if rows is None else values[np.asarray(rows, dtype=np.int64)]
+        return pd.DataFrame(data, columns=columns)
+
+
+if __name__ == '__main__':
+
+    lat_dms, lon_dms = ll_decimal_to_dms(22.125, -22.125)
+    assert(lat_dms == ['N', 22.0, 7.0, 30.0])
+    assert(lon_dms == ['W', 22.0, 7.0, 30.0])
+
+    # --no-cache parses every source again instead of reusing the frames cached by earlier runs
+    use_cache = '--no-cache' not in sys.argv
+    # --clear-cache removes every cached frame first, so this run parses and caches the sources afresh
+    if '--clear-cache' in sys.argv:
+        clear_cache()
+    # --workers N matches the closed airports of each source over N processes
+    workers = int(sys.argv[sys.argv.index('--workers') + 1]) if '--workers' in sys.argv else 1
+    # --stats writes per-stage timings and counters to run_stats.json, --profile a cProfile dump to run.prof
+    STATS.reset(enabled='--stats' in sys.argv)
+    profiler = None
+    if '--profile' in sys.argv:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    unmatched_closed_airports = []
+
+    config = {'openstreetmaps': r'osm\osm_aeroway_pnt.csv',
+              'abandoned_airfields': r'abandoned\abandoned_airports.csv',
+              'ourairports': r'ourairports\airports.csv',
+              'usgs': r'usgs\usgs_tran_national_AirportPoint.csv',
+              'bts': r'bts\787626600_T_MASTER_CORD.zip',
+              'nfdc': r'nfdc\APT.zip'}
+    # --runways takes the NFDC airports and runways from the same parse of APT.txt
+    loaders = {'nfdc': get_nfdc_frames} if '--runways' in sys.argv else None
+    sources, report = load_all_sources(config, use_cache=use_cache, loaders=loaders)
+    for source, source_report in report.items():
+        if source_report['error']:
+            print('{}: failed to load {}, {}'.format(source, source_report['path'], source_report['error']))
+        else:
+            print('{}: {} rows in {:.1f}s'.format(source, source_report['rows'], source_report['seconds']))
+    if not sources:
+        sys.exit('No sources loaded')
+
+    # One row per physical airfield across all the sources
+    entities, members = reconcile_sources(sources)
+    print('Airport entities: {} from {} source rows'.format(len(entities), len(members)))
+    entities.to_csv('airport_entities.csv', index=False)
+    # --runways joins the NFDC runways to the entities by runway midpoint
+    if '--runways' in sys.argv and 'nfdc' in sources:
+        runway_df = match_runways(report['nfdc']['frames']['runways'], entities)
+        runway_df['entity_id'] = np.append(entities['entity_id'].to_numpy(), -1)[runway_df['airport_row'].to_numpy()]
+        print('Runways: {} loaded, {} joined to an entity'.format(len(runway_df), (runway_df.airport_row >= 0).sum()))
+        runway_df.drop(columns='airport_row').to_csv('runways.csv', index=False)
+    # --store writes every source airport to a file worker processes can share with AirportStore
+    if '--store' in sys.argv:
+        write_airport_store(pd.concat(list(sources.values()), ignore_index=True))
+    # --database exports every source airport to SQLite for airport_db.py queries
+    if '--database' in sys.argv:
+        export_airport_database(sources)
+
+    # Closed airports are looked up in the abandoned airfields, nothing to match them against without it
+    unmatched_closed_airports_noheli_df = None
+    if 'abandoned_airfields' not in sources:
+        print('abandoned_airfields not loaded, skipping the closed airport matching')
+    else:
+        aa_airport_df = sources['abandoned_airfields']
+        aa_index = SpatialIndex(aa_airport_df)
+        aa_name_index = NameIndex(aa_airport_df)
+
+        # No status in usgs data
+        # --incremental re-matches only what changed since the snapshot of the previous run
+        snapshot = load_snapshot() if '--incremental' in sys.argv else None
+        if snapshot is not None and snapshot.get('schema') != CACHE_SCHEMA_VERSION:
+            snapshot = None
+        closed_frames = {}
+        closed_matches = {}
+        # Matches of unchanged closed airports are reused from earlier runs unless --no-match-cache
+        match_cache = MatchCache() if '--no-match-cache' not in sys.argv else None
+
+        closed_status = {'openstreetmaps': 'C', 'ourairports': 'C', 'bts': 'C', 'nfdc': 'CP'}
+        for source, status in closed_status.items():
+            if source not in sources:
+                continue
+            closed_df = sources[source][sources[source].status == status]
+            # Duplicate points of one field (node and way centroid, aerodrome and disused runway) unless --no-dedup
+            if '--no-dedup' not in sys.argv:
+                deduped_df, _ = dedup_source(closed_df)
+                if len(deduped_df) < len(closed_df):
+                    print('{}: {} duplicate closed airports collapsed'.format(source, len(closed_df) - len(deduped_df)))
+                closed_df = deduped_df
+            if snapshot is not None and source in snapshot['matches']:
+                matches = update_matches(snapshot['matches'][source], snapshot['closed'][source], closed_df,
+                                         snapshot['comparison'], aa_airport_df, spatial_index=aa_index)
+            elif match_cache is not None:
+                matches = match_cache.match(closed_df, aa_airport_df, spatial_index=aa_index, max_workers=workers)
+            else:
+                matches = match_sources_parallel(closed_df, aa_airport_df, spatial_index=aa_index,
+                                                 max_workers=workers)
+            closed_frames[source] = closed_df
+            closed_matches[source] = matches
+            # Same airfield listed with coordinates outside the search window
+            unmatched_df = unmatched_airports(closed_df, matches)
+            name_matches = match_by_name(unmatched_df, aa_airport_df, name_index=aa_name_index)
+            unmatched_closed_airports.append(unmatched_airports(unmatched_df, name_matches))
+
+        if match_cache is not None:
+            print('Match cache: {} hits, {} misses'.format(match_cache.hits, match_cache.misses))
+            match_cache.close()
+        save_snapshot({'schema': CACHE_SCHEMA_VERSION, 'comparison': aa_airport_df,
+                       'closed': closed_frames, 'matches': closed_matches})
+
+        if not unmatched_closed_airports:
+            # None of the sources with closed airports loaded
+            unmatched_closed_airports = [pd.DataFrame(columns=AIRPORT_COLUMNS)]
+        unmatched_closed_airports_df = pd.concat(unmatched_closed_airports, ignore_index=True)
+        print('Unmatched closed airports: {}'.format(len(unmatched_closed_airports_df)))
+        # Filter out helipads/heliports, too many to sift through
+        unmatched_closed_airports_noheli_df = unmatched_closed_airports_df[~unmatched_closed_airports_df['name'].str.contains('HELI')]
+        # Same columns as before name keys, unit vectors and dedup_source's columns were added
+        unmatched_closed_airports_noheli_df[[c for c in AIRPORT_COLUMNS if c not in DERIVED_COLUMNS]].to_csv(
+            'unmatched_closed_airports.csv')
+
+    # --kml / --geojson stream every source airport (one folder per state) and the unmatched closed airports
+    if '--kml' in sys.argv or '--geojson' in sys.argv:
+        import geo_export
+        if '--kml' in sys.argv:
+            geo_export.write_kml(sources.values(), 'airports.kml', style_by='source', group_by='state')
+            if unmatched_closed_airports_noheli_df is not None:
+                geo_export.write_kml(unmatched_closed_airports_noheli_df, 'unmatched_closed_airports.kml',
+                                     style_by='source', group_by='state')
+        if '--geojson' in sys.argv:
+            geo_export.write_geojson_lines(sources.values(), 'airports.geojsonl')
+            if unmatched_closed_airports_noheli_df is not None:
+                geo_export.write_geojson(unmatched_closed_airports_noheli_df, 'unmatched_closed_airports.geojson')
+
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats('run.prof')
+    if STATS.enabled:
+        STATS.write_report('run_stats.json')
 
-    # Load runways
-    # Find runways that match these airports
     # write to kml airport locations and runways
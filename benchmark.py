@@ -0,0 +1,471 @@
+'''
+Synthetic input generator and benchmark harness for aviation.py
+
+The real source files are not checked in, so generate stand-ins in each loader's format:
+
+    python benchmark.py generate --rows 100000 --overlap 0.6 --out bench_data
+
+and time the loaders, frame building, distance/DMS helpers and matching on them:
+
+    python benchmark.py run --rows 100000 --results benchmark_results.jsonl
+    python benchmark.py compare benchmark_results.jsonl
+
+Each run appends one JSON line (commit, versions, CPU count, parameters, timings) to the
+results file, compare prints the last two runs side by side. Scaling of the parallel matcher
+is timed with one entry per process count:
+
+    python benchmark.py run --rows 100000 --workers 1 2 4
+'''
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+import numpy as np
+import pandas as pd
+import aviation
+
+STATES = ['AK', 'AL', 'AR', 'AZ', 'CA', 'CO', 'CT', 'DE', 'FL', 'GA', 'HI', 'IA', 'ID', 'IL', 'IN', 'KS', 'KY',
+          'LA', 'MA', 'MD', 'ME', 'MI', 'MN', 'MO', 'MS', 'MT', 'NC', 'ND', 'NE', 'NH', 'NJ', 'NM', 'NV', 'NY',
+          'OH', 'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VA', 'VT', 'WA', 'WI', 'WV', 'WY']
+NAME_PREFIXES = ['SPRING', 'OAK', 'MILL', 'CEDAR', 'PINE', 'ELM', 'ASH', 'MAPLE', 'RED', 'GREEN', 'FAIR', 'BELL',
+                 'STONE', 'WEST', 'EAST', 'NORTH', 'SOUTH', 'LAKE', 'RIVER', 'HILL', 'ROCK', 'SAND', 'CLEAR',
+                 'WILLOW', 'BEAR', 'EAGLE', 'HAWK', 'FOX', 'DEER', 'WOLF', 'SILVER', 'GOLD', 'IRON', 'COPPER']
+NAME_SUFFIXES = ['VILLE', 'TON', 'WOOD', 'BURG', 'DALE', 'FORD', 'PORT', 'VIEW', 'CREST', 'MONT', 'FIELD',
+                 'BROOK', 'HAVEN', 'LAND', 'MOOR', 'GATE', 'WATER', 'STEAD', 'BRIDGE', 'WORTH']
+FAMILY_NAMES = ['SMITH', 'JOHNSON', 'WILLIAMS', 'BROWN', 'JONES', 'MILLER', 'DAVIS', 'WILSON', 'ANDERSON',
+                'TAYLOR', 'THOMAS', 'MOORE', 'MARTIN', 'JACKSON', 'THOMPSON', 'WHITE', 'HARRIS', 'CLARK',
+                'LEWIS', 'ROBINSON', 'WALKER', 'YOUNG', 'ALLEN', 'KING', 'WRIGHT', 'SCOTT', 'HILL', 'ADAMS']
+# Facility words, with the abbreviation some sources use for the same word
+NAME_KINDS = [('AIRPORT', 'ARPT'), ('MUNICIPAL AIRPORT', 'MUNI'), ('FIELD', 'FLD'), ('AIRSTRIP', 'AIRSTRIP'),
+              ('RANCH', 'RNCH'), ('REGIONAL AIRPORT', 'RGNL'), ('HELIPORT', 'HELIPORT'), ('AIRPARK', 'AIRPARK')]
+
+def _truth_airfields(rng, count):
+    '''
+    The physical airfields the synthetic sources describe: name, location, state, codes
+    '''
+    place = np.where(rng.random(count) < 0.6,
+                     rng.choice(NAME_PREFIXES, count).astype(object) + rng.choice(NAME_SUFFIXES, count).astype(object),
+                     rng.choice(FAMILY_NAMES, count).astype(object))
+    kinds = rng.integers(0, len(NAME_KINDS), count)
+    # Uniform over CONUS with denser clusters around a few hubs, like real airfields
+    clustered = rng.random(count) < 0.3
+    hubs = rng.uniform([30, -120], [45, -75], (20, 2))
+    hub = hubs[rng.integers(0, len(hubs), count)]
+    lat = np.where(clustered, hub[:, 0] + rng.normal(0, 0.5, count), rng.uniform(25, 49, count))
+    lon = np.where(clustered, hub[:, 1] + rng.normal(0, 0.5, count), rng.uniform(-124, -67, count))
+    serial = np.arange(count)
+    return pd.DataFrame({'place': place,
+                         'kind': kinds,
+                         'name': place + ' ' + np.array([k[0] for k in NAME_KINDS], dtype=object)[kinds],
+                         'short_name': place + ' ' + np.array([k[1] for k in NAME_KINDS], dtype=object)[kinds],
+                         'lat': lat,
+                         'lon': lon,
+                         'state': rng.choice(STATES, count),
+                         'faa_id': pd.Series(serial).map(lambda i: '{}{:03d}'.format(chr(65 + i % 26), i // 26 % 1000)
+                                                         if i < 26000 else '{:04d}'.format(i % 10000)).to_numpy(),
+                         'icao': np.where(serial % 4 == 0, 'K' + pd.Series(serial).map('{:03X}'.format).str[-3:], ''),
+                         'iata': np.where(serial % 15 == 0, pd.Series(serial).map('{:03X}'.format).str[-3:], '')})
+
+def _source_sample(rng, truth, rows, overlap, jitter_deg=0.002):
+    '''
+    rows airfields for one source: overlap of them drawn from the airfields every source shares,
+    the rest from airfields only this source lists, with coordinates jittered per source
+    '''
+    shared = int(len(truth) * overlap / (1 + overlap)) if overlap < 1 else len(truth)
+    from_shared = min(int(rows * overlap), shared)
+    picks = np.concatenate([rng.choice(shared, from_shared, replace=False),
+                            rng.choice(np.arange(shared, len(truth)), rows - from_shared,
+                                       replace=len(truth) - shared < rows - from_shared)
+                            if rows > from_shared else np.empty(0, dtype=np.int64)])
+    sample = truth.iloc[np.sort(picks)].reset_index(drop=True)
+    sample['lat'] = sample['lat'] + rng.normal(0, jitter_deg, len(sample))
+    sample['lon'] = sample['lon'] + rng.normal(0, jitter_deg, len(sample))
+    return sample
+
+def _dms_parts(decimal_degrees):
+    value = np.abs(decimal_degrees)
+    degrees = np.floor(value)
+    minutes = np.floor((value - degrees) * 60)
+    seconds = ((value - degrees) * 60 - minutes) * 60
+    return degrees, minutes, seconds
+
+def _blank_some(rng, values, fraction):
+    values = pd.Series(values, dtype=object)
+    return values.where(rng.random(len(values)) >= fraction)
+
+def write_usgs(path, rng, sample):
+    '''
+    USGS AirportPoint CSV as exported from QGIS with GEOMETRY=AS_XY, runway points included
+    '''
+    runways = sample.sample(frac=0.2, random_state=int(rng.integers(1 << 31)))
+    frame = pd.concat([sample.assign(GEODB_SUB='Airport'), runways.assign(GEODB_SUB='Runway')], ignore_index=True)
+    pd.DataFrame({'X': frame['lon'].round(8),
+                  'Y': frame['lat'].round(8),
+                  'FAA_AIRPOR': _blank_some(rng, frame['faa_id'], 0.2),
+                  'NAME': frame['name'].str.title(),
+                  'GLOBALID': ['{{{:08X}-USGS}}'.format(i) for i in range(len(frame))],
+                  'AIRPORT_CL': rng.choice([1, 2, 3, 4, 5, 99], len(frame)),
+                  'GEODB_SUB': frame['GEODB_SUB']}).to_csv(path, index=False)
+
+def write_bts(path, rng, sample):
+    '''
+    BTS Master Coordinates zip: every airport with superseded versions and foreign airports mixed in
+    '''
+    history = sample.sample(frac=0.5, random_state=int(rng.integers(1 << 31)))
+    foreign = sample.sample(frac=0.2, random_state=int(rng.integers(1 << 31)))
+    frame = pd.concat([sample.assign(latest=1, country='US'),
+                       history.assign(latest=0, country='US'),
+                       foreign.assign(latest=1, country='MX', lat=foreign['lat'] - 10)], ignore_index=True)
+    lat_deg, lat_min, lat_sec = _dms_parts(frame['lat'].to_numpy())
+    lon_deg, lon_min, lon_sec = _dms_parts(frame['lon'].to_numpy())
+    closed = rng.random(len(frame)) < 0.1
+    start = pd.to_datetime('1950-01-01') + pd.to_timedelta(rng.integers(0, 25000, len(frame)), unit='D')
+    bts = pd.DataFrame({'AIRPORT_SEQ_ID': np.arange(len(frame)) + 1000000,
+                        'AIRPORT_ID': np.arange(len(frame)) % len(sample) + 10000,
+                        'AIRPORT': frame['faa_id'],
+                        'DISPLAY_AIRPORT_NAME': frame['name'].str.title(),
+                        'DISPLAY_AIRPORT_CITY_NAME_FULL': frame['place'].str.title() + ', ' + frame['state'],
+                        'AIRPORT_STATE_CODE': frame['state'],
+                        'AIRPORT_COUNTRY_CODE_ISO': frame['country'],
+                        'LATITUDE': frame['lat'].round(8),
+                        'LAT_HEMISPHERE': 'N',
+                        'LAT_DEGREES': lat_deg,
+                        'LAT_MINUTES': lat_min,
+                        'LAT_SECONDS': lat_sec.round(0),
+                        'LONGITUDE': frame['lon'].round(8),
+                        'LON_HEMISPHERE': 'W',
+                        'LON_DEGREES': lon_deg,
+                        'LON_MINUTES': lon_min,
+                        'LON_SECONDS': lon_sec.round(0),
+                        'AIRPORT_START_DATE': start.strftime('%Y-%m-%d'),
+                        'AIRPORT_THRU_DATE': np.where(frame['latest'] == 1, '', '2015-01-01'),
+                        'AIRPORT_IS_CLOSED': closed.astype(int),
+                        'AIRPORT_IS_LATEST': frame['latest']})
+    # Unknown airports come without coordinates
+    bts.loc[bts.sample(frac=0.01, random_state=int(rng.integers(1 << 31))).index,
+            ['LAT_DEGREES', 'LAT_MINUTES', 'LAT_SECONDS']] = np.nan
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('787626600_T_MASTER_CORD.csv', bts.to_csv(index=False))
+
+def write_ourairports(path, rng, sample):
+    '''
+    OurAirports airports.csv, all columns of the published file, some non-US rows
+    '''
+    count = len(sample)
+    types = np.array(['small_airport', 'closed', 'heliport', 'medium_airport', 'large_airport', 'seaplane_base'])
+    pd.DataFrame({'id': np.arange(count) + 6000,
+                  'ident': np.where(sample['icao'] != '', sample['icao'], 'US-' + sample['faa_id']),
+                  'type': types[rng.choice(len(types), count, p=[0.55, 0.15, 0.2, 0.05, 0.02, 0.03])],
+                  'name': sample['name'].str.title(),
+                  'latitude_deg': sample['lat'].round(8),
+                  'longitude_deg': sample['lon'].round(8),
+                  'elevation_ft': rng.integers(0, 8000, count),
+                  'continent': 'NA',
+                  'iso_country': np.where(rng.random(count) < 0.95, 'US', 'CA'),
+                  'iso_region': 'US-' + sample['state'],
+                  'municipality': _blank_some(rng, sample['place'].str.title(), 0.1),
+                  'scheduled_service': 'no',
+                  'gps_code': sample['icao'],
+                  'iata_code': _blank_some(rng, sample['iata'].replace('', np.nan), 0),
+                  'local_code': _blank_some(rng, sample['faa_id'], 0.1),
+                  'home_link': _blank_some(rng, 'http://example.com/' + sample['faa_id'], 0.8),
+                  'wikipedia_link': _blank_some(rng, 'https://en.wikipedia.org/wiki/' + sample['faa_id'], 0.9),
+                  'keywords': ''}).to_csv(path, index=False)
+
+def write_osm(path, rng, sample):
+    '''
+    OSM aeroway points CSV as exported from QGIS, with the non-facility aeroway types it drops
+    '''
+    count = len(sample)
+    aeroways = np.array(['aerodrome', 'helipad', 'runway_disused', 'abandoned', 'disused', 'airstrip'])
+    facilities = pd.DataFrame({'X': sample['lon'].round(7),
+                               'Y': sample['lat'].round(7),
+                               'aeroway': aeroways[rng.choice(len(aeroways), count, p=[0.6, 0.2, 0.05, 0.05, 0.05, 0.05])],
+                               'name': _blank_some(rng, sample['name'].str.title(), 0.15),
+                               'ref': _blank_some(rng, sample['faa_id'], 0.5),
+                               'iata': sample['iata'].replace('', np.nan),
+                               'icao': sample['icao'].replace('', np.nan)})
+    clutter = facilities.sample(frac=0.5, random_state=int(rng.integers(1 << 31)))
+    clutter = clutter.assign(aeroway=rng.choice(['gate', 'taxiway', 'windsock', 'parking_position'], len(clutter)))
+    frame = pd.concat([facilities, clutter], ignore_index=True)
+    frame.insert(2, 'NodeId', rng.permutation(len(frame)) + 10**9)
+    frame.to_csv(path, index=False)
+
+def write_abandoned(path, rng, sample):
+    '''
+    Abandoned airfields CSV: "Name, City, State" in one column, a few malformed ones
+    '''
+    airport = sample['name'].str.title() + ', ' + sample['place'].str.title() + ', ' + sample['state']
+    malformed = rng.random(len(sample)) < 0.05
+    airport = airport.where(~malformed, sample['name'].str.title() + ', ' + sample['place'].str.title())
+    pd.DataFrame({'Airport': airport,
+                  'Lat': sample['lat'].round(5),
+                  'Lon': sample['lon'].round(5),
+                  'State': sample['state'],
+                  'Link': 'http://www.airfields-freeman.com/' + sample['state'] + '/Airfields_'
+                          + sample['state'] + '_' + pd.Series(np.arange(len(sample))).astype(str) + '.htm'}
+                 ).to_csv(path, index=False)
+
+def _fixed_width_template(fields=aviation.NFDC_APT_FIELDS):
+    '''
+    str.format template laying out one record at the offsets of fields, e.g. aviation.NFDC_APT_FIELDS
+    '''
+    template = []
+    position = 0
+    for index, (name, start, end) in enumerate(fields):
+        template.append(' ' * (start - position))
+        template.append('{%d:<%d.%d}' % (index, end - start, end - start))
+        position = end
+    return ''.join(template)
+
+def write_nfdc(path, rng, sample, chunk_size=100000):
+    '''
+    NASR APT.zip: fixed width APT.txt with APT records at the NFDC_APT_FIELDS offsets and the
+    other record types interleaved
+    '''
+    count = len(sample)
+    lat_deg, lat_min, lat_sec = _dms_parts(sample['lat'].to_numpy())
+    lon_deg, lon_min, lon_sec = _dms_parts(sample['lon'].to_numpy())
+    inspected = pd.to_datetime('1985-01-01') + pd.to_timedelta(rng.integers(0, 14000, count), unit='D')
+    fields = {'RECORD TYPE INDICATOR': np.full(count, 'APT', dtype=object),
+              'LANDING FACILITY SITE NUMBER': pd.Series(np.arange(count)).map('{:05d}.*A'.format).to_numpy(),
+              'LANDING FACILITY TYPE': np.where(sample['kind'] == 6, 'HELIPORT', 'AIRPORT'),
+              'LOCATION IDENTIFIER': sample['faa_id'].to_numpy(),
+              'INFORMATION EFFECTIVE DATE (MM/DD/YYYY)': np.full(count, '01/01/2024', dtype=object),
+              'ASSOCIATED STATE POST OFFICE CODE': np.where(rng.random(count) < 0.01, '', sample['state']),
+              'ASSOCIATED CITY NAME': sample['place'].to_numpy(),
+              # NASR names are often abbreviated, e.g. SMITH RGNL for SMITH REGIONAL AIRPORT
+              'OFFICIAL FACILITY NAME': np.where(rng.random(count) < 0.3, sample['short_name'], sample['name']),
+              'AIRPORT REFERENCE POINT LATITUDE (FORMATTED)':
+                  ['{:02.0f}-{:02.0f}-{:07.4f}N'.format(*v) for v in zip(lat_deg, lat_min, lat_sec)],
+              'AIRPORT REFERENCE POINT LATITUDE (SECONDS)':
+                  ['{:011.4f}N'.format(v) for v in np.abs(sample['lat'].to_numpy()) * 3600],
+              'AIRPORT REFERENCE POINT LONGITUDE (FORMATTED)':
+                  ['{:03.0f}-{:02.0f}-{:07.4f}W'.format(*v) for v in zip(lon_deg, lon_min, lon_sec)],
+              'AIRPORT REFERENCE POINT LONGITUDE (SECONDS)':
+                  ['{:011.4f}W'.format(v) for v in np.abs(sample['lon'].to_numpy()) * 3600],
+              'BOUNDARY ARTCC IDENTIFIER': rng.choice(['ZAB', 'ZDV', 'ZFW', 'ZKC', 'ZLA', 'ZNY'], count),
+              'RESPONSIBLE ARTCC IDENTIFIER': rng.choice(['ZAB', 'ZDV', 'ZFW', 'ZKC', 'ZLA', 'ZNY'], count),
+              'AIRPORT ACTIVATION DATE (MM/YYYY)':
+                  ['{:02d}/{:04d}'.format(m, y) for m, y in zip(rng.integers(1, 13, count),
+                                                                rng.integers(1940, 2020, count))],
+              'AIRPORT STATUS CODE': rng.choice(['O', 'CP', 'CI'], count, p=[0.8, 0.15, 0.05]),
+              'LAST PHYSICAL INSPECTION DATE (MMDDYYYY)':
+                  np.where(rng.random(count) < 0.3, '', inspected.strftime('%m%d%Y')),
+              'AIR TRAFFIC CONTROL TOWER LOCATED ON AIRPORT': rng.choice(['Y', 'N'], count, p=[0.1, 0.9]),
+              'LENS COLOR OF OPERABLE BEACON LOCATED ON THE AIRPORT': rng.choice(['', 'WG', 'WY'], count),
+              'ICAO IDENTIFIER': sample['icao'].to_numpy()}
+    blank = np.full(count, '', dtype=object)
+    columns = [fields.get(name, blank) for name, start, end in aviation.NFDC_APT_FIELDS]
+    template = _fixed_width_template() + '\r\n'
+
+    # One runway per airport, its ends about 500 m either side of the reference point
+    heading = rng.integers(1, 19, count)
+    offset = 0.0045 * np.exp(1j * np.radians(heading * 10.0))
+    runway_fields = {'RECORD TYPE INDICATOR': np.full(count, 'RWY', dtype=object),
+                     'LANDING FACILITY SITE NUMBER': fields['LANDING FACILITY SITE NUMBER'],
+                     'LANDING FACILITY STATE POST OFFICE CODE': fields['ASSOCIATED STATE POST OFFICE CODE'],
+                     'RUNWAY IDENTIFICATION': ['{:02d}/{:02d}'.format(h, h + 18) for h in heading],
+                     'PHYSICAL RUNWAY LENGTH (NEAREST FOOT)': rng.integers(1500, 8000, count).astype(str),
+                     'PHYSICAL RUNWAY WIDTH (NEAREST FOOT)': rng.integers(30, 150, count).astype(str),
+                     'RUNWAY SURFACE TYPE AND CONDITION': rng.choice(['ASPH-G', 'TURF-F', 'CONC-E', 'GRVL'], count),
+                     'BASE END IDENTIFIER': ['{:02d}'.format(h) for h in heading],
+                     'RECIPROCAL END IDENTIFIER': ['{:02d}'.format(h + 18) for h in heading]}
+    for end, sign in [('BASE', -1), ('RECIPROCAL', 1)]:
+        runway_fields['{} END LATITUDE OF PHYSICAL RUNWAY END (SECONDS)'.format(end)] = \
+            ['{:011.4f}N'.format(v) for v in np.abs(sample['lat'].to_numpy() + sign * offset.real) * 3600]
+        runway_fields['{} END LONGITUDE OF PHYSICAL RUNWAY END (SECONDS)'.format(end)] = \
+            ['{:011.4f}W'.format(v) for v in np.abs(sample['lon'].to_numpy() + sign * offset.imag) * 3600]
+    runway_columns = [runway_fields.get(name, blank) for name, start, end in aviation.NFDC_RWY_FIELDS]
+    runway_template = _fixed_width_template(aviation.NFDC_RWY_FIELDS) + '\r\n'
+    remark = 'RMK{:<11.11}{:<2.2}{:<13.13}{}\r\n'
+
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf, zf.open('APT.txt', 'w') as aptfile:
+        for chunk_start in range(0, count, chunk_size):
+            lines = []
+            for values, runway_values in zip(zip(*[column[chunk_start:chunk_start + chunk_size] for column in columns]),
+                                             zip(*[column[chunk_start:chunk_start + chunk_size]
+                                                   for column in runway_columns])):
+                lines.append(template.format(*values))
+                # Runway and remark records follow the airport record they belong to
+                lines.append(runway_template.format(*runway_values))
+                lines.append(remark.format(values[1], values[7], 'A81', 'CLOSED TO TRANSIENT TRAFFIC.'))
+            aptfile.write(''.join(lines).encode('utf-8'))
+
+SOURCE_WRITERS = {'openstreetmaps': (write_osm, os.path.join('osm', 'osm_aeroway_pnt.csv')),
+                  'abandoned_airfields': (write_abandoned, os.path.join('abandoned', 'abandoned_airports.csv')),
+                  'ourairports': (write_ourairports, os.path.join('ourairports', 'airports.csv')),
+                  'usgs': (write_usgs, os.path.join('usgs', 'usgs_tran_national_AirportPoint.csv')),
+                  'bts': (write_bts, os.path.join('bts', '787626600_T_MASTER_CORD.zip')),
+                  'nfdc': (write_nfdc, os.path.join('nfdc', 'APT.zip'))}
+
+def generate_sources(out_dir, rows=10000, overlap=0.5, seed=0):
+    '''
+    Write synthetic inputs for every loader in aviation.SOURCE_LOADERS
+
+    :param rows: airfields per source (before the rows each loader filters out)
+    :param overlap: fraction of each source's airfields that all the sources share, 0 to 1
+    :return: {source: path} config for aviation.load_all_sources
+    '''
+    rng = np.random.default_rng(seed)
+    truth = _truth_airfields(rng, int(rows * (1 + overlap)) + 1)
+    config = {}
+    for source, (writer, relative_path) in SOURCE_WRITERS.items():
+        path = os.path.join(out_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        writer(path, rng, _source_sample(rng, truth, rows, overlap))
+        config[source] = path
+    return config
+
+def time_call(function, *args, repeat=3, **kwargs):
+    '''
+    (best wall clock seconds of repeat calls, result of the last call)
+    '''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+def run_benchmarks(config, repeat=3, match_sample=2000, workers=None):
+    '''
+    Time each loader, airports_to_df, haversine_np, the DMS helpers and matching on the given inputs
+
+    :param config: {source: path}, e.g. generate_sources output
+    :param match_sample: test airports looked up one at a time with get_best_match
+    :param workers: process counts match_sources_parallel is timed with, e.g. [1, 2, 4], one CPU
+                    per process by default
+    :return: list of {'name', 'rows', 'seconds'} results, rows being the input size (output size for loaders)
+    '''
+    results = []
+    def record(name, rows, function, *args, **kwargs):
+        with open(os.devnull, 'w') as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                seconds, result = time_call(function, *args, repeat=repeat, **kwargs)
+            finally:
+                sys.stdout = stdout
+        if rows is None:
+            rows = len(result)
+        results.append({'name': name, 'rows': int(rows), 'seconds': seconds})
+        print('{:<40} {:>9} rows {:>10.4f}s'.format(name, rows, seconds))
+        return result
+
+    sources = {}
+    for source, path in config.items():
+        sources[source] = record('load.' + source, None, aviation.SOURCE_LOADERS[source], path)
+    record('load.nfdc_runways', None, aviation.get_nfdc_runway_frame, config['nfdc'])
+    record('load.nfdc_tables', None, lambda: aviation.get_nfdc_tables(config['nfdc'])['RWY'])
+
+    frame = sources['ourairports']
+    airports = aviation.df_to_airports(frame)
+    record('airports_to_df', len(airports), aviation.airports_to_df, airports)
+    table = record('AirportTable', len(frame), aviation.AirportTable, frame)
+    record('airports_to_df.table', len(table), aviation.airports_to_df, table)
+
+    lat = frame['lat'].to_numpy()
+    lon = frame['lon'].to_numpy()
+    record('haversine_np', len(lat), aviation.haversine_np, lon, lat, lon[::-1], lat[::-1])
+    record('dms.ll_decimal_to_dms', len(lat),
+           lambda: [aviation.ll_decimal_to_dms(a, b) for a, b in zip(lat, lon)])
+    record('dms.dms_columns', len(lat), aviation.dms_columns, lat, lon)
+
+    comparison_df = sources['abandoned_airfields']
+    test_df = pd.concat([sources[s][sources[s].status.isin(['C', 'CP'])]
+                         for s in ['openstreetmaps', 'ourairports', 'bts', 'nfdc']], ignore_index=True)
+    spatial_index = record('SpatialIndex', len(comparison_df), aviation.SpatialIndex, comparison_df)
+    sample = aviation.df_to_airports(test_df.head(match_sample))
+    record('get_best_match', len(sample),
+           lambda: [aviation.get_best_match(a, comparison_df, spatial_index) for a in sample])
+    record('match_sources', len(test_df), aviation.match_sources, test_df, comparison_df,
+           spatial_index=spatial_index)
+    if workers is None:
+        record('match_sources_parallel', len(test_df), aviation.match_sources_parallel, test_df, comparison_df,
+               spatial_index=spatial_index)
+    for max_workers in workers or []:
+        record('match_sources_parallel.workers{}'.format(max_workers), len(test_df),
+               aviation.match_sources_parallel, test_df, comparison_df, spatial_index=spatial_index,
+               max_workers=max_workers)
+    record('reconcile_sources', sum(len(df) for df in sources.values()), aviation.reconcile_sources, sources)
+    return results
+
+def compare_runs(results_file):
+    '''
+    Print the last two runs in a results file side by side
+    '''
+    with open(results_file, 'r') as f:
+        runs = [json.loads(line) for line in f if line.strip()]
+    if len(runs) < 2:
+        print('Need two runs to compare, {} has {}'.format(results_file, len(runs)))
+        return
+    previous, latest = runs[-2], runs[-1]
+    previous_seconds = dict((r['name'], r['seconds']) for r in previous['results'])
+    print('{:<40} {:>12} {:>12} {:>8}'.format('', previous['commit'], latest['commit'], 'ratio'))
+    for result in latest['results']:
+        before = previous_seconds.get(result['name'])
+        print('{:<40} {:>12} {:>12.4f} {:>8}'.format(result['name'],
+                                                     '' if before is None else '{:.4f}'.format(before),
+                                                     result['seconds'],
+                                                     '' if not before else '{:.2f}'.format(result['seconds'] / before)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    generate = commands.add_parser('generate', help='write synthetic inputs')
+    run = commands.add_parser('run', help='time the pipeline and append the results')
+    for command in [generate, run]:
+        command.add_argument('--rows', type=int, default=10000, help='airfields per source')
+        command.add_argument('--overlap', type=float, default=0.5, help='fraction shared between sources')
+        command.add_argument('--seed', type=int, default=0)
+    generate.add_argument('--out', required=True, help='directory to write the inputs to')
+    run.add_argument('--data', help='inputs from generate, generated into a temporary directory if omitted')
+    run.add_argument('--repeat', type=int, default=3, help='calls per timing, the best one is kept')
+    run.add_argument('--match-sample', type=int, default=2000, help='airports looked up with get_best_match')
+    run.add_argument('--workers', type=int, nargs='+',
+                     help='time match_sources_parallel with each of these process counts, e.g. 1 2 4')
+    run.add_argument('--results', default='benchmark_results.jsonl', help='JSON lines file to append to')
+    compare = commands.add_parser('compare', help='compare the last two runs')
+    compare.add_argument('results', nargs='?', default='benchmark_results.jsonl')
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        generate_sources(args.out, rows=args.rows, overlap=args.overlap, seed=args.seed)
+    elif args.command == 'compare':
+        compare_runs(args.results)
+    else:
+        with tempfile.TemporaryDirectory() as temporary_dir:
+            data_dir = args.data or temporary_dir
+            if args.data:
+                config = dict((source, os.path.join(data_dir, path)) for source, (_, path) in SOURCE_WRITERS.items())
+            else:
+                config = generate_sources(data_dir, rows=args.rows, overlap=args.overlap, seed=args.seed)
+            results = run_benchmarks(config, repeat=args.repeat, match_sample=args.match_sample,
+                                     workers=args.workers)
+        with open(args.results, 'a') as f:
+            f.write(json.dumps({'commit': _git_commit(),
+                                'date': datetime.datetime.now().isoformat(),
+                                'python': platform.python_version(),
+                                'numpy': np.__version__,
+                                'pandas': pd.__version__,
+                                'cpus': os.cpu_count(),
+                                'rows': args.rows,
+                                'overlap': args.overlap,
+                                'seed': args.seed,
+                                'data': args.data or '',
+                                'results': results}) + '\n')
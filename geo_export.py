@@ -0,0 +1,206 @@
+'''
+Streaming KML, GeoJSON and newline delimited GeoJSON writers for airport frames and match tables
+
+Every writer takes a frame or an iterable of frames (e.g. one per source, or read_csv
+chunks) and writes one placemark/feature per row as it goes, so memory stays bounded by
+the chunk size however many airports are exported:
+
+    geo_export.write_kml(sources.values(), 'airports.kml', style_by='source', group_by='state')
+    geo_export.write_geojson_lines(sources.values(), 'airports.geojsonl')
+    geo_export.write_geojson(match_lines(matches, closed_df, aa_airport_df), 'matches.geojson')
+
+Rows with match_lat/match_lon columns (see match_lines) become a line from the airport to
+its match; all other rows are points.
+'''
+import json
+import math
+import os
+import shutil
+import tempfile
+from xml.sax.saxutils import escape
+import numpy as np
+import pandas as pd
+import aviation
+
+GEO_CHUNKSIZE = 10000 # rows turned into placemarks/features at a time
+# Columns written as GeoJSON properties and KML descriptions, when a frame has them
+GEO_PROPERTIES = ['id', 'icao', 'iata', 'name', 'type', 'status', 'city', 'state', 'start_date', 'end_date',
+                  'source', 'source_id', 'link', 'match_id', 'match_source_id', 'match_name', 'distance_km',
+                  'name_score', 'match_reason']
+# KML colors (aabbggrr) handed out to style_by values in sorted order
+KML_COLORS = ['ff0000ff', 'ff00ff00', 'ffff0000', 'ff00ffff', 'ffff00ff', 'ffffff00', 'ff0080ff', 'ff8000ff',
+              'ff80ff00', 'ff00ff80', 'ffff8000', 'ff808080']
+
+
+def _chunks(frames, chunksize=GEO_CHUNKSIZE):
+    # DataFrames of at most chunksize rows from a frame or an iterable of frames
+    if isinstance(frames, pd.DataFrame):
+        frames = [frames]
+    for frame in frames:
+        for start in range(0, len(frame), chunksize):
+            yield frame.iloc[start:start + chunksize]
+
+def _property_values(values):
+    # Column values as JSON/KML friendly Python objects, None for missing ones
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.strftime('%Y-%m-%d').astype(object).where(values.notna(), None).tolist()
+    if values.isna().any():
+        values = values.astype(object).where(values.notna(), None)
+    return values.tolist()
+
+def _chunk_rows(chunk):
+    # (lat, lon, match_lat, match_lon, {property: value}) per row of a chunk
+    columns = [c for c in GEO_PROPERTIES if c in chunk]
+    values = [_property_values(chunk[c]) for c in columns]
+    lat = chunk['lat'].to_numpy(dtype=float)
+    lon = chunk['lon'].to_numpy(dtype=float)
+    if 'match_lat' in chunk:
+        match_lat = chunk['match_lat'].to_numpy(dtype=float)
+        match_lon = chunk['match_lon'].to_numpy(dtype=float)
+    else:
+        match_lat = match_lon = np.full(len(chunk), np.nan)
+    for row in zip(lat.tolist(), lon.tolist(), match_lat.tolist(), match_lon.tolist(),
+                   zip(*values) if values else [()] * len(chunk)):
+        yield row[:4] + (dict(zip(columns, row[4])),)
+
+_json_encode = json.JSONEncoder(separators=(',', ':'), default=str).encode
+
+def _geojson_feature(lat, lon, match_lat, match_lon, properties):
+    if math.isfinite(match_lat) and math.isfinite(match_lon):
+        geometry = {'type': 'LineString', 'coordinates': [[lon, lat], [match_lon, match_lat]]}
+    else:
+        geometry = {'type': 'Point', 'coordinates': [lon, lat]}
+    return _json_encode({'type': 'Feature', 'geometry': geometry, 'properties': properties})
+
+def write_geojson(frames, path, chunksize=GEO_CHUNKSIZE):
+    '''
+    Write a GeoJSON FeatureCollection, one feature per row
+
+    :param frames: airport frame, match_lines output, or an iterable of either
+    :return: number of features written
+    '''
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"type":"FeatureCollection","features":[\n')
+        for chunk in _chunks(frames, chunksize):
+            lines = [_geojson_feature(*row) for row in _chunk_rows(chunk)]
+            if lines:
+                f.write((',\n' if count else '') + ',\n'.join(lines))
+                count += len(lines)
+        f.write('\n]}\n')
+    return count
+
+def write_geojson_lines(frames, path, chunksize=GEO_CHUNKSIZE):
+    '''
+    Write newline delimited GeoJSON, one feature per line
+
+    :param frames: airport frame, match_lines output, or an iterable of either
+    :return: number of features written
+    '''
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for chunk in _chunks(frames, chunksize):
+            lines = [_geojson_feature(*row) for row in _chunk_rows(chunk)]
+            f.writelines(line + '\n' for line in lines)
+            count += len(lines)
+    return count
+
+def _style_id(value):
+    return 'style_' + ''.join(c if c.isalnum() else '_' for c in str(value))
+
+def _kml_placemark(lat, lon, match_lat, match_lon, properties, style_by):
+    description = '<br/>'.join('{}: {}'.format(escape(k), escape(str(v)))
+                               for k, v in properties.items() if v not in (None, ''))
+    if math.isfinite(match_lat) and math.isfinite(match_lon):
+        geometry = '<LineString><coordinates>{!r},{!r} {!r},{!r}</coordinates></LineString>'.format(
+            float(lon), float(lat), float(match_lon), float(match_lat))
+    else:
+        geometry = '<Point><coordinates>{!r},{!r}</coordinates></Point>'.format(float(lon), float(lat))
+    style = ''
+    if style_by is not None:
+        style = '<styleUrl>#{}</styleUrl>'.format(_style_id(properties.get(style_by)))
+    return '<Placemark><name>{}</name>{}<description><![CDATA[{}]]></description>{}</Placemark>\n'.format(
+        escape(str(properties.get('name') or properties.get('id') or '')), style,
+        description.replace(']]>', ']]&gt;'), geometry)
+
+def write_kml(frames, path, style_by='status', group_by='state', chunksize=GEO_CHUNKSIZE, document_name=None):
+    '''
+    Write a KML document, one placemark per row
+
+    Placemarks are styled by the value of the style_by column (one color per value) and
+    grouped into one Folder per value of the group_by column. Each folder's placemarks are
+    streamed to a temporary file and the document is assembled from them at the end, so the
+    input needs no particular order; group_by should have a modest number of values (states,
+    sources) since each folder holds a file open.
+
+    :param frames: airport frame, match_lines output, or an iterable of either
+    :param style_by: column to style by, e.g. 'source' or 'status', None for the default style
+    :param group_by: column to group into folders by, None for a flat document
+    :return: number of placemarks written
+    '''
+    count = 0
+    styles = set()
+    folders = {}
+    folder_dir = tempfile.mkdtemp(prefix='kml_', dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        for chunk in _chunks(frames, chunksize):
+            for row in _chunk_rows(chunk):
+                properties = row[4]
+                if style_by is not None:
+                    styles.add(str(properties.get(style_by)))
+                folder = '' if group_by is None else str(properties.get(group_by) or '')
+                if folder not in folders:
+                    folders[folder] = open(os.path.join(folder_dir, '{}.kml'.format(len(folders))), 'w',
+                                           encoding='utf-8')
+                folders[folder].write(_kml_placemark(*row, style_by=style_by))
+                count += 1
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                    '<kml xmlns="http://www.opengis.net/kml/2.2">\n<Document>\n')
+            if document_name:
+                f.write('<name>{}</name>\n'.format(escape(document_name)))
+            for i, value in enumerate(sorted(styles)):
+                f.write('<Style id="{}"><IconStyle><color>{}</color></IconStyle>'
+                        '<LineStyle><color>{}</color><width>2</width></LineStyle></Style>\n'.format(
+                            _style_id(value), KML_COLORS[i % len(KML_COLORS)], KML_COLORS[i % len(KML_COLORS)]))
+            for folder in sorted(folders):
+                folders[folder].close()
+                if group_by is not None:
+                    f.write('<Folder><name>{}</name>\n'.format(escape(folder or 'unknown ' + group_by)))
+                with open(folders[folder].name, 'r', encoding='utf-8') as placemarks:
+                    shutil.copyfileobj(placemarks, f)
+                if group_by is not None:
+                    f.write('</Folder>\n')
+            f.write('</Document>\n</kml>\n')
+    finally:
+        for placemarks in folders.values():
+            placemarks.close()
+        shutil.rmtree(folder_dir, ignore_errors=True)
+    return count
+
+def match_lines(matches, test_df, comparison_df, chunksize=GEO_CHUNKSIZE):
+    '''
+    Chunks of a match table joined with the airports it links, for the writers above
+
+    Each row carries the test airport's GEO_PROPERTIES, lat and lon, and for matched rows
+    match_lat, match_lon and match_name of the comparison airport it was matched to.
+
+    :param matches: match_sources output (MATCH_COLUMNS)
+    :param test_df: the test_df matches was built from
+    :param comparison_df: the comparison_df matches was built from
+    '''
+    test_columns = [c for c in GEO_PROPERTIES + ['lat', 'lon'] if c in test_df and c not in matches]
+    comparison_lat = np.append(comparison_df['lat'].to_numpy(dtype=float), np.nan)
+    comparison_lon = np.append(comparison_df['lon'].to_numpy(dtype=float), np.nan)
+    comparison_names = np.append(comparison_df['name'].to_numpy(dtype=object), '')
+    for chunk in _chunks(matches, chunksize):
+        test_rows = chunk['test_row'].to_numpy(dtype=np.int64)
+        match_rows = chunk['match_row'].to_numpy(dtype=np.int64)
+        lines = test_df[test_columns].iloc[test_rows].reset_index(drop=True)
+        for column in aviation.MATCH_COLUMNS:
+            lines[column] = chunk[column].to_numpy()
+        lines['match_lat'] = comparison_lat[match_rows]
+        lines['match_lon'] = comparison_lon[match_rows]
+        lines['match_name'] = comparison_names[match_rows]
+        yield lines
@@ -0,0 +1,508 @@
+'''
+Checks of the vectorized kernels against the straightforward versions they replaced, and of
+the loaders, caches, stores and exports against small fixtures
+
+Run from the repository root with: python -m pytest tests
+'''
+import difflib
+import json
+import os
+import sys
+import zipfile
+import xml.etree.ElementTree as ElementTree
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import aviation
+import airport_db
+import geo_export
+
+
+def random_airports(n, seed=0, source='test'):
+    # airports_to_df frame of n airports scattered over the continental US, many close together
+    rng = np.random.default_rng(seed)
+    names = ['KING FIELD', 'KING AIRPORT', 'SMITH AIRSTRIP', 'LAKE COUNTY', 'JONES RANCH', 'ST MARYS',
+             'SAINT MARYS', 'MILLER FARM', '']
+    lat = np.concatenate([rng.uniform(30, 45, n - n // 2), 40 + rng.normal(0, 0.1, n // 2)])
+    lon = np.concatenate([rng.uniform(-120, -75, n - n // 2), -90 + rng.normal(0, 0.1, n // 2)])
+    return aviation._finish_airport_frame(pd.DataFrame({'id': ['{}{}'.format(source[0].upper(), i) for i in range(n)],
+                                                        'name': rng.choice(names, n),
+                                                        'lat': lat,
+                                                        'lon': lon,
+                                                        'source': source,
+                                                        'source_id': np.arange(n).astype(str)}))
+
+
+def test_unit_vector_distance_matches_haversine():
+    rng = np.random.default_rng(1)
+    lat1, lat2 = rng.uniform(-90, 90, 1000), rng.uniform(-90, 90, 1000)
+    lon1, lon2 = rng.uniform(-180, 180, 1000), rng.uniform(-180, 180, 1000)
+    # Include nearby points, where chord rounding matters most
+    lat2[:500] = lat1[:500] + rng.normal(0, 0.01, 500)
+    lon2[:500] = lon1[:500] + rng.normal(0, 0.01, 500)
+    expected = aviation.haversine_np(lon1, lat1, lon2, lat2)
+    distances = aviation.unit_vector_distance_np(*aviation.unit_vectors(lat1, lon1), *aviation.unit_vectors(lat2, lon2))
+    np.testing.assert_allclose(distances, expected, rtol=1e-9, atol=1e-6)
+
+
+def test_unit_vector_distance_broadcasts_a_point():
+    airports = random_airports(200)
+    x, y, z = aviation.frame_unit_vectors(airports)
+    distances = aviation.unit_vector_distance_np(*aviation.unit_vectors(40.0, -90.0), x, y, z)
+    expected = aviation.haversine_np(-90.0, 40.0, airports['lon'].to_numpy(), airports['lat'].to_numpy())
+    np.testing.assert_allclose(distances, expected, rtol=1e-9, atol=1e-6)
+
+
+NAME_PAIRS = [('KING FIELD', 'FIELD KING'), ('KING FIELD', 'KINGS FIELD'), ('ST. MARY\'S', 'ST MARYS'),
+              ('SMITH AIRSTRIP', 'SMITH RANCH AIRSTRIP'), ('LAKE COUNTY', 'COUNTY OF LAKE'),
+              ('JONES RANCH', 'MILLER FARM'), ('AÉRODROME DE L\'ÎLE', 'AERODROME DE L ILE'),
+              ('O\'HARE INTL', 'OHARE INTERNATIONAL'), ('SAN JOSÉ-MUNICIPAL', 'SAN JOSE MUNICIPAL'),
+              ('KING FIELD', ''), ('', ''), ('---', 'KING'), ('A', 'B'), ('HELIPAD 1', 'HELIPAD 2')]
+
+
+def test_score_name_pairs_known_scores():
+    queries = [aviation.sorted_name_key(name) for name in ['KING FIELD', 'KING FIELD', 'KING FIELD', '']]
+    candidates = [aviation.sorted_name_key(name) for name in ['FIELD KING', 'KINGS FIELD', '', '']]
+    np.testing.assert_array_equal(aviation.score_name_pairs(queries, candidates), [100, 95, 0, 100])
+
+
+def test_score_name_pairs_matches_token_sort_ratio():
+    fuzz = pytest.importorskip('fuzzywuzzy.fuzz')
+    if fuzz.SequenceMatcher is not difflib.SequenceMatcher:
+        pytest.skip('fuzzywuzzy scores with python-Levenshtein, which differs from difflib by a few points')
+    airports = random_airports(300)
+    names = [(a, b) for a, b in NAME_PAIRS] + list(zip(airports['name'], airports['name'][::-1]))
+    expected = np.array([fuzz.token_sort_ratio(a, b) for a, b in names])
+    scores = aviation.score_name_pairs([aviation.sorted_name_key(a) for a, _ in names],
+                                       [aviation.sorted_name_key(b) for _, b in names])
+    np.testing.assert_array_equal(scores, expected)
+    # The cutoffs match_sources, match_by_name and reconcile_sources apply
+    for cutoff in [70, 85]:
+        np.testing.assert_array_equal(scores > cutoff, expected > cutoff)
+
+
+@pytest.mark.parametrize('max_workers', [2, 3])
+def test_match_sources_parallel_matches_serial(max_workers):
+    test_df = random_airports(400, seed=2, source='test')
+    comparison_df = random_airports(300, seed=3, source='comparison')
+    expected = aviation.match_sources(test_df, comparison_df)
+    # Small tiles so clusters of airports straddle tile and batch edges
+    matches = aviation.match_sources_parallel(test_df, comparison_df, tile_size=0.1, max_workers=max_workers)
+    pd.testing.assert_frame_equal(matches, expected)
+    assert (expected.match_reason != 'unmatched').any()
+
+
+def antimeridian_airports(n=2000, seed=4):
+    # Airports from 170E to 165W across the date line, including two exactly on it
+    rng = np.random.default_rng(seed)
+    lon = np.concatenate([rng.uniform(170, 180, n // 2), rng.uniform(-180, -165, n - n // 2)])
+    lon[:2] = [180.0, -180.0]
+    return aviation._finish_airport_frame(pd.DataFrame({'name': 'ALEUTIAN FIELD', 'lat': rng.uniform(45, 75, n),
+                                                        'lon': lon, 'source': 'test'}))
+
+
+@pytest.mark.parametrize('cell_size', [0.2, 0.7, 5.0])
+def test_airport_index_wraps_at_antimeridian(cell_size):
+    airports = antimeridian_airports()
+    index = aviation.AirportIndex(airports, cell_size=cell_size)
+    lat, lon = airports['lat'].to_numpy(), airports['lon'].to_numpy()
+    rng = np.random.default_rng(5)
+    for query_lat, query_lon in zip(rng.uniform(45, 80, 60), np.concatenate([rng.uniform(178, 180, 30),
+                                                                             rng.uniform(-180, -178, 30)])):
+        distances = aviation.haversine_np(np.full(len(lat), query_lon), np.full(len(lat), query_lat), lon, lat)
+        for k in [1, 5]:
+            np.testing.assert_allclose(index.nearest(query_lat, query_lon, k)[1], np.sort(distances)[:k])
+            np.testing.assert_allclose(index.nearest_many([query_lat], [query_lon], k)[1][0], np.sort(distances)[:k])
+        for radius_km in [30, 300, 3000]:
+            rows, _ = index.within(query_lat, query_lon, radius_km)
+            assert set(rows.tolist()) == set(np.flatnonzero(distances <= radius_km).tolist())
+        lon_min, lon_max = query_lon - 3, query_lon + 3
+        shifted = [lon - 360, lon, lon + 360]
+        expected = np.flatnonzero((lat > 50) & (lat < 60) & np.any([(l > lon_min) & (l < lon_max) for l in shifted], axis=0))
+        np.testing.assert_array_equal(index.bbox(50, 60, lon_min, lon_max), expected)
+
+
+@pytest.mark.parametrize('seed', range(15))
+def test_update_matches_after_comparison_reorder(seed):
+    test_df = random_airports(300, seed=6, source='test')
+    previous_df = random_airports(300, seed=7, source='comparison')
+    # Same-name twins at the same spot make match_sources' tie-break by row order matter
+    twins = previous_df.sample(30, random_state=seed).assign(source_id=lambda df: df.source_id + 'b')
+    previous_df = pd.concat([previous_df, twins], ignore_index=True)
+    current_df = previous_df.iloc[np.random.default_rng(seed).permutation(len(previous_df))].reset_index(drop=True)
+    previous_matches = aviation.match_sources(test_df, previous_df)
+    matches = aviation.update_matches(previous_matches, test_df, test_df, previous_df, current_df)
+    pd.testing.assert_frame_equal(matches, aviation.match_sources(test_df, current_df))
+
+
+def test_dedup_source_collapses_duplicates():
+    airports = aviation._finish_airport_frame(pd.DataFrame({
+        'id': ['', 'KFLD', '', 'X1', '', ''],
+        'name': ['KING FIELD', 'KING AIRPORT', 'SMITH RANCH', 'JONES', 'JONES', 'MILLER'],
+        'lat': [40.0, 40.003, 40.0, 41.0, 41.03, 42.0],
+        'lon': [-90.0, -90.0, -90.015, -91.0, -91.0, -92.0],
+        'source': 'abandoned_airfields',
+        'link': ['u0', 'u1', 'u2', 'u3', 'u4', 'u5']}))
+    deduped, clusters = aviation.dedup_source(airports)
+    # KING FIELD/KING AIRPORT share a name key 330 m apart, SMITH RANCH is 1.3 km off with another
+    # name, the two JONES are 3.3 km apart (beyond radius_km, no shared identifier)
+    np.testing.assert_array_equal(clusters, [0, 0, 1, 2, 3, 4])
+    assert deduped['name'].tolist() == ['KING AIRPORT', 'SMITH RANCH', 'JONES', 'JONES', 'MILLER']
+    assert deduped['duplicate_count'].tolist() == [2, 1, 1, 1, 1]
+    # source_record_ids: id where there is one, else link
+    assert deduped['duplicate_ids'].tolist() == ['KFLD;u0', 'u2', 'X1', 'u4', 'u5']
+
+
+def test_dedup_source_matches_brute_force():
+    airports = random_airports(600, seed=8)
+    deduped, clusters = aviation.dedup_source(airports)
+    assert len(clusters) == len(airports) and deduped['duplicate_count'].sum() == len(airports)
+    np.testing.assert_array_equal(np.bincount(clusters), deduped['duplicate_count'])
+
+    left, right = np.triu_indices(len(airports), 1)
+    lat, lon = airports['lat'].to_numpy(), airports['lon'].to_numpy()
+    distances = aviation.haversine_np(lon[left], lat[left], lon[right], lat[right])
+    keys = airports['name_key'].to_numpy(dtype=object)
+    scores = aviation.score_name_pairs(keys[left], keys[right])
+    codes = aviation._identifier_codes(airports)
+    linked = ((aviation._shared_identifier_mask(codes, left, right) & (distances <= 5)) | (distances <= 0.2) |
+              ((scores > 85) & (distances <= 2)))
+    roots = aviation._union_find(len(airports), left[linked], right[linked])
+    # Same partition: every brute force component maps to exactly one cluster and vice versa
+    assert len(np.unique(roots)) == len(deduped)
+    assert (pd.Series(clusters).groupby(roots).nunique() == 1).all()
+
+
+def test_match_sources_scores_name_keys():
+    test_df = aviation._finish_airport_frame(pd.DataFrame({'name': ['KING FIELD', 'SMITH MUNI'],
+                                                           'lat': [40.0, 41.0], 'lon': [-90.0, -91.0]}))
+    comparison_df = aviation._finish_airport_frame(pd.DataFrame({'name': ['KING AIRPORT', 'SMITH MUNICIPAL AIRPORT'],
+                                                                 'lat': [40.05, 41.05], 'lon': [-90.0, -91.0]}))
+    matches = aviation.match_sources(test_df, comparison_df)
+    # Over 5 km apart, so only the noise word free, abbreviation expanded names match them
+    assert matches['match_reason'].tolist() == ['name', 'name']
+    assert matches['match_row'].tolist() == [0, 1]
+    assert matches['name_score'].tolist() == [100, 100]
+
+
+def _read_numbers(path):
+    return pd.read_csv(path)
+
+
+def test_cache_eviction_tolerates_files_removed_by_another_process(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'cache')
+    for i in range(3):
+        path = tmp_path / 'numbers{}.csv'.format(i)
+        pd.DataFrame({'n': np.arange(1000) + i}).to_csv(path, index=False)
+        aviation.load_cached(_read_numbers, str(path), cache_dir=cache_dir)
+    entries = aviation._cache_entries(cache_dir)
+    assert len(entries) == 3
+    # Another worker removes files after this one has checked they exist
+    os.remove(entries[0]['frame_file'])
+    os.remove(entries[1]['metadata_file'])
+    with monkeypatch.context() as patched:
+        patched.setattr(aviation.os.path, 'exists', lambda path: True)
+        aviation._remove_cache_entry(entries[1])
+        aviation._evict_cache(cache_dir, max_bytes=0)
+    assert aviation._cache_entries(cache_dir) == []
+    # Loading again after the whole cache is gone parses the file afresh
+    frame = aviation.load_cached(_read_numbers, str(tmp_path / 'numbers2.csv'), cache_dir=cache_dir)
+    assert frame['n'].iloc[0] == 2
+
+
+def nfdc_record(record_type, **values):
+    # One fixed-width APT.txt line with values (keyed by field name, spaces for _) at their NFDC_RECORD_FIELDS offsets
+    fields = dict((name, (start, end)) for name, start, end in aviation.NFDC_RECORD_FIELDS[record_type])
+    line = [' '] * max(end for start, end in fields.values())
+    line[0:3] = record_type
+    for name, value in values.items():
+        start, end = fields[name.replace('_', ' ')]
+        line[start:start + len(value)] = value[:end - start]
+    return ''.join(line).rstrip() + '\r\n'
+
+
+def write_nfdc_archive(path):
+    site = '04508.*A'
+    lines = [nfdc_record('APT', **{'LANDING FACILITY SITE NUMBER': site,
+                                   'LANDING FACILITY TYPE': 'AIRPORT',
+                                   'LOCATION IDENTIFIER': 'CPS',
+                                   'ASSOCIATED STATE POST OFFICE CODE': 'IL',
+                                   'ASSOCIATED CITY NAME': 'ST. LOUIS, EAST',
+                                   'OFFICIAL FACILITY NAME': 'ST LOUIS DOWNTOWN',
+                                   'AIRPORT REFERENCE POINT LATITUDE (FORMATTED)': '38-34-15.0000N',
+                                   'AIRPORT REFERENCE POINT LATITUDE (SECONDS)': '138855.0000N',
+                                   'AIRPORT REFERENCE POINT LONGITUDE (FORMATTED)': '090-09-22.5000W',
+                                   'AIRPORT REFERENCE POINT LONGITUDE (SECONDS)': '324562.5000W',
+                                   'AIRPORT ACTIVATION DATE (MM/YYYY)': '06/1945',
+                                   'AIRPORT STATUS CODE': 'O',
+                                   'LAST PHYSICAL INSPECTION DATE (MMDDYYYY)': '05011990',
+                                   'ICAO IDENTIFIER': 'KCPS'}),
+             nfdc_record('ATT', **{'LANDING FACILITY SITE NUMBER': site,
+                                   'LANDING FACILITY STATE POST OFFICE CODE': 'IL',
+                                   'ATTENDANCE SCHEDULE SEQUENCE NUMBER': ' 1',
+                                   'AIRPORT ATTENDANCE SCHEDULE': 'ALL/ALL/0600-2200'}),
+             # Base and reciprocal ends given, the midpoint is between them
+             nfdc_record('RWY', **{'LANDING FACILITY SITE NUMBER': site,
+                                   'LANDING FACILITY STATE POST OFFICE CODE': 'IL',
+                                   'RUNWAY IDENTIFICATION': '12R/30L',
+                                   'PHYSICAL RUNWAY LENGTH (NEAREST FOOT)': ' 7002',
+                                   'PHYSICAL RUNWAY WIDTH (NEAREST FOOT)': ' 150',
+                                   'RUNWAY SURFACE TYPE AND CONDITION': 'CONC-G',
+                                   'BASE END IDENTIFIER': '12R',
+                                   'BASE END LATITUDE OF PHYSICAL RUNWAY END (SECONDS)': '138800.0000N',
+                                   'BASE END LONGITUDE OF PHYSICAL RUNWAY END (SECONDS)': '324600.0000W',
+                                   'RECIPROCAL END IDENTIFIER': '30L',
+                                   'RECIPROCAL END LATITUDE OF PHYSICAL RUNWAY END (SECONDS)': '138900.0000N',
+                                   'RECIPROCAL END LONGITUDE OF PHYSICAL RUNWAY END (SECONDS)': '324500.0000W'}),
+             # No runway ends, placed at the airport reference point
+             nfdc_record('RWY', **{'LANDING FACILITY SITE NUMBER': site,
+                                   'LANDING FACILITY STATE POST OFFICE CODE': 'IL',
+                                   'RUNWAY IDENTIFICATION': 'H1',
+                                   'PHYSICAL RUNWAY LENGTH (NEAREST FOOT)': '   60'}),
+             nfdc_record('ARS', **{'LANDING FACILITY SITE NUMBER': site,
+                                   'LANDING FACILITY STATE POST OFFICE CODE': 'IL',
+                                   'RUNWAY IDENTIFICATION': '12R/30L',
+                                   'RUNWAY END IDENTIFIER': '12R',
+                                   'TYPE OF AIRCRAFT ARRESTING DEVICE': 'BAK-12'}),
+             nfdc_record('RMK', **{'LANDING FACILITY SITE NUMBER': site,
+                                   'LANDING FACILITY STATE POST OFFICE CODE': 'IL',
+                                   'REMARK ELEMENT NAME': 'A81',
+                                   'REMARK TEXT': 'CLOSED TO TRANSIENT TRAFFIC, PPR.'}),
+             # Stateless and unreadable airports are dropped
+             nfdc_record('APT', **{'LANDING FACILITY SITE NUMBER': '90000.*A',
+                                   'LOCATION IDENTIFIER': 'NOST',
+                                   'AIRPORT REFERENCE POINT LATITUDE (SECONDS)': '138855.0000N',
+                                   'AIRPORT REFERENCE POINT LONGITUDE (SECONDS)': '324562.5000W'}),
+             nfdc_record('APT', **{'LANDING FACILITY SITE NUMBER': '90001.*A',
+                                   'LOCATION IDENTIFIER': 'BAD',
+                                   'ASSOCIATED STATE POST OFFICE CODE': 'IL',
+                                   'AIRPORT REFERENCE POINT LATITUDE (SECONDS)': 'UNKNOWN',
+                                   'AIRPORT REFERENCE POINT LONGITUDE (SECONDS)': '324562.5000W'}),
+             # A runway far from any airport
+             nfdc_record('RWY', **{'LANDING FACILITY SITE NUMBER': '99999.*A',
+                                   'LANDING FACILITY STATE POST OFFICE CODE': 'MT',
+                                   'RUNWAY IDENTIFICATION': '18/36',
+                                   'BASE END LATITUDE OF PHYSICAL RUNWAY END (SECONDS)': '162000.0000N',
+                                   'BASE END LONGITUDE OF PHYSICAL RUNWAY END (SECONDS)': '396000.0000W'})]
+    with zipfile.ZipFile(str(path), 'w') as zf:
+        zf.writestr('APT.txt', ''.join(lines))
+    return str(path)
+
+
+def test_nfdc_tables_slice_every_record_type(tmp_path):
+    tables = aviation.get_nfdc_tables(write_nfdc_archive(tmp_path / 'APT.zip'))
+    assert sorted(tables) == ['APT', 'ARS', 'ATT', 'RMK', 'RWY']
+    apt = tables['APT']
+    assert apt['LOCATION IDENTIFIER'].tolist() == ['CPS']
+    assert apt.iloc[0]['OFFICIAL FACILITY NAME'] == 'ST LOUIS DOWNTOWN'
+    assert apt.iloc[0]['AIRPORT REFERENCE POINT LONGITUDE (SECONDS)'] == '324562.5000W'
+    assert apt.iloc[0]['ICAO IDENTIFIER'] == 'KCPS'
+    assert tables['ATT'].iloc[0]['AIRPORT ATTENDANCE SCHEDULE'] == 'ALL/ALL/0600-2200'
+    assert tables['RWY']['RUNWAY IDENTIFICATION'].tolist() == ['12R/30L', 'H1', '18/36']
+    assert tables['RWY'].iloc[0]['RECIPROCAL END IDENTIFIER'] == '30L'
+    assert tables['ARS'].iloc[0]['TYPE OF AIRCRAFT ARRESTING DEVICE'] == 'BAK-12'
+    assert tables['RMK'].iloc[0]['REMARK TEXT'] == 'CLOSED TO TRANSIENT TRAFFIC, PPR.'
+    # Only the requested record types and columns are kept
+    tables = aviation.get_nfdc_tables(str(tmp_path / 'APT.zip'), {'RMK': ['REMARK ELEMENT NAME']})
+    assert list(tables) == ['RMK']
+    assert tables['RMK'].columns.tolist() == ['REMARK ELEMENT NAME']
+
+
+def test_nfdc_airport_frame_fields(tmp_path):
+    airport = aviation.get_nfdc_airport_frame(write_nfdc_archive(tmp_path / 'APT.zip')).iloc[0]
+    assert airport['id'] == 'CPS'
+    assert airport['lat'] == pytest.approx(138855.0 / 3600)
+    assert airport['lon'] == pytest.approx(-324562.5 / 3600)
+    # Whole seconds in the frame, as airports_to_df has always stored them
+    assert (airport['lat_deg'], airport['lat_min'], airport['lat_sec']) == (38, 34, 15)
+    assert (airport['lon_deg'], airport['lon_min'], airport['lon_sec']) == (90, 9, 22)
+    assert (airport['lat_dms_string'], airport['lon_dms_string']) == ('N383415', 'W0900922')
+    # The comma is part of the city name, not a city, state separator
+    assert airport['city'] == 'ST. LOUIS; EAST'
+    assert airport['state'] == 'IL'
+    assert airport['start_date'] == pd.Timestamp('1945-06-01')
+    assert airport['end_date'] == pd.Timestamp('1990-05-01')
+    assert airport['source_id'] == '04508.*A'
+
+
+def test_nfdc_runways_join_to_airports(tmp_path):
+    archive = write_nfdc_archive(tmp_path / 'APT.zip')
+    runways = aviation.get_nfdc_runway_frame(archive)
+    assert runways.columns.tolist() == aviation.RUNWAY_COLUMNS
+    assert runways['airport_id'].tolist() == ['CPS', 'CPS', '']
+    assert runways['length_ft'].tolist()[:2] == [7002, 60]
+    assert runways.iloc[0]['lat'] == pytest.approx(138850.0 / 3600)
+    assert runways.iloc[0]['lon'] == pytest.approx(-324550.0 / 3600)
+    assert runways.iloc[1]['lat'] == pytest.approx(138855.0 / 3600)
+    assert runways.iloc[1]['lon'] == pytest.approx(-324562.5 / 3600)
+    # One located end is used as is
+    assert runways.iloc[2]['lat'] == pytest.approx(45.0)
+
+    airports = pd.concat([random_airports(50, seed=3), aviation.get_nfdc_airport_frame(archive)], ignore_index=True)
+    joined = aviation.match_runways(runways, airports)
+    assert joined['airport_row'].tolist() == [50, 50, -1]
+    assert joined['distance_km'].iloc[1] == pytest.approx(0.0, abs=1e-3)
+    assert joined['distance_km'].iloc[0] < 1
+    assert np.isnan(joined['distance_km'].iloc[2])
+
+
+def test_airport_store_round_trip(tmp_path):
+    airport_df = random_airports(300, seed=4)
+    airport_df.loc[::3, 'start_date'] = pd.Timestamp('1942-07-01')
+    airport_df.loc[::5, 'city'] = 'SÃO PAULO'
+    path = str(tmp_path / 'airports.store')
+    aviation.write_airport_store(airport_df, path)
+    with aviation.AirportStore(path) as store:
+        assert len(store) == 300
+        assert store.columns == airport_df.columns.tolist()
+        assert 'lat' in store and 'runway' not in store
+        # Numeric columns are views onto the file
+        assert not store['lat'].flags.writeable
+        np.testing.assert_array_equal(store['lat'], airport_df['lat'].to_numpy())
+        stored = store.to_df()
+        for column in airport_df.columns:
+            expected = airport_df[column]
+            if pd.api.types.is_datetime64_any_dtype(expected) or pd.api.types.is_numeric_dtype(expected):
+                np.testing.assert_array_equal(stored[column].to_numpy(), expected.to_numpy(), err_msg=column)
+            else:
+                assert stored[column].tolist() == expected.astype(object).fillna('').tolist(), column
+        rows = [299, 0, 5, 5]
+        assert store.strings('city', rows).tolist() == airport_df['city'].iloc[rows].tolist()
+        assert store.to_df(['id', 'lon'], rows)['lon'].tolist() == airport_df['lon'].iloc[rows].tolist()
+
+    with open(str(tmp_path / 'not.store'), 'wb') as f:
+        f.write(b'id,name\n')
+    with pytest.raises(ValueError):
+        aviation.AirportStore(str(tmp_path / 'not.store'))
+
+
+def test_airport_rows_match_airport_objects(tmp_path):
+    frame = pd.concat([random_airports(200, seed=5), aviation.get_nfdc_airport_frame(write_nfdc_archive(tmp_path / 'APT.zip'))],
+                      ignore_index=True)
+    frame.loc[::4, 'start_date'] = pd.Timestamp('1955-03-01')
+    table = aviation.AirportTable(frame)
+    attributes = aviation.AIRPORT_TABLE_ATTRIBUTES + ['lat_dms', 'lon_dms', 'start_date', 'end_date']
+    for row, from_frame in zip(table, aviation.df_to_airports(frame)):
+        # As the loaders built them before AirportTable, with DMS lists derived from the decimal degrees
+        airport = aviation.Airport(**dict((attribute, getattr(row, attribute)) for attribute in attributes
+                                          if attribute not in ['lat_dms', 'lon_dms']))
+        for attribute in attributes:
+            assert getattr(row, attribute) == getattr(airport, attribute) == getattr(from_frame, attribute), attribute
+        assert repr(row) == repr(airport)
+    # Fractional seconds, as the Airport objects of the NFDC loader had them, up to the 7 place rounding of lat/lon
+    assert table[200].lat_dms[:3] == ['N', 38.0, 34.0]
+    assert table[200].lat_dms[3] == pytest.approx(15.0, abs=5e-4)
+    assert table[200].lon_dms[:3] == ['W', 90.0, 9.0]
+    assert table[200].lon_dms[3] == pytest.approx(22.5, abs=5e-4)
+
+
+def test_match_cache_hits_and_invalidation(tmp_path):
+    test_df = random_airports(150, seed=6, source='test')
+    comparison_df = random_airports(250, seed=7, source='comparison')
+    path = str(tmp_path / 'match_cache.sqlite')
+    expected = aviation.match_sources(test_df, comparison_df)
+    with aviation.MatchCache(path) as cache:
+        pd.testing.assert_frame_equal(cache.match(test_df, comparison_df), expected)
+        assert (cache.hits, cache.misses) == (0, 150)
+    # Served from the file on the next run, and only a changed test airport is matched again
+    changed_test_df = test_df.copy()
+    changed_test_df.loc[3, 'name'] = 'NEW NAME'
+    aviation.add_name_keys(changed_test_df)
+    with aviation.MatchCache(path) as cache:
+        pd.testing.assert_frame_equal(cache.match(test_df, comparison_df), expected)
+        assert (cache.hits, cache.misses) == (150, 0)
+        pd.testing.assert_frame_equal(cache.match(changed_test_df, comparison_df),
+                                      aviation.match_sources(changed_test_df, comparison_df))
+        assert (cache.hits, cache.misses) == (299, 1)
+
+        # Any change to the comparison data or the parameters is a new version, matched afresh
+        moved_df = comparison_df.copy()
+        moved_df.loc[0, ['lat', 'lon']] = test_df.loc[0, ['lat', 'lon']].to_numpy(dtype=float) + 0.001
+        aviation.add_unit_vectors(moved_df)
+        pd.testing.assert_frame_equal(cache.match(test_df, moved_df), aviation.match_sources(test_df, moved_df))
+        assert (cache.hits, cache.misses) == (299, 151)
+        pd.testing.assert_frame_equal(cache.match(test_df, comparison_df, name_cutoff=90),
+                                      aviation.match_sources(test_df, comparison_df, name_cutoff=90))
+        assert (cache.hits, cache.misses) == (299, 301)
+
+
+def test_airport_db_queries_across_antimeridian(tmp_path):
+    airports = antimeridian_airports(600, seed=8)
+    airports.loc[::3, 'source'] = 'other'
+    path = str(tmp_path / 'airports.sqlite')
+    aviation.export_airport_database(dict((source, df) for source, df in airports.groupby('source')), path)
+    lat, lon = airports['lat'].to_numpy(), airports['lon'].to_numpy()
+    key = lambda df: sorted(zip(df['lat'].round(7), df['lon'].round(7)))
+    with airport_db.connect(path) as connection:
+        # Both spellings of a box over the date line, and boxes ending exactly on it
+        for lon_min, lon_max, inside in [(175, 185, (lon >= 175) | (lon <= -175)),
+                                         (-185, -175, (lon >= 175) | (lon <= -175)),
+                                         (179, 180, lon >= 179),
+                                         (-180, -179, lon <= -179),
+                                         (-190, 190, np.ones(len(lon), dtype=bool))]:
+            inside = inside & (lat >= 50) & (lat <= 60)
+            assert key(airport_db.query_bbox(connection, 50, 60, lon_min, lon_max)) == key(airports[inside])
+        other = airport_db.query_bbox(connection, 50, 60, 175, 185, source='other')
+        assert set(other['source']) == {'other'}
+        assert key(other) == key(airports[((lon >= 175) | (lon <= -175)) & (lat >= 50) & (lat <= 60) &
+                                          (airports['source'] == 'other').to_numpy()])
+
+        for query_lat, query_lon in [(60.0, 179.9), (60.0, -179.9), (55.0, 180.0)]:
+            near = airport_db.query_radius(connection, query_lat, query_lon, 80)
+            distances = aviation.haversine_np(np.full(len(lon), query_lon), np.full(len(lat), query_lat), lon, lat)
+            assert key(near) == key(airports[distances <= 80])
+            assert (np.diff(near['distance_km'].to_numpy()) >= 0).all()
+
+
+def test_geo_exports_parse(tmp_path):
+    airports = random_airports(25, seed=9)
+    airports.loc[0, 'name'] = 'SMITH & SONS <PRIVATE> ]]> STRIP'
+    airports.loc[1, 'city'] = 'SÃO PAULO'
+    airports['state'] = np.where(np.arange(25) % 2, 'IL', '')
+    airports.loc[2, 'start_date'] = pd.Timestamp('1942-07-01')
+    # Small chunks, so features are joined across chunk boundaries too
+    assert geo_export.write_geojson([airports.iloc[:10], airports.iloc[10:]], str(tmp_path / 'a.geojson'),
+                                    chunksize=4) == 25
+    with open(str(tmp_path / 'a.geojson'), encoding='utf-8') as f:
+        features = json.load(f)['features']
+    assert [feature['properties']['id'] for feature in features] == airports['id'].tolist()
+    assert features[3]['geometry'] == {'type': 'Point', 'coordinates': [airports['lon'][3], airports['lat'][3]]}
+    assert features[0]['properties']['name'] == 'SMITH & SONS <PRIVATE> ]]> STRIP'
+    assert features[1]['properties']['city'] == 'SÃO PAULO'
+    assert (features[2]['properties']['start_date'], features[3]['properties']['start_date']) == ('1942-07-01', None)
+
+    assert geo_export.write_geojson_lines(airports, str(tmp_path / 'a.geojsonl'), chunksize=4) == 25
+    with open(str(tmp_path / 'a.geojsonl'), encoding='utf-8') as f:
+        assert [json.loads(line) for line in f] == features
+
+    comparison_df = random_airports(40, seed=10, source='comparison')
+    matches = aviation.match_sources(airports, comparison_df)
+    geo_export.write_geojson(geo_export.match_lines(matches, airports, comparison_df, chunksize=4),
+                             str(tmp_path / 'm.geojson'))
+    with open(str(tmp_path / 'm.geojson'), encoding='utf-8') as f:
+        features = json.load(f)['features']
+    matched = matches['match_row'].to_numpy() >= 0
+    assert [feature['geometry']['type'] for feature in features] == \
+        ['LineString' if m else 'Point' for m in matched]
+    line = features[int(np.argmax(matched))]
+    row = matches['match_row'][int(np.argmax(matched))]
+    assert line['geometry']['coordinates'][1] == [comparison_df['lon'][row], comparison_df['lat'][row]]
+
+    assert geo_export.write_kml(airports, str(tmp_path / 'a.kml'), style_by='source', chunksize=4,
+                                document_name='Airports & more') == 25
+    kml = '{http://www.opengis.net/kml/2.2}'
+    document = ElementTree.parse(str(tmp_path / 'a.kml')).getroot().find(kml + 'Document')
+    assert document.find(kml + 'name').text == 'Airports & more'
+    assert [style.get('id') for style in document.findall(kml + 'Style')] == ['style_test']
+    folders = document.findall(kml + 'Folder')
+    assert [folder.find(kml + 'name').text for folder in folders] == ['unknown state', 'IL']
+    placemarks = dict((p.find(kml + 'description').text.split('<br/>')[0], p)
+                      for folder in folders for p in folder.findall(kml + 'Placemark'))
+    assert len(placemarks) == 25
+    first = placemarks['id: ' + airports['id'][0]]
+    assert first.find(kml + 'name').text == 'SMITH & SONS <PRIVATE> ]]> STRIP'
+    assert first.find(kml + 'styleUrl').text == '#style_test'
+    lon, lat = first.find(kml + 'Point/' + kml + 'coordinates').text.split(',')
+    assert (float(lon), float(lat)) == (airports['lon'][0], airports['lat'][0])